@@ -0,0 +1,162 @@
+import os
+import re
+import math
+import unicodedata
+
+# Compaction des annonces avant leur envoi à Gemini.
+#
+# Les annonces copiées depuis un site d'emploi traînent souvent un bandeau
+# cookies, des mentions légales, des boutons « Postuler / Partager » et le même
+# bloc « À propos » répété. On nettoie localement : espaces normalisés, lignes
+# parasites retirées, paragraphes et phrases en double supprimés, puis coupe au
+# budget de caractères (en gardant des paragraphes entiers autant que possible).
+
+# Budgets par défaut (0 = pas de limite). Lus à l'appel : le .env est chargé par load_config.
+DEFAULT_BUDGET = 8000
+DEFAULT_BUDGET_WITH_JOB_INFO = 3000
+
+# Une ligne parasite est une ligne courte entièrement faite d'un de ces motifs
+# (bandeau, bouton, lien de pied de page) : une phrase de l'annonce qui mentionne
+# les cookies ou une newsletter n'est pas retirée. Les rangées de liens
+# (« Mentions légales | Cookies ») sont découpées sur | · •.
+BOILERPLATE_MAX_CHARS = 80
+BOILERPLATE_PATTERNS = [
+    r"(ce site|nous) utilis\w* des cookies\b.*",
+    r"(accepter|refuser|g[ée]rer|param[ée]trer) (tous |les |tous les )?cookies",
+    r"cookies?( et traceurs)?",
+    r"politique (de confidentialit[ée]|cookies?)",
+    r"privacy( policy)?|cookie policy",
+    r"mentions l[ée]gales",
+    r"conditions g[ée]n[ée]rales( d['’]utilisation| de vente)?|cgu|cgv",
+    r"(©|\(c\)|copyright)?[\w .,&-]{0,40}?(tous droits r[ée]serv[ée]s|all rights reserved)",
+    r"postuler|je postule|postuler maintenant|apply( now)?|candidater",
+    r"partager (cette |l['’])\s?offre|share this job",
+    r"(voir les )?offres? similaires?|similar jobs",
+    r"cr[ée]er une alerte( e-?mail| emploi)?|job alert",
+    r"((s['’]abonner|abonnez-vous|inscrivez-vous) (à )?(la |notre )?)?newsletter",
+    r"signaler (cette |l['’])\s?offre",
+    r"accepter|refuser|tout accepter|tout refuser|param[èe]trer",
+    r"(retour|back)( aux offres| to jobs)?",
+    r"publi[ée]e? il y a\b.*",
+]
+BOILERPLATE_RE = re.compile(r"^\s*(" + "|".join(BOILERPLATE_PATTERNS) + r")\s*[.!:…]?\s*$", re.IGNORECASE)
+BOILERPLATE_SEPARATOR_RE = re.compile(r"\s*[|·•]\s*")
+
+# Les phrases plus courtes ne sont pas dédupliquées (puces « Python », « Anglais »...)
+DUPLICATE_LINE_MIN_CHARS = 40
+
+ZERO_WIDTH_RE = re.compile("[​‌‍⁠﻿]")
+INLINE_SPACE_RE = re.compile(r"[ \t  ]+")
+TRUNCATION_MARK = " […]"
+
+
+def estimate_tokens(text):
+    """Estimation grossière du nombre de tokens (environ 4 caractères par token)."""
+    return math.ceil(len(text) / 4)
+
+
+def default_budget(with_job_info=False):
+    """
+    Budget de caractères de l'annonce dans un prompt. Plus serré quand les
+    informations extraites (job_info) accompagnent déjà le texte.
+    """
+    if with_job_info:
+        return int(os.getenv("LETTRE_AD_BUDGET_WITH_INFO", DEFAULT_BUDGET_WITH_JOB_INFO))
+    return int(os.getenv("LETTRE_AD_BUDGET", DEFAULT_BUDGET))
+
+
+def _dedupe_key(text):
+    text = unicodedata.normalize("NFKC", text).lower()
+    return " ".join(re.sub(r"[^\w\s]", " ", text).split())
+
+
+def normalize_whitespace(text):
+    """Normalise les espaces : Unicode NFC, espaces insécables, lignes vides multiples."""
+    text = unicodedata.normalize("NFC", text or "")
+    text = ZERO_WIDTH_RE.sub("", text).replace("\r\n", "\n").replace("\r", "\n")
+    lines = [INLINE_SPACE_RE.sub(" ", line).strip() for line in text.split("\n")]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+def is_boilerplate(line):
+    """Vrai pour une ligne courte faite uniquement de bandeaux, boutons ou liens de pied de page."""
+    if len(line) > BOILERPLATE_MAX_CHARS:
+        return False
+    parts = [part for part in BOILERPLATE_SEPARATOR_RE.split(line) if part]
+    return bool(parts) and all(BOILERPLATE_RE.match(part) for part in parts)
+
+
+def truncate_to_budget(paragraphs, max_chars):
+    """Garde les paragraphes dans l'ordre jusqu'au budget ; le dernier est coupé sur un mot."""
+    kept = []
+    used = 0
+    for paragraph in paragraphs:
+        separator = 2 if kept else 0
+        if used + separator + len(paragraph) <= max_chars:
+            kept.append(paragraph)
+            used += separator + len(paragraph)
+            continue
+        room = max_chars - used - separator - len(TRUNCATION_MARK)
+        if room > 80:
+            cut = paragraph[:room].rsplit(" ", 1)[0]
+            kept.append(cut + TRUNCATION_MARK)
+        break
+    return kept
+
+
+def compact_job_ad(text, max_chars=None):
+    """
+    Compacte une annonce pour un prompt. `max_chars` (0 ou None = sans limite)
+    borne la longueur finale.
+
+    Retourne (texte compacté, rapport) ; le rapport donne les tailles avant/après
+    en caractères et en tokens estimés ainsi que ce qui a été retiré.
+    """
+    original = text or ""
+    paragraphs = []
+    seen_paragraphs = set()
+    seen_lines = set()
+    removed = {"lignes_parasites": 0, "paragraphes_doublons": 0, "lignes_doublons": 0}
+
+    for block in normalize_whitespace(original).split("\n\n"):
+        lines = []
+        for line in block.split("\n"):
+            if not line:
+                continue
+            if is_boilerplate(line):
+                removed["lignes_parasites"] += 1
+                continue
+            key = _dedupe_key(line)
+            if len(line) >= DUPLICATE_LINE_MIN_CHARS:
+                if key in seen_lines:
+                    removed["lignes_doublons"] += 1
+                    continue
+                seen_lines.add(key)
+            lines.append(line)
+        if not lines:
+            continue
+
+        paragraph = "\n".join(lines)
+        key = _dedupe_key(paragraph)
+        if key in seen_paragraphs:
+            removed["paragraphes_doublons"] += 1
+            continue
+        seen_paragraphs.add(key)
+        paragraphs.append(paragraph)
+
+    truncated = False
+    if max_chars and sum(len(p) for p in paragraphs) + 2 * max(len(paragraphs) - 1, 0) > max_chars:
+        paragraphs = truncate_to_budget(paragraphs, max_chars)
+        truncated = True
+
+    compacted = "\n\n".join(paragraphs)
+    report = {
+        "caracteres_avant": len(original),
+        "caracteres_apres": len(compacted),
+        "tokens_avant": estimate_tokens(original),
+        "tokens_apres": estimate_tokens(compacted),
+        "tokens_economises": estimate_tokens(original) - estimate_tokens(compacted),
+        "tronquee": truncated,
+        **removed,
+    }
+    return compacted, report
@@ -0,0 +1,198 @@
+import os
+import time
+import fnmatch
+import sqlite3
+import hashlib
+import threading
+
+from cache_utils import CACHE_DB_PATH
+
+# Manifeste des annonces traitées depuis input/.
+#
+# Pour chaque fichier (identifié par son nom) : empreinte du contenu, dernière
+# étape atteinte du pipeline, statut et PDF produit. Un nouveau lancement ne
+# traite que les annonces nouvelles ou modifiées, celles qui ont échoué et
+# celles dont le PDF a disparu. La reprise d'une annonce en échec profite des
+# caches : extraction et corps de lettre déjà obtenus ne sont pas redemandés.
+
+STATUS_DONE = "termine"
+STATUS_DUPLICATE = "doublon"
+STATUS_FAILED = "echec"
+STATUS_RUNNING = "en_cours"
+
+# Au-delà, une annonce restée « en cours » (processus interrompu) est reprise
+RUNNING_STALE_SECONDS = 3600
+
+
+def file_hash(path):
+    """Empreinte SHA-256 du contenu d'un fichier."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def stage_reached(result):
+    """
+    Dernière étape franchie par un résultat du pipeline, parmi extraction,
+    redaction, tex et pdf (None si aucune).
+    """
+    if not result:
+        return None
+    if result.get("success"):
+        return "pdf"
+    if result.get("tex_path"):
+        return "tex"
+    if result.get("letter_body"):
+        return "redaction"
+    if result.get("job_info"):
+        return "extraction"
+    return None
+
+
+class AdManifest:
+    """Manifeste persistant (table SQLite dans la base des caches)."""
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or CACHE_DB_PATH
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        if not self._initialized:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS processed_ads (
+                    filename TEXT PRIMARY KEY,
+                    content_hash TEXT NOT NULL,
+                    stage TEXT,
+                    status TEXT NOT NULL,
+                    pdf_path TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def entries(self):
+        """Toutes les entrées, par nom de fichier."""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT filename, content_hash, stage, status, pdf_path, error, attempts, updated_at "
+                "FROM processed_ads"
+            ).fetchall()
+        finally:
+            conn.close()
+        keys = ("filename", "content_hash", "stage", "status", "pdf_path", "error", "attempts", "updated_at")
+        return {row[0]: dict(zip(keys, row)) for row in rows}
+
+    def plan(self, job_ad_paths, force=False, only=None):
+        """
+        Choisit les annonces à traiter. `only` (motifs de noms de fichier) restreint
+        la sélection ; `force` retraite les annonces sélectionnées même terminées.
+
+        Retourne (chemins à traiter avec la raison, chemins ignorés avec la raison).
+        """
+        entries = self.entries()
+        to_process, skipped = {}, {}
+        for path in job_ad_paths:
+            filename = os.path.basename(path)
+            if only and not any(fnmatch.fnmatch(filename, pattern) for pattern in only):
+                continue
+
+            entry = entries.get(filename)
+            if force:
+                to_process[path] = "forcée"
+            elif entry is None:
+                to_process[path] = "nouvelle"
+            elif entry["content_hash"] != file_hash(path):
+                to_process[path] = "modifiée"
+            elif entry["status"] == STATUS_RUNNING:
+                if time.time() - entry["updated_at"] < RUNNING_STALE_SECONDS:
+                    skipped[path] = "en cours de traitement"
+                else:
+                    to_process[path] = "reprise (traitement interrompu)"
+            elif entry["status"] == STATUS_FAILED:
+                to_process[path] = f"reprise (étape atteinte : {entry['stage'] or 'aucune'})"
+            elif not (entry["pdf_path"] and os.path.exists(entry["pdf_path"])):
+                to_process[path] = "PDF manquant"
+            else:
+                skipped[path] = "déjà traitée" if entry["status"] == STATUS_DONE else "doublon déjà relié"
+        return to_process, skipped
+
+    def mark_running(self, job_ad_path):
+        """Signale qu'une annonce est en cours de traitement (étape et PDF précédents conservés)."""
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute(
+                    """
+                    INSERT INTO processed_ads (filename, content_hash, status, attempts, updated_at)
+                    VALUES (?, ?, ?, 0, ?)
+                    ON CONFLICT(filename) DO UPDATE SET
+                        content_hash = excluded.content_hash, status = excluded.status,
+                        updated_at = excluded.updated_at
+                    """,
+                    (os.path.basename(job_ad_path), file_hash(job_ad_path), STATUS_RUNNING, time.time()),
+                )
+                conn.commit()
+            finally:
+                conn.close()
+
+    def record(self, job_ad_path, result, error=None):
+        """
+        Enregistre l'issue du pipeline pour une annonce. L'empreinte notée par
+        mark_running est conservée : un fichier modifié pendant le traitement
+        sera retraité.
+        """
+        if result and result.get("duplicate_of"):
+            status = STATUS_DUPLICATE
+        elif result and result.get("success"):
+            status = STATUS_DONE
+        else:
+            status = STATUS_FAILED
+        pdf_path = result.get("pdf_path") if result else None
+        content_hash = file_hash(job_ad_path)
+
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute(
+                    """
+                    INSERT INTO processed_ads
+                        (filename, content_hash, stage, status, pdf_path, error, attempts, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, 1, ?)
+                    ON CONFLICT(filename) DO UPDATE SET
+                        content_hash = CASE WHEN processed_ads.status = 'en_cours'
+                            THEN processed_ads.content_hash ELSE excluded.content_hash END,
+                        stage = excluded.stage,
+                        status = excluded.status, pdf_path = excluded.pdf_path,
+                        error = excluded.error,
+                        attempts = CASE WHEN processed_ads.content_hash = excluded.content_hash
+                            OR processed_ads.status = 'en_cours'
+                            THEN processed_ads.attempts + 1 ELSE 1 END,
+                        updated_at = excluded.updated_at
+                    """,
+                    (
+                        os.path.basename(job_ad_path),
+                        content_hash,
+                        stage_reached(result),
+                        status,
+                        pdf_path,
+                        error,
+                        time.time(),
+                    ),
+                )
+                conn.commit()
+            finally:
+                conn.close()
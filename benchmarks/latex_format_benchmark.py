@@ -0,0 +1,241 @@
+"""
+Mesure le temps de compilation d'une lettre par template, avec et sans format
+LaTeX précompilé (voir latex_formats.py).
+
+Chaque mesure correspond aux deux passes pdflatex effectuées par
+compile_latex_to_pdf, dans un dossier temporaire.
+
+Avec --check, vérifie d'abord que la coupe du préambule statique convient à
+chaque template (sans TeX : préambule trouvé, sans placeholder, accolades
+équilibrées, marqueur de format réversible), puis, si pdflatex est disponible,
+que chaque lettre compile avec son format et donne le même nombre de pages
+qu'une compilation classique.
+
+Usage :
+    python benchmarks/latex_format_benchmark.py [--runs N] [--output fichier.json]
+    python benchmarks/latex_format_benchmark.py --check
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+os.chdir(ROOT_DIR)
+
+import latex_formats
+
+TEMPLATE_FILES = [
+    "lettre_template.tex",
+    "lettre_template_elegant.tex",
+    "lettre_template_moderne.tex",
+    "lettre_template_minimaliste.tex",
+]
+
+SAMPLE_VALUES = {
+    "NOM_COMPLET": "Jean Dupont",
+    "ADRESSE": "123 Rue de l'Exemple",
+    "CODE_POSTAL": "75000 Paris",
+    "EMAIL": "jean.dupont@email.com",
+    "TELEPHONE": "06 12 34 56 78",
+    "POSTE_VISE": "Stage Ingénieur Mécanique",
+    "NOM_ENTREPRISE": "Entreprise Exemple",
+    "ADRESSE_ENTREPRISE": "Adresse de l'entreprise",
+    "CORPS_LETTRE": "\n\n".join(
+        [
+            "Étudiant en école d'ingénieur, je souhaite rejoindre votre équipe pour ce stage. "
+            "Les missions décrites correspondent à mon projet et à mes compétences techniques. " * 3
+        ]
+        * 3
+    ),
+}
+
+
+def render(template_source):
+    """Remplit un template avec les valeurs d'exemple."""
+    content = template_source
+    for key, value in SAMPLE_VALUES.items():
+        content = content.replace(f"%%{key}%%", value)
+    return content
+
+
+def brace_balance(text):
+    """Accolades ouvertes moins fermées, hors accolades échappées et commentaires."""
+    balance = 0
+    for line in text.splitlines():
+        line = re.sub(r"(?<!\\)%.*", "", line)
+        line = line.replace("\\{", "").replace("\\}", "")
+        balance += line.count("{") - line.count("}")
+    return balance
+
+
+def check_static_preamble(template_source):
+    """Problèmes de la coupe du préambule statique d'un template (liste vide si elle convient)."""
+    preamble = latex_formats.static_preamble(template_source)
+    if preamble is None:
+        return ["aucun préambule statique (pas de \\documentclass avant le premier placeholder)"]
+    problems = []
+    if latex_formats.PLACEHOLDER_RE.search(preamble):
+        problems.append("placeholder dans la partie dumpée")
+    if "\\begin{document}" in preamble:
+        problems.append("\\begin{document} dans la partie dumpée")
+    if brace_balance(preamble):
+        problems.append(f"accolades déséquilibrées à la coupe ({brace_balance(preamble):+d})")
+    if "\\makeatletter" in preamble and preamble.count("\\makeatother") < preamble.count("\\makeatletter"):
+        problems.append("coupe entre \\makeatletter et \\makeatother")
+
+    plain = render(template_source)
+    name = latex_formats.format_name(template_source)
+    latex_formats._built_formats.add(name)
+    attached = latex_formats.attach_format(plain, template_source)
+    if attached == plain:
+        problems.append("attach_format ne reconnaît pas le préambule du .tex rendu")
+    else:
+        work_dir = tempfile.mkdtemp(prefix="bench_latex_")
+        try:
+            tex_filepath = os.path.join(work_dir, "lettre.tex")
+            with open(tex_filepath, "w", encoding="utf-8") as f:
+                f.write(attached)
+            latex_formats.detach_format(tex_filepath)
+            with open(tex_filepath, "r", encoding="utf-8") as f:
+                if f.read() != plain:
+                    problems.append("detach_format ne restitue pas le .tex d'origine")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return problems
+
+
+def compile_pages(tex_content, fmt_name=None):
+    """Compile le .tex (deux passes) et retourne le nombre de pages du PDF, ou None en cas d'échec."""
+    work_dir = tempfile.mkdtemp(prefix="bench_latex_")
+    try:
+        tex_filepath = os.path.join(work_dir, "lettre.tex")
+        with open(tex_filepath, "w", encoding="utf-8") as f:
+            f.write(tex_content)
+        command = latex_formats.pdflatex_command(tex_filepath, fmt_name)
+        for _ in range(2):
+            if subprocess.run(command, capture_output=True, text=True).returncode != 0:
+                return None
+        with open(os.path.join(work_dir, "lettre.pdf"), "rb") as f:
+            return len(re.findall(rb"/Type\s*/Page\b", f.read()))
+    except OSError:
+        return None
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def check_templates(templates):
+    """Vérifie chaque template ; retourne 0 si tout est correct, 1 sinon."""
+    failures = 0
+    for template_file, template_source in templates.items():
+        problems = check_static_preamble(template_source)
+        lines = len((latex_formats.static_preamble(template_source) or "").splitlines())
+        print(f"{template_file:<34} coupe après {lines} lignes : {'; '.join(problems) or 'OK'}")
+        failures += bool(problems)
+    latex_formats._built_formats.clear()
+
+    if shutil.which("pdflatex") is None:
+        print("\npdflatex est introuvable : compilation avec format non vérifiée.")
+        return 1 if failures else 0
+
+    print()
+    formats = latex_formats.ensure_formats(templates)
+    for template_file, template_source in templates.items():
+        plain = render(template_source)
+        fmt_name = formats.get(template_file)
+        if not fmt_name:
+            print(f"{template_file:<34} format non construit (voir les logs)")
+            failures += 1
+            continue
+        pages_plain = compile_pages(plain)
+        pages_format = compile_pages(latex_formats.attach_format(plain, template_source), fmt_name)
+        ok = pages_format is not None and pages_format == pages_plain
+        print(f"{template_file:<34} sans format : {pages_plain} page(s), avec format : {pages_format} page(s) "
+              f"{'OK' if ok else 'ÉCHEC'}")
+        failures += not ok
+    return 1 if failures else 0
+
+
+def time_compile(tex_content, fmt_name=None):
+    """Écrit le .tex dans un dossier temporaire et chronomètre les deux passes pdflatex."""
+    work_dir = tempfile.mkdtemp(prefix="bench_latex_")
+    try:
+        tex_filepath = os.path.join(work_dir, "lettre.tex")
+        with open(tex_filepath, "w", encoding="utf-8") as f:
+            f.write(tex_content)
+        command = latex_formats.pdflatex_command(tex_filepath, fmt_name)
+        start = time.perf_counter()
+        subprocess.run(command, check=True, capture_output=True, text=True)
+        subprocess.run(command, check=True, capture_output=True, text=True)
+        return time.perf_counter() - start
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Nombre de compilations par mode et par template.")
+    parser.add_argument("--output", help="Fichier JSON où écrire les résultats.")
+    parser.add_argument("--check", action="store_true", help="Vérifie la coupe du préambule et la compilation avec format.")
+    args = parser.parse_args()
+
+    templates = {}
+    for template_file in TEMPLATE_FILES:
+        with open(os.path.join("templates", template_file), "r", encoding="utf-8") as f:
+            templates[template_file] = f.read()
+
+    if args.check:
+        return check_templates(templates)
+
+    if shutil.which("pdflatex") is None:
+        print("pdflatex est introuvable : impossible de lancer le benchmark.")
+        return 1
+
+    build_start = time.perf_counter()
+    formats = latex_formats.ensure_formats(templates)
+    print(f"Formats prêts en {time.perf_counter() - build_start:.2f} s (construits une seule fois)\n")
+
+    results = {}
+    print(f"{'Template':<34} {'sans format (s)':>16} {'avec format (s)':>16} {'gain':>7}")
+    print("-" * 76)
+    for template_file, template_source in templates.items():
+        plain = render(template_source)
+        with_format = latex_formats.attach_format(plain, template_source)
+        fmt_name = formats.get(template_file)
+
+        before = [time_compile(plain) for _ in range(args.runs)]
+        after = [time_compile(with_format, fmt_name) for _ in range(args.runs)] if fmt_name else []
+
+        before_median = statistics.median(before)
+        after_median = statistics.median(after) if after else None
+        results[template_file] = {
+            "format": fmt_name,
+            "sans_format": [round(t, 3) for t in before],
+            "avec_format": [round(t, 3) for t in after],
+            "mediane_sans_format": round(before_median, 3),
+            "mediane_avec_format": round(after_median, 3) if after_median else None,
+        }
+
+        if after_median:
+            gain = f"{(1 - after_median / before_median) * 100:.0f}%"
+            print(f"{template_file:<34} {before_median:>16.2f} {after_median:>16.2f} {gain:>7}")
+        else:
+            print(f"{template_file:<34} {before_median:>16.2f} {'-':>16} {'-':>7}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\nRésultats écrits dans {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
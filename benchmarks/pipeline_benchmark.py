@@ -0,0 +1,363 @@
+"""
+Benchmark de bout en bout du pipeline sur un corpus d'annonces synthétiques.
+
+Le LLM est simulé par le backend factice (GEMINI_BACKEND=fake) avec une
+latence fixe, pour que seules les variations du code se voient d'un commit à
+l'autre. Chaque étape est chronométrée séparément :
+
+- extraction      : extract_job_info (cache ignoré)
+- redaction       : generate_letter_body (cache ignoré)
+- score           : calculate_match_score
+- score_lot       : calculate_match_scores sur toutes les annonces du corpus
+- selection       : select_template_by_tone
+- rendu_tex       : write_tex_from_content (partie de generate_pdf_from_content
+                    qui précède la compilation)
+- compilation:<template> : compile_latex_to_pdf, par template (cache de PDF ignoré)
+
+Puis run_batch mesure le débit du pipeline complet (annonces par seconde).
+Les résultats (p50/p95/p99, débit, métadonnées du commit) sont écrits en JSON ;
+`--compare` affiche l'écart avec un fichier de résultats précédent.
+
+Usage :
+    python benchmarks/pipeline_benchmark.py [--ads N] [--llm-latency-ms MS]
+        [--compile-sample N] [--output fichier.json] [--compare ancien.json]
+"""
+
+import os
+import io
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import platform
+import subprocess
+import contextlib
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+TEMPLATE_FILES = [
+    "lettre_template.tex",
+    "lettre_template_elegant.tex",
+    "lettre_template_moderne.tex",
+    "lettre_template_minimaliste.tex",
+]
+
+BENCH_PROFILE = {
+    "nom_complet": "Jean Dupont",
+    "adresse": "123 Rue de l'Exemple",
+    "code_postal": "75000 Paris",
+    "telephone": "06 12 34 56 78",
+    "email": "jean.dupont@email.com",
+    "resume_personnel": "Élève ingénieur en mécanique et informatique industrielle.",
+    "competences_cles": ["Python", "SolidWorks", "Gestion de projet", "Simulation", "Matlab"],
+}
+
+# Briques du corpus synthétique
+INTRO = [
+    "{entreprise}, acteur majeur du secteur {secteur}, recrute un(e) {poste} pour renforcer ses équipes à {ville}.",
+    "Rejoignez {entreprise} ! Dans le cadre de notre croissance, nous recherchons un(e) {poste} basé(e) à {ville}.",
+    "Au sein de la direction technique de {entreprise} ({secteur}), vous intégrerez une équipe de 15 ingénieurs.",
+]
+MISSIONS = [
+    "Vous participerez à la conception et à la simulation de sous-ensembles mécaniques.",
+    "Vous développerez des outils d'analyse de données en Python pour le suivi de production.",
+    "Vous rédigerez les spécifications techniques et suivrez les essais de validation.",
+    "Vous contribuerez à la modélisation 3D sous SolidWorks et Catia des nouveaux produits.",
+    "Vous automatiserez des tests sur banc avec LabVIEW et Matlab/Simulink.",
+    "Vous assurerez la gestion de projet et la coordination avec les fournisseurs.",
+    "Vous réaliserez des calculs par éléments finis avec Abaqus ou Ansys.",
+    "Vous participerez à l'amélioration continue et aux démarches qualité du site.",
+]
+PROFILE = [
+    "Étudiant(e) en école d'ingénieur (Bac+5), vous êtes curieux(se) et rigoureux(se).",
+    "Vous maîtrisez au moins un langage de programmation (Python, C++ ou Java) et Git.",
+    "Un bon niveau d'anglais est indispensable ; la communication est au cœur du poste.",
+    "Une première expérience en maintenance ou en automatisme serait appréciée.",
+]
+CONDITIONS = [
+    "Stage de 6 mois à partir de février, gratification selon profil, télétravail partiel.",
+    "CDI, rémunération selon expérience, RTT et mutuelle d'entreprise.",
+    "Alternance de 2 ans, rythme 3 semaines entreprise / 1 semaine école.",
+]
+ENTREPRISES = ["Aerotech", "Mécaplus", "Voltaïa", "Indusoft", "Navalis", "Robotika", "Hydrogène & Co"]
+SECTEURS = ["aéronautique", "industrie", "énergie", "tech", "naval", "automobile"]
+POSTES = ["Ingénieur Mécanique", "Ingénieur Simulation", "Chef de projet", "Ingénieur Logiciel"]
+VILLES = ["Toulouse", "Lyon", "Nantes", "Lille", "Grenoble", "Paris"]
+
+# Nombre de paragraphes de missions par taille d'annonce
+SIZES = {"courte": 1, "moyenne": 4, "longue": 12}
+
+
+def generate_corpus(count, seed=42):
+    """Génère `count` annonces synthétiques de longueurs variées (déterministe pour une graine)."""
+    rng = random.Random(seed)
+    corpus = []
+    size_names = list(SIZES)
+    for i in range(count):
+        size = size_names[i % len(size_names)]
+        values = {
+            "entreprise": rng.choice(ENTREPRISES),
+            "secteur": rng.choice(SECTEURS),
+            "poste": rng.choice(POSTES),
+            "ville": rng.choice(VILLES),
+        }
+        # Champs explicites : le backend factice les reprend, d'où des fichiers de sortie distincts
+        paragraphs = [
+            f"Entreprise : {values['entreprise']}\nPoste : {values['poste']} réf {i:03d}",
+            rng.choice(INTRO).format(**values),
+            "Vos missions :",
+        ]
+        for _ in range(SIZES[size]):
+            paragraphs.append(" ".join(rng.sample(MISSIONS, 3)))
+        paragraphs.append("Votre profil :")
+        paragraphs.append(" ".join(rng.sample(PROFILE, 2 if size == "courte" else 4)))
+        paragraphs.append(rng.choice(CONDITIONS))
+        corpus.append({"nom": f"annonce_{i:03d}_{size}.txt", "taille": size, "texte": "\n\n".join(paragraphs)})
+    return corpus
+
+
+def percentile(sorted_values, q):
+    """Percentile par rang le plus proche sur une liste triée."""
+    if not sorted_values:
+        return None
+    rank = math.ceil(q / 100 * len(sorted_values))
+    return sorted_values[min(len(sorted_values), max(rank, 1)) - 1]
+
+
+def summarize(samples):
+    """p50/p95/p99, moyenne et total (en millisecondes) d'une liste de durées en secondes."""
+    values = sorted(samples)
+    if not values:
+        return {"n": 0}
+    return {
+        "n": len(values),
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "moyenne_ms": round(sum(values) / len(values) * 1000, 3),
+        "total_s": round(sum(values), 3),
+    }
+
+
+def git_commit():
+    """Commit courant du dépôt, si disponible."""
+    try:
+        completed = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, check=True, capture_output=True, text=True
+        )
+        return completed.stdout.strip()
+    except (FileNotFoundError, subprocess.CalledProcessError):
+        return None
+
+
+class StageTimer:
+    """Accumule les durées de chaque étape."""
+
+    def __init__(self):
+        self.samples = {}
+
+    @contextlib.contextmanager
+    def measure(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.setdefault(stage, []).append(time.perf_counter() - start)
+
+
+def run_stages(pipeline, corpus, templates_dict, compile_sample, timer):
+    """Exécute et chronomètre chaque étape du pipeline pour chaque annonce."""
+    rendered = []
+    job_infos = []
+    for i, ad in enumerate(corpus):
+        with contextlib.redirect_stdout(io.StringIO()):
+            with timer.measure("extraction"):
+                job_info = pipeline.extract_job_info(ad["texte"], use_cache=False)
+            with timer.measure("redaction"):
+                letter_body = pipeline.generate_letter_body(BENCH_PROFILE, ad["texte"], job_info, use_cache=False)
+        if not job_info or not letter_body:
+            continue
+
+        job_infos.append(job_info)
+        with timer.measure("score"):
+            pipeline.calculate_match_score(BENCH_PROFILE, job_info)
+        with timer.measure("selection"):
+            template_name = pipeline.select_template_by_tone(job_info)
+
+        entreprise, poste, output_filename_base = pipeline.build_output_names(job_info, ad["nom"])
+        template = templates_dict.get(template_name, templates_dict["lettre_template.tex"])
+        with timer.measure("rendu_tex"):
+            tex_filepath, _ = pipeline.write_tex_from_content(
+                BENCH_PROFILE, template, entreprise, poste, letter_body, f"bench_{i}"
+            )
+        pipeline.latex_sandbox.discard(tex_filepath)
+        if i < compile_sample:
+            rendered.append((i, entreprise, poste, letter_body))
+
+    with timer.measure("score_lot"):
+        pipeline.calculate_match_scores(BENCH_PROFILE, job_infos)
+
+    if shutil.which("pdflatex") is None:
+        print("pdflatex introuvable : étapes de compilation ignorées.")
+        return
+
+    for template_file, template in templates_dict.items():
+        stage = f"compilation:{template_file}"
+        for i, entreprise, poste, letter_body in rendered:
+            tex_filepath, pdf_filepath = pipeline.write_tex_from_content(
+                BENCH_PROFILE, template, entreprise, poste, letter_body, f"bench_{i}"
+            )
+            with timer.measure(stage):
+                pipeline.compile_latex_to_pdf(tex_filepath)
+            if os.path.exists(pdf_filepath):
+                os.remove(pdf_filepath)
+
+
+def run_throughput(pipeline, corpus, templates_dict, llm_concurrency):
+    """Débit de run_batch sur tout le corpus, caches vidés au préalable."""
+    os.makedirs("input", exist_ok=True)
+    paths = []
+    for ad in corpus:
+        path = os.path.join("input", ad["nom"])
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(ad["texte"])
+        paths.append(path)
+
+    pipeline.EXTRACTION_CACHE.clear()
+    pipeline.LETTER_CACHE.clear()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = pipeline.run_batch(
+            BENCH_PROFILE, paths, templates_dict, llm_concurrency=llm_concurrency, use_letter_cache=False
+        )
+    elapsed = time.perf_counter() - start
+    return {
+        "annonces": len(paths),
+        "reussies": sum(1 for r in results.values() if r and r.get("success")),
+        "llm_concurrency": llm_concurrency,
+        "duree_s": round(elapsed, 3),
+        "annonces_par_s": round(len(paths) / elapsed, 3) if elapsed else None,
+    }
+
+
+def print_report(results, previous=None):
+    """Affiche le tableau des étapes (et l'écart de p50 avec un résultat précédent)."""
+    header = f"{'Étape':<46} {'n':>5} {'p50 (ms)':>10} {'p95 (ms)':>10} {'p99 (ms)':>10}"
+    if previous:
+        header += f" {'Δ p50':>8}"
+    print(header)
+    print("-" * len(header))
+    previous_stages = (previous or {}).get("etapes", {})
+    for stage, stats in results["etapes"].items():
+        if not stats["n"]:
+            continue
+        line = f"{stage:<46} {stats['n']:>5} {stats['p50_ms']:>10.2f} {stats['p95_ms']:>10.2f} {stats['p99_ms']:>10.2f}"
+        old = previous_stages.get(stage, {}).get("p50_ms")
+        if previous:
+            line += f" {(stats['p50_ms'] / old - 1) * 100:>+7.1f}%" if old else f" {'-':>8}"
+        print(line)
+
+    debit = results["debit"]
+    print(
+        f"\nDébit run_batch : {debit['annonces_par_s']} annonce(s)/s "
+        f"({debit['reussies']}/{debit['annonces']} réussies en {debit['duree_s']} s)"
+    )
+    old_debit = (previous or {}).get("debit", {}).get("annonces_par_s")
+    if old_debit and debit["annonces_par_s"]:
+        print(f"Écart de débit : {(debit['annonces_par_s'] / old_debit - 1) * 100:+.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ads", type=int, default=30, help="Taille du corpus synthétique.")
+    parser.add_argument("--seed", type=int, default=42, help="Graine du corpus.")
+    parser.add_argument("--llm-latency-ms", type=float, default=200, help="Latence fixe du LLM simulé.")
+    parser.add_argument(
+        "--compile-sample", type=int, default=5, help="Nombre d'annonces compilées avec chaque template."
+    )
+    parser.add_argument("--llm-concurrency", type=int, default=4, help="Concurrence de run_batch.")
+    parser.add_argument("--save-corpus", help="Dossier où enregistrer les annonces générées.")
+    parser.add_argument("--output", help="Fichier JSON où écrire les résultats.")
+    parser.add_argument("--compare", help="Fichier JSON d'un benchmark précédent à comparer.")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    os.environ["GEMINI_BACKEND"] = "fake"
+    os.environ["GEMINI_FAKE_LATENCY"] = f"fixed:{args.llm_latency_ms}"
+    os.environ["GEMINI_FAKE_ERROR_RATE"] = "0"
+    os.environ["LETTRE_CACHE_DB"] = os.path.join(work_dir, "instance", "cache.db")
+
+    import logging
+    import main as pipeline
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    corpus = generate_corpus(args.ads, args.seed)
+    if args.save_corpus:
+        os.makedirs(args.save_corpus, exist_ok=True)
+        for ad in corpus:
+            with open(os.path.join(args.save_corpus, ad["nom"]), "w", encoding="utf-8") as f:
+                f.write(ad["texte"])
+
+    templates_dict = {}
+    for template_file in TEMPLATE_FILES:
+        with open(os.path.join(ROOT_DIR, "templates", template_file), "r", encoding="utf-8") as f:
+            templates_dict[template_file] = pipeline.load_letter_template(f.read(), template_file, BENCH_PROFILE)
+
+    previous_dir = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        os.makedirs("output", exist_ok=True)
+        build_start = time.perf_counter()
+        pipeline.latex_formats.ensure_formats({name: t.source for name, t in templates_dict.items()})
+        formats_s = time.perf_counter() - build_start
+
+        timer = StageTimer()
+        run_stages(pipeline, corpus, templates_dict, args.compile_sample, timer)
+        debit = run_throughput(pipeline, corpus, templates_dict, args.llm_concurrency)
+    finally:
+        os.chdir(previous_dir)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    sizes = {}
+    for ad in corpus:
+        sizes.setdefault(ad["taille"], []).append(len(ad["texte"]))
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "plateforme": platform.platform(),
+            "pdflatex": pipeline.latex_compiler_identity() if shutil.which("pdflatex") else None,
+            "annonces": len(corpus),
+            "graine": args.seed,
+            "latence_llm_ms": args.llm_latency_ms,
+            "taille_moyenne_caracteres": {k: round(sum(v) / len(v)) for k, v in sizes.items()},
+            "construction_formats_s": round(formats_s, 3),
+        },
+        "etapes": {stage: summarize(samples) for stage, samples in timer.samples.items()},
+        "debit": debit,
+    }
+
+    previous = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+        print(f"Comparaison avec {args.compare} (commit {previous.get('meta', {}).get('commit')})\n")
+    print_report(results, previous)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\nRésultats écrits dans {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
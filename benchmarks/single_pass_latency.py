@@ -0,0 +1,122 @@
+"""
+Compare la latence du mode en deux appels (extraction puis rédaction) et du
+mode single-pass (un seul appel structuré) sur les annonces d'un dossier.
+
+Les caches sont ignorés pour mesurer de vrais allers-retours Gemini ; les deux
+modes sont exécutés en alternance sur chaque annonce pour limiter les biais.
+
+Usage :
+    python benchmarks/single_pass_latency.py [dossier] [--runs N] [--output fichier.json]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import google.generativeai as genai
+
+from main import (
+    load_config,
+    extract_job_info,
+    generate_letter_body,
+    generate_job_info_and_letter,
+)
+
+
+def time_two_calls(user_config, job_ad_text):
+    """Mesure le chemin historique : extract_job_info puis generate_letter_body."""
+    start = time.perf_counter()
+    job_info = extract_job_info(job_ad_text, use_cache=False)
+    extracted_at = time.perf_counter()
+    letter_body = generate_letter_body(user_config, job_ad_text, job_info, use_cache=False)
+    end = time.perf_counter()
+    return {
+        "total": end - start,
+        "extraction": extracted_at - start,
+        "redaction": end - extracted_at,
+        "ok": bool(job_info and letter_body),
+    }
+
+
+def time_single_pass(user_config, job_ad_text):
+    """Mesure le mode single-pass."""
+    start = time.perf_counter()
+    job_info, letter_body = generate_job_info_and_letter(user_config, job_ad_text, use_cache=False)
+    return {"total": time.perf_counter() - start, "ok": bool(job_info and letter_body)}
+
+
+def summarize(samples):
+    """Statistiques de base (en secondes) sur les mesures réussies."""
+    totals = sorted(s["total"] for s in samples if s["ok"])
+    if not totals:
+        return {"n": 0}
+    return {
+        "n": len(totals),
+        "echecs": sum(1 for s in samples if not s["ok"]),
+        "moyenne": round(statistics.mean(totals), 3),
+        "mediane": round(statistics.median(totals), 3),
+        "min": round(totals[0], 3),
+        "max": round(totals[-1], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input_dir", nargs="?", default="input")
+    parser.add_argument("--runs", type=int, default=1, help="Nombre de passes par annonce.")
+    parser.add_argument("--output", help="Fichier JSON où écrire les mesures brutes.")
+    args = parser.parse_args()
+
+    api_key, user_config = load_config()
+    if not api_key or not user_config:
+        return 1
+    genai.configure(api_key=api_key)
+
+    job_ads = sorted(f for f in os.listdir(args.input_dir) if f.endswith(".txt"))
+    if not job_ads:
+        print(f"Aucune annonce .txt dans '{args.input_dir}'.")
+        return 1
+
+    rows = []
+    for job_ad_filename in job_ads:
+        with open(os.path.join(args.input_dir, job_ad_filename), "r", encoding="utf-8") as f:
+            job_ad_text = f.read()
+        for run in range(args.runs):
+            # On alterne l'ordre d'exécution des deux modes d'une passe à l'autre
+            if run % 2 == 0:
+                two_calls = time_two_calls(user_config, job_ad_text)
+                single_pass = time_single_pass(user_config, job_ad_text)
+            else:
+                single_pass = time_single_pass(user_config, job_ad_text)
+                two_calls = time_two_calls(user_config, job_ad_text)
+            rows.append({"annonce": job_ad_filename, "run": run, "deux_appels": two_calls, "single_pass": single_pass})
+
+    print(f"\n{'Annonce':<40} {'2 appels (s)':>14} {'single-pass (s)':>16} {'gain':>8}")
+    print("-" * 82)
+    for row in rows:
+        two, single = row["deux_appels"]["total"], row["single_pass"]["total"]
+        gain = f"{(1 - single / two) * 100:.0f}%" if two else "-"
+        print(f"{row['annonce'][:40]:<40} {two:>14.2f} {single:>16.2f} {gain:>8}")
+
+    summary = {
+        "deux_appels": summarize([r["deux_appels"] for r in rows]),
+        "single_pass": summarize([r["single_pass"] for r in rows]),
+    }
+    print("\nRésumé :")
+    for mode, stats in summary.items():
+        print(f"  {mode:<12} {stats}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"resume": summary, "mesures": rows}, f, ensure_ascii=False, indent=2)
+        print(f"\nMesures écrites dans {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+
+import metrics
+
+# Base SQLite des caches, rangée à côté de candidatures.db (dossier instance/ de Flask)
+CACHE_DB_PATH = os.getenv("LETTRE_CACHE_DB", os.path.join("instance", "cache.db"))
+
+
+def normalize_text(text):
+    """Normalise un texte pour le hachage (Unicode NFC, espaces compactés)."""
+    text = unicodedata.normalize("NFC", text or "")
+    return " ".join(text.split())
+
+
+def make_key(*parts):
+    """Construit une clé de cache stable (SHA-256) à partir de parties sérialisables en JSON."""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SQLiteCache:
+    """
+    Cache clé/valeur persistant stocké dans une table SQLite.
+
+    Les valeurs sont sérialisées en JSON. Les entrées plus vieilles que
+    `max_age_days` sont ignorées puis supprimées, et la table est ramenée à
+    `max_entries` lignes en évinçant les entrées les moins récemment lues.
+    """
+
+    def __init__(self, namespace, db_path=None, max_entries=2000, max_age_days=30):
+        self.namespace = namespace
+        self.db_path = db_path or CACHE_DB_PATH
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 86400
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        if not self._initialized:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_cache_entries_access "
+                "ON cache_entries (namespace, last_access)"
+            )
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def _count(self, hit):
+        metrics.CACHE_REQUESTS.inc(cache=self.namespace, result="hit" if hit else "miss")
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key):
+        """Retourne la valeur en cache pour `key`, ou None si absente ou expirée."""
+        with metrics.CACHE_DURATION.time(cache=self.namespace, operation="get"):
+            return self._get(key)
+
+    def _get(self, key):
+        now = time.time()
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT value, created_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            if row is None or now - row[1] > self.max_age:
+                self._count(False)
+                return None
+
+            conn.execute(
+                "UPDATE cache_entries SET last_access = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+        self._count(True)
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        """Enregistre `value` pour `key` puis applique les règles d'éviction."""
+        with metrics.CACHE_DURATION.time(cache=self.namespace, operation="set"):
+            self._set(key, value)
+
+    def _set(self, key, value):
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, value, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(value, ensure_ascii=False), now, now),
+            )
+            self._evict(conn, now)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _evict(self, conn, now):
+        conn.execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND created_at < ?",
+            (self.namespace, now - self.max_age),
+        )
+        conn.execute(
+            """
+            DELETE FROM cache_entries WHERE namespace = ? AND key IN (
+                SELECT key FROM cache_entries WHERE namespace = ?
+                ORDER BY last_access DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.namespace, self.namespace, self.max_entries),
+        )
+
+    def clear(self):
+        """Vide toutes les entrées de ce cache."""
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def stats(self):
+        """Retourne les compteurs hit/miss et le nombre d'entrées stockées."""
+        conn = self._connect()
+        try:
+            entries = conn.execute(
+                "SELECT COUNT(*) FROM cache_entries WHERE namespace = ?", (self.namespace,)
+            ).fetchone()[0]
+        finally:
+            conn.close()
+
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "namespace": self.namespace,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "entries": entries,
+            }
+
+
+class FileCache:
+    """
+    Cache de fichiers adressé par contenu (un fichier par clé dans `directory`).
+
+    L'espace disque est borné par `max_bytes` : au-delà, les fichiers les moins
+    récemment utilisés sont supprimés. La date de modification sert de date de
+    dernier accès et est mise à jour à chaque lecture.
+    """
+
+    def __init__(self, namespace, directory, max_bytes=200 * 1024 * 1024, suffix=".pdf"):
+        self.namespace = namespace
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}{self.suffix}")
+
+    def fetch(self, key, dest_path):
+        """Copie le fichier en cache pour `key` vers `dest_path`. Retourne True si trouvé."""
+        path = self._path(key)
+        with metrics.CACHE_DURATION.time(cache=self.namespace, operation="get"):
+            try:
+                shutil.copyfile(path, dest_path)
+                os.utime(path)
+                hit = True
+            except FileNotFoundError:
+                hit = False
+
+        metrics.CACHE_REQUESTS.inc(cache=self.namespace, result="hit" if hit else "miss")
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return hit
+
+    def store(self, key, src_path):
+        """Ajoute une copie de `src_path` au cache puis applique le budget disque."""
+        with metrics.CACHE_DURATION.time(cache=self.namespace, operation="set"):
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(key)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            shutil.copyfile(src_path, tmp_path)
+            os.replace(tmp_path, path)
+            self._evict()
+
+    def _entries(self):
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(self.suffix):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, filename))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, filename))
+        return entries
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, filename in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, filename))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def stats(self):
+        """Retourne les compteurs hit/miss, le nombre de fichiers et l'espace occupé."""
+        entries = self._entries()
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "namespace": self.namespace,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "entries": len(entries),
+                "bytes": sum(size for _, size, _ in entries),
+            }
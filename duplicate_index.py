@@ -0,0 +1,250 @@
+import os
+import re
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+
+import numpy as np
+
+import ad_compaction
+import metrics
+from cache_utils import CACHE_DB_PATH
+
+# Index des annonces déjà traitées, pour repérer les quasi-doublons.
+#
+# Une même offre est souvent publiée sur plusieurs sites avec de petites
+# retouches. Chaque annonce (nettoyée par ad_compaction) est découpée en
+# séquences de SHINGLE_SIZE mots ; sa signature MinHash (NUM_PERM minima de
+# fonctions de hachage) estime la similarité de Jaccard entre deux annonces.
+# La signature est coupée en BANDS bandes de ROWS valeurs (LSH) : deux annonces
+# ne sont comparées que si elles partagent au moins une bande, ce qui garde la
+# recherche en quelques millisecondes quel que soit le nombre d'annonces.
+# Avec 32 bandes de 4, une paire à 0,8 de similarité est presque toujours
+# retenue comme candidate ; la comparaison des signatures complètes tranche.
+
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+DEFAULT_THRESHOLD = 0.8
+
+# Nombre premier > 2**32 : (a * h + b) tient dans un uint64 pour h, a < 2**32
+_PRIME = np.uint64(4294967311)
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, 2**32 - 1, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 2**32 - 1, size=NUM_PERM, dtype=np.uint64)
+
+WORD_RE = re.compile(r"\w+")
+
+
+def ad_words(text):
+    """Mots de l'annonce nettoyée (sans bandeaux ni doublons), en minuscules et sans accents."""
+    compacted, _ = ad_compaction.compact_job_ad(text, 0)
+    ascii_text = unicodedata.normalize("NFKD", compacted).encode("ascii", "ignore").decode("ascii")
+    return WORD_RE.findall(ascii_text.lower())
+
+
+def content_hash(text):
+    """Empreinte exacte du texte nettoyé."""
+    return hashlib.sha256(" ".join(ad_words(text)).encode("utf-8")).hexdigest()
+
+
+def signature(text):
+    """Signature MinHash (NUM_PERM entiers) des shingles de mots de l'annonce."""
+    words = ad_words(text)
+    count = max(len(words) - SHINGLE_SIZE + 1, 1)
+    shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(count)}
+    hashes = np.fromiter(
+        (zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles)
+    )
+    return ((hashes[:, None] * _PERM_A + _PERM_B) % _PRIME).min(axis=0)
+
+
+def duplicate_threshold():
+    """Similarité minimale d'un doublon (LETTRE_DUPLICATE_THRESHOLD, lue à l'appel)."""
+    return float(os.getenv("LETTRE_DUPLICATE_THRESHOLD", DEFAULT_THRESHOLD))
+
+
+def similarity(signature_a, signature_b):
+    """Similarité de Jaccard estimée entre deux signatures."""
+    return float(np.mean(signature_a == signature_b))
+
+
+def band_keys(sig):
+    """Clé de chaque bande LSH de la signature."""
+    return [
+        hashlib.blake2b(sig[band * ROWS:(band + 1) * ROWS].tobytes(), digest_size=8).hexdigest()
+        for band in range(BANDS)
+    ]
+
+
+class DuplicateIndex:
+    """
+    Index persistant des annonces traitées (tables SQLite dans la base des caches).
+
+    Chaque entrée garde de quoi relier un doublon au travail déjà fait : le PDF,
+    les informations extraites, le corps de la lettre et, côté web, la candidature.
+    """
+
+    def __init__(self, db_path=None, threshold=None):
+        self.db_path = db_path or CACHE_DB_PATH
+        self.threshold = threshold
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        if not self._initialized:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ad_fingerprints (
+                    id INTEGER PRIMARY KEY,
+                    content_hash TEXT NOT NULL UNIQUE,
+                    signature BLOB NOT NULL,
+                    source TEXT,
+                    pdf_path TEXT,
+                    result TEXT,
+                    candidature_id INTEGER,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ad_lsh_buckets (
+                    band INTEGER NOT NULL,
+                    bucket TEXT NOT NULL,
+                    ad_id INTEGER NOT NULL,
+                    PRIMARY KEY (band, bucket, ad_id)
+                )
+                """
+            )
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def find(self, text, sig=None):
+        """
+        Retourne l'annonce indexée la plus proche de `text` si sa similarité
+        atteint le seuil, sous forme de dictionnaire, sinon None.
+        """
+        with metrics.CACHE_DURATION.time(cache="doublons", operation="get"):
+            match = self._find(text, sig)
+        metrics.CACHE_REQUESTS.inc(cache="doublons", result="hit" if match else "miss")
+        return match
+
+    def _find(self, text, sig):
+        sig = signature(text) if sig is None else sig
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT id, signature FROM ad_fingerprints WHERE content_hash = ?",
+                (content_hash(text),),
+            ).fetchone()
+            if row is not None:
+                return self._entry(conn, row[0], 1.0)
+
+            candidates = set()
+            for band, bucket in enumerate(band_keys(sig)):
+                candidates.update(
+                    ad_id for (ad_id,) in conn.execute(
+                        "SELECT ad_id FROM ad_lsh_buckets WHERE band = ? AND bucket = ?",
+                        (band, bucket),
+                    )
+                )
+            best_id, best_score = None, 0.0
+            for ad_id in candidates:
+                (blob,) = conn.execute(
+                    "SELECT signature FROM ad_fingerprints WHERE id = ?", (ad_id,)
+                ).fetchone()
+                score = similarity(sig, np.frombuffer(blob, dtype=np.uint64))
+                if score > best_score:
+                    best_id, best_score = ad_id, score
+            if best_id is None or best_score < (self.threshold or duplicate_threshold()):
+                return None
+            return self._entry(conn, best_id, best_score)
+        finally:
+            conn.close()
+
+    def _entry(self, conn, ad_id, score):
+        source, pdf_path, result, candidature_id = conn.execute(
+            "SELECT source, pdf_path, result, candidature_id FROM ad_fingerprints WHERE id = ?",
+            (ad_id,),
+        ).fetchone()
+        return {
+            "id": ad_id,
+            "similarity": round(score, 3),
+            "source": source,
+            "pdf_path": pdf_path,
+            "candidature_id": candidature_id,
+            **json.loads(result or "{}"),
+        }
+
+    def add(self, text, source=None, pdf_path=None, result=None):
+        """
+        Indexe une annonce traitée. `result` (informations extraites, corps de la
+        lettre, template...) est conservé pour les doublons à venir.
+        """
+        sig = signature(text)
+        payload = json.dumps(result or {}, ensure_ascii=False)
+        with self._lock:
+            conn = self._connect()
+            try:
+                digest = content_hash(text)
+                conn.execute(
+                    """
+                    INSERT INTO ad_fingerprints (content_hash, signature, source, pdf_path, result, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(content_hash) DO UPDATE SET
+                        source = excluded.source, pdf_path = excluded.pdf_path, result = excluded.result
+                    """,
+                    (digest, sig.tobytes(), source, pdf_path, payload, time.time()),
+                )
+                (ad_id,) = conn.execute(
+                    "SELECT id FROM ad_fingerprints WHERE content_hash = ?", (digest,)
+                ).fetchone()
+                conn.executemany(
+                    "INSERT OR IGNORE INTO ad_lsh_buckets (band, bucket, ad_id) VALUES (?, ?, ?)",
+                    [(band, bucket, ad_id) for band, bucket in enumerate(band_keys(sig))],
+                )
+                conn.commit()
+            finally:
+                conn.close()
+        return ad_id
+
+    def link_candidature(self, ad_id, candidature_id):
+        """Rattache la candidature créée (application web) à l'annonce indexée."""
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE ad_fingerprints SET candidature_id = ? WHERE id = ?", (candidature_id, ad_id)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def clear(self):
+        """Vide l'index."""
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM ad_lsh_buckets")
+            conn.execute("DELETE FROM ad_fingerprints")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def stats(self):
+        """Nombre d'annonces indexées."""
+        conn = self._connect()
+        try:
+            (entries,) = conn.execute("SELECT COUNT(*) FROM ad_fingerprints").fetchone()
+        finally:
+            conn.close()
+        return {"entries": entries}
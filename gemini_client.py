@@ -0,0 +1,277 @@
+import os
+import time
+import random
+import logging
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+import gemini_fake
+import metrics
+from cache_utils import make_key
+
+# Couche commune des appels Gemini.
+#
+# - les objets GenerativeModel sont créés une fois par (modèle, configuration) ;
+# - chaque appel a une échéance (GEMINI_TIMEOUT secondes) ;
+# - les erreurs transitoires (quota, 5xx, délai dépassé) sont relancées avec un
+#   backoff exponentiel « full jitter » ;
+# - optionnellement (GEMINI_HEDGE=1), une requête en double est envoyée si la
+#   première dépasse le p95 observé pour ce modèle ; la première réponse gagne.
+#   Les appels doublés tournent sur un pool de HEDGE_WORKERS threads dont chaque
+#   place est réservée avant l'envoi : quand le pool est saturé (appels lents
+#   encore en cours), la requête part sans doublage plutôt que d'attendre une place.
+#
+# Avec GEMINI_BACKEND=fake, les modèles sont remplacés par le backend factice
+# de gemini_fake.py (aucun appel réseau).
+
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 20.0
+
+# Nombre minimal de mesures avant de faire confiance au p95
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+# Appels Gemini simultanés au plus sur le pool des requêtes doublées
+HEDGE_WORKERS = 8
+
+TRANSIENT_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.InternalServerError,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.GatewayTimeout,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.Aborted,
+    TimeoutError,
+    ConnectionError,
+)
+
+_models = {}
+_models_lock = threading.Lock()
+
+_latencies = {}
+_latencies_lock = threading.Lock()
+
+_hedge_pool = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="gemini-hedge")
+# Une place par worker : un appel soumis démarre toujours aussitôt
+_hedge_slots = threading.BoundedSemaphore(HEDGE_WORKERS)
+
+
+def backend_model_id(model_name):
+    """
+    Identifiant du modèle à utiliser dans les clés de cache : inchangé avec l'API
+    réelle, préfixé avec le backend factice pour ne jamais mélanger les réponses.
+    """
+    return f"fake:{model_name}" if gemini_fake.enabled() else model_name
+
+
+def get_model(model_name, generation_config=None, safety_settings=None):
+    """Retourne le GenerativeModel partagé pour ce modèle et cette configuration."""
+    fake = gemini_fake.enabled()
+    key = make_key(model_name, generation_config, safety_settings, fake)
+    with _models_lock:
+        model = _models.get(key)
+        if model is None:
+            model_class = gemini_fake.FakeGenerativeModel if fake else genai.GenerativeModel
+            model = model_class(
+                model_name,
+                generation_config=generation_config,
+                safety_settings=safety_settings,
+            )
+            _models[key] = model
+        return model
+
+
+def record_latency(model_name, seconds):
+    """Ajoute une mesure de latence (appels réussis uniquement)."""
+    with _latencies_lock:
+        samples = _latencies.setdefault(model_name, deque(maxlen=LATENCY_WINDOW))
+        samples.append(seconds)
+
+
+def latency_p95(model_name):
+    """p95 des dernières latences observées pour ce modèle, ou None si trop peu de mesures."""
+    with _latencies_lock:
+        samples = sorted(_latencies.get(model_name, ()))
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return None
+    return samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+
+def default_settings():
+    """Réglages lus dans l'environnement à chaque appel (le .env est chargé par load_config)."""
+    return {
+        "timeout": float(os.getenv("GEMINI_TIMEOUT", "60")),
+        "max_retries": int(os.getenv("GEMINI_MAX_RETRIES", "3")),
+        "hedge": os.getenv("GEMINI_HEDGE", "0").lower() in ("1", "true", "yes", "oui"),
+    }
+
+
+def backoff_delay(attempt):
+    """Délai avant la tentative suivante (backoff exponentiel, full jitter)."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt))
+
+
+def _send(model, model_name, prompt, timeout):
+    start = time.perf_counter()
+    response = model.generate_content(prompt, request_options={"timeout": timeout})
+    # Accès au texte dans le thread d'appel : lève ValueError si la réponse est bloquée
+    response.text
+    elapsed = time.perf_counter() - start
+    record_latency(model_name, elapsed)
+    metrics.LLM_DURATION.observe(elapsed, model=model_name)
+    return response
+
+
+def _submit_hedge_call(model, model_name, prompt, timeout):
+    """Lance `_send` sur le pool si une place est libre ; sinon retourne None."""
+    if not _hedge_slots.acquire(blocking=False):
+        return None
+    try:
+        future = _hedge_pool.submit(_send, model, model_name, prompt, timeout)
+    except Exception:
+        _hedge_slots.release()
+        raise
+    future.add_done_callback(lambda _: _hedge_slots.release())
+    return future
+
+
+def _send_hedged(model, model_name, prompt, timeout, hedge_after):
+    deadline = time.monotonic() + timeout
+    first = _submit_hedge_call(model, model_name, prompt, timeout)
+    if first is None:
+        metrics.LLM_REQUESTS.inc(model=model_name, outcome="hedge_skipped")
+        return _send(model, model_name, prompt, timeout)
+    futures = [first]
+    done, _ = wait(futures, timeout=hedge_after)
+    if not done:
+        second = _submit_hedge_call(model, model_name, prompt, timeout)
+        if second is None:
+            logging.info(f"Gemini ({model_name}) : réponse au-delà du p95, pool saturé, pas de doublage.")
+            metrics.LLM_REQUESTS.inc(model=model_name, outcome="hedge_skipped")
+        else:
+            logging.info(f"Gemini ({model_name}) : réponse au-delà du p95 ({hedge_after:.1f} s), requête doublée.")
+            metrics.LLM_REQUESTS.inc(model=model_name, outcome="hedge")
+            futures.append(second)
+
+    pending = set(futures)
+    error = None
+    try:
+        while pending:
+            done, pending = wait(
+                pending, timeout=max(0, deadline - time.monotonic()), return_when=FIRST_COMPLETED
+            )
+            if not done:
+                raise TimeoutError(f"Pas de réponse de Gemini ({model_name}) après {timeout:.0f} s.")
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+    finally:
+        # Un appel déjà démarré ne peut pas être interrompu : il garde sa place
+        # jusqu'à sa réponse ou son échéance (request_options timeout)
+        for future in pending:
+            future.cancel()
+
+
+def generate(
+    prompt,
+    model_name,
+    generation_config=None,
+    safety_settings=None,
+    timeout=None,
+    max_retries=None,
+    hedge=None,
+):
+    """
+    Appelle generate_content avec échéance, relances sur erreur transitoire et,
+    si `hedge` est actif, requête doublée au-delà du p95. Retourne la réponse Gemini.
+    """
+    settings = default_settings()
+    timeout = timeout or settings["timeout"]
+    max_retries = settings["max_retries"] if max_retries is None else max_retries
+    hedge = settings["hedge"] if hedge is None else hedge
+    model = get_model(model_name, generation_config, safety_settings)
+
+    for attempt in range(max_retries + 1):
+        try:
+            hedge_after = latency_p95(model_name) if hedge else None
+            if hedge_after is None:
+                response = _send(model, model_name, prompt, timeout)
+            else:
+                response = _send_hedged(model, model_name, prompt, timeout, hedge_after)
+            metrics.LLM_REQUESTS.inc(model=model_name, outcome="ok")
+            return response
+        except TRANSIENT_ERRORS as e:
+            if attempt == max_retries:
+                metrics.LLM_REQUESTS.inc(model=model_name, outcome="error")
+                raise
+            metrics.LLM_REQUESTS.inc(model=model_name, outcome="retry")
+            delay = backoff_delay(attempt)
+            logging.warning(
+                f"Gemini ({model_name}) : erreur transitoire ({e.__class__.__name__}), "
+                f"nouvelle tentative dans {delay:.1f} s ({attempt + 1}/{max_retries})."
+            )
+            time.sleep(delay)
+        except Exception:
+            metrics.LLM_REQUESTS.inc(model=model_name, outcome="error")
+            raise
+
+
+def stream(
+    prompt,
+    model_name,
+    generation_config=None,
+    safety_settings=None,
+    timeout=None,
+    max_retries=None,
+):
+    """
+    Variante en streaming de `generate` : produit le texte morceau par morceau.
+    Les relances ne sont possibles que tant qu'aucun morceau n'a été transmis.
+    """
+    settings = default_settings()
+    timeout = timeout or settings["timeout"]
+    max_retries = settings["max_retries"] if max_retries is None else max_retries
+    model = get_model(model_name, generation_config, safety_settings)
+
+    for attempt in range(max_retries + 1):
+        started = False
+        start = time.perf_counter()
+        try:
+            response = model.generate_content(
+                prompt, stream=True, request_options={"timeout": timeout}
+            )
+            for chunk in response:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Morceau sans texte (fin de flux, filtrage de sécurité...)
+                    continue
+                if text:
+                    if not started:
+                        metrics.LLM_FIRST_CHUNK.observe(time.perf_counter() - start, model=model_name)
+                    started = True
+                    yield text
+            # Durée du flux complet, comparable à celle des appels non streamés
+            metrics.LLM_DURATION.observe(time.perf_counter() - start, model=model_name)
+            metrics.LLM_REQUESTS.inc(model=model_name, outcome="ok")
+            return
+        except TRANSIENT_ERRORS as e:
+            if started or attempt == max_retries:
+                metrics.LLM_REQUESTS.inc(model=model_name, outcome="error")
+                raise
+            metrics.LLM_REQUESTS.inc(model=model_name, outcome="retry")
+            delay = backoff_delay(attempt)
+            logging.warning(
+                f"Gemini ({model_name}) : erreur transitoire ({e.__class__.__name__}), "
+                f"nouvelle tentative dans {delay:.1f} s ({attempt + 1}/{max_retries})."
+            )
+            time.sleep(delay)
+        except Exception:
+            metrics.LLM_REQUESTS.inc(model=model_name, outcome="error")
+            raise
@@ -0,0 +1,210 @@
+import os
+import re
+import json
+import math
+import time
+import random
+import threading
+
+from google.api_core import exceptions as google_exceptions
+
+from cache_utils import make_key
+
+# Backend Gemini factice, pour mesurer le pipeline et tester l'application
+# sans clé API ni réseau (GEMINI_BACKEND=fake).
+#
+# Il remplace genai.GenerativeModel derrière gemini_client.get_model et répond
+# aux mêmes appels que main.py et web_app.py : extraction (JSON), corps de
+# lettre (texte, éventuellement en streaming), single-pass (JSON structuré),
+# e-mail et message LinkedIn. Les réponses ne dépendent que du prompt ; la
+# latence et les erreurs sont tirées d'un générateur pseudo-aléatoire initialisé
+# par GEMINI_FAKE_SEED, le prompt et le numéro d'appel pour ce prompt.
+#
+# Réglages (variables d'environnement) :
+#   GEMINI_FAKE_LATENCY      fixed:MS | uniform:MIN_MS:MAX_MS | lognormal:MEDIANE_MS:SIGMA
+#                            (défaut fixed:200)
+#   GEMINI_FAKE_ERROR_RATE   probabilité d'une erreur transitoire (503/429), défaut 0
+#   GEMINI_FAKE_CHUNK_DELAY  délai entre deux morceaux en streaming, en ms (défaut 30)
+#   GEMINI_FAKE_SEED         graine des tirages (défaut 0)
+
+AD_TEXT_RE = re.compile(r"\n\s*---\n(.*?)\n\s*---\n", re.DOTALL)
+EXTRACTED_FIELD_RE = r"- {label} : (.+)"
+# Champs explicites d'une annonce (« Entreprise : ... »), repris tels quels
+AD_FIELD_RE = r"(?mi)^\s*{label}\s*:\s*(.+?)\s*$"
+
+# Vocabulaire reconnu dans les annonces pour remplir les compétences et outils
+SKILLS = [
+    "gestion de projet", "conception", "simulation", "modélisation", "analyse de données",
+    "automatisme", "mécanique", "électronique", "programmation", "machine learning",
+    "calcul", "qualité", "maintenance", "communication", "anglais",
+]
+TOOLS = [
+    "python", "java", "c++", "matlab", "simulink", "solidworks", "catia", "abaqus",
+    "ansys", "excel", "sql", "git", "docker", "labview", "autocad",
+]
+COMPANIES = ["Airbus", "Safran", "Thales", "Renault", "Dassault Systèmes", "Schneider Electric"]
+SECTORS = ["aéronautique", "industrie", "tech", "énergie", "conseil", "automobile"]
+
+_call_counts = {}
+_call_counts_lock = threading.Lock()
+
+
+def enabled():
+    """Vrai si le backend factice est sélectionné (GEMINI_BACKEND=fake)."""
+    return os.getenv("GEMINI_BACKEND", "").lower() == "fake"
+
+
+def parse_latency(spec):
+    """Transforme `fixed:200`, `uniform:100:800` ou `lognormal:800:0.4` en fonction de tirage (secondes)."""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(":") if v]
+    if kind == "fixed":
+        return lambda rng: values[0] / 1000
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1]) / 1000
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1]) / 1000
+    raise ValueError(f"GEMINI_FAKE_LATENCY invalide : {spec!r}")
+
+
+def _rng(prompt):
+    """Générateur propre à ce prompt et à ce numéro d'appel (tirages reproductibles)."""
+    prompt_key = make_key(prompt)
+    with _call_counts_lock:
+        count = _call_counts.get(prompt_key, 0)
+        _call_counts[prompt_key] = count + 1
+    seed = make_key(os.getenv("GEMINI_FAKE_SEED", "0"), prompt_key, count)
+    return random.Random(seed)
+
+
+def _pick(options, prompt, salt):
+    digest = make_key(prompt, salt)
+    return options[int(digest[:8], 16) % len(options)]
+
+
+def fake_job_info(ad_text):
+    """Informations d'annonce déterministes, construites à partir du texte."""
+    lowered = ad_text.lower()
+    is_internship = "stage" in lowered
+    entreprise = re.search(AD_FIELD_RE.format(label="Entreprise"), ad_text)
+    poste = re.search(AD_FIELD_RE.format(label="Poste"), ad_text)
+    skills = [s for s in SKILLS if s in lowered] or SKILLS[:3]
+    tools = [t for t in TOOLS if re.search(rf"(?<!\w){re.escape(t)}(?!\w)", lowered)]
+    return {
+        "entreprise": entreprise.group(1) if entreprise else _pick(COMPANIES, ad_text, "entreprise"),
+        "poste": poste.group(1) if poste else ("Stage Ingénieur" if is_internship else "Ingénieur"),
+        "type_contrat": "Stage" if is_internship else "CDI",
+        "duree": "6 mois" if is_internship else None,
+        "localisation": "Paris",
+        "date_debut": None,
+        "competences_requises": skills,
+        "outils_technologies": tools,
+        "niveau_etudes": "Bac+5",
+        "langues": {"francais": "courant", "anglais": "professionnel"},
+        "salaire": None,
+        "avantages": ["Télétravail partiel"],
+        "missions_principales": ["Participer aux projets de l'équipe", "Rédiger la documentation"],
+        "secteur": _pick(SECTORS, ad_text, "secteur"),
+        "valeurs_entreprise": ["innovation", "rigueur"],
+        "ton_annonce": "formel",
+    }
+
+
+def fake_letter_body(entreprise, poste):
+    """Corps de lettre factice de trois paragraphes."""
+    return "\n\n".join(
+        [
+            f"Actuellement élève ingénieur, je vous propose ma candidature pour le poste de {poste} "
+            f"chez {entreprise}. Les missions décrites dans votre annonce correspondent à mon projet.",
+            "Mes projets académiques et mes expériences m'ont permis de développer des compétences "
+            "techniques directement utiles à ces missions : conception, calcul et programmation.",
+            f"Je peux apporter à {entreprise} ma rigueur et ma capacité d'adaptation, et je serais "
+            "heureux d'échanger avec vous lors d'un entretien.",
+        ]
+    )
+
+
+def fake_response_text(prompt, generation_config):
+    """Texte de réponse selon le type d'appel reconnu dans le prompt."""
+    match = AD_TEXT_RE.search(prompt)
+    ad_text = match.group(1) if match else prompt
+
+    if "response_schema" in (generation_config or {}):
+        job_info = fake_job_info(ad_text)
+        body = fake_letter_body(job_info["entreprise"], job_info["poste"])
+        return json.dumps({"job_info": job_info, "corps_lettre": body}, ensure_ascii=False)
+
+    if "au format JSON strict" in prompt:
+        return json.dumps(fake_job_info(ad_text), ensure_ascii=False)
+
+    if '"objet"' in prompt and '"corps"' in prompt:
+        return json.dumps(
+            {"objet": "Échange sur votre parcours", "corps": "Bonjour, auriez-vous 10 minutes pour échanger ?"},
+            ensure_ascii=False,
+        )
+
+    if "email d'accompagnement" in prompt:
+        return (
+            "Madame, Monsieur,\n\nVeuillez trouver ci-joint mon CV et ma lettre de motivation.\n\n"
+            "Cordialement,"
+        )
+
+    entreprise = re.search(EXTRACTED_FIELD_RE.format(label="Entreprise"), prompt)
+    poste = re.search(EXTRACTED_FIELD_RE.format(label="Poste"), prompt)
+    return fake_letter_body(
+        entreprise.group(1).strip() if entreprise else _pick(COMPANIES, ad_text, "entreprise"),
+        poste.group(1).strip() if poste else "Ingénieur",
+    )
+
+
+class FakeCandidate:
+    finish_reason = "STOP"
+    safety_ratings = []
+
+
+class FakeResponse:
+    """Réponse au format attendu par les appelants (`.text`, `.candidates`)."""
+
+    def __init__(self, text):
+        self.text = text
+        self.candidates = [FakeCandidate()]
+
+
+class FakeGenerativeModel:
+    """Remplaçant de genai.GenerativeModel pour le backend factice."""
+
+    def __init__(self, model_name, generation_config=None, safety_settings=None):
+        self.model_name = model_name
+        self.generation_config = generation_config or {}
+        self.latency = parse_latency(os.getenv("GEMINI_FAKE_LATENCY", "fixed:200"))
+        self.error_rate = float(os.getenv("GEMINI_FAKE_ERROR_RATE", "0"))
+        self.chunk_delay = float(os.getenv("GEMINI_FAKE_CHUNK_DELAY", "30")) / 1000
+
+    def _wait(self, rng, timeout):
+        """Simule la latence, le délai dépassé et les erreurs transitoires."""
+        latency = self.latency(rng)
+        if timeout and latency > timeout:
+            time.sleep(timeout)
+            raise google_exceptions.DeadlineExceeded(f"Délai de {timeout} s dépassé (backend factice).")
+        if rng.random() < self.error_rate:
+            time.sleep(latency / 2)
+            error = rng.choice([google_exceptions.ServiceUnavailable, google_exceptions.ResourceExhausted])
+            raise error("Erreur simulée par le backend factice.")
+        time.sleep(latency)
+
+    def generate_content(self, prompt, stream=False, request_options=None, **kwargs):
+        timeout = (request_options or {}).get("timeout")
+        rng = _rng(prompt)
+        self._wait(rng, timeout)
+        text = fake_response_text(prompt, self.generation_config)
+        if not stream:
+            return FakeResponse(text)
+        return self._stream(text)
+
+    def _stream(self, text):
+        words = text.split(" ")
+        for i in range(0, len(words), 8):
+            if i:
+                time.sleep(self.chunk_delay)
+            chunk = " ".join(words[i:i + 8])
+            yield FakeResponse(chunk if i + 8 >= len(words) else chunk + " ")
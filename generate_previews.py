@@ -3,6 +3,9 @@ import subprocess
 import logging
 from pathlib import Path
 
+import latex_formats
+import latex_template
+
 # Configuration du logging
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -15,12 +18,8 @@ def compile_latex_to_pdf(tex_filepath):
     filename = os.path.basename(tex_filepath)
     base_filename = os.path.splitext(filename)[0]
 
-    command = [
-        "pdflatex",
-        "-interaction=nonstopmode",
-        f"-output-directory={directory}",
-        tex_filepath,
-    ]
+    fmt_name = latex_formats.read_format_marker(tex_filepath)
+    command = latex_formats.pdflatex_command(tex_filepath, fmt_name)
 
     try:
         logging.info(f"📄 Compilation de {filename} en PDF...")
@@ -42,6 +41,13 @@ def compile_latex_to_pdf(tex_filepath):
         )
         return False
     except subprocess.CalledProcessError as e:
+        if fmt_name:
+            logging.warning(f"⚠️  Échec avec le format {fmt_name}, nouvel essai sans format précompilé.")
+            latex_formats.detach_format(tex_filepath)
+            success = compile_latex_to_pdf(tex_filepath)
+            if success:
+                latex_formats.discard_format(fmt_name)
+            return success
         logging.error(f"❌ Erreur lors de la compilation LaTeX pour {filename}.")
         logging.error("--- LOG LATEX ---")
         logging.error(e.stdout)
@@ -79,9 +85,9 @@ def generate_preview_pdf(template_path, output_dir="output"):
     }
 
     # Remplacer les variables dans le template
-    filled_content = template_content
-    for key, value in variables.items():
-        filled_content = filled_content.replace(f"%%{key}%%", value)
+    template = latex_template.compile_template(template_content, Path(template_path).name, variables)
+    filled_content = template.render(variables)
+    filled_content = latex_formats.attach_format(filled_content, template_content)
 
     # Nom du fichier de sortie
     template_name = Path(template_path).stem
@@ -121,6 +127,15 @@ def generate_all_previews():
     logging.info(f"🚀 Génération des prévisualisations de templates")
     logging.info(f"{'='*60}\n")
 
+    # Construction (ou réutilisation) des formats précompilés des templates
+    templates = {}
+    for template_file in template_files:
+        template_path = os.path.join(templates_dir, template_file)
+        if os.path.exists(template_path):
+            with open(template_path, "r", encoding="utf-8") as f:
+                templates[template_file] = f.read()
+    latex_formats.ensure_formats(templates)
+
     for template_file in template_files:
         template_path = os.path.join(templates_dir, template_file)
 
@@ -0,0 +1,156 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+# Tâches de génération en arrière-plan pour l'application web.
+#
+# /generate enregistre la tâche et répond aussitôt avec son identifiant ; la
+# génération (Gemini + LaTeX) tourne sur un pool de threads du processus. Le
+# navigateur interroge /jobs/<id> : la tâche garde la liste de ses événements
+# (étapes, morceaux de lettre, résultat) pour qu'un client puisse reprendre à
+# partir du dernier événement reçu. Les tâches vivent en mémoire : le serveur
+# doit tourner dans un seul processus (plusieurs threads si besoin).
+
+DEFAULT_WORKERS = 2
+# Tâches en attente d'un worker au-delà desquelles les nouvelles sont refusées
+DEFAULT_MAX_PENDING = 200
+# Durée de conservation d'une tâche terminée, et nombre maximal de tâches gardées
+JOB_TTL_SECONDS = 3600
+MAX_JOBS = 500
+
+STATUS_QUEUED = "en_attente"
+STATUS_RUNNING = "en_cours"
+STATUS_DONE = "termine"
+STATUS_FAILED = "echec"
+
+
+def default_workers():
+    """Taille du pool (LETTRE_JOB_WORKERS, lue à l'appel)."""
+    return max(int(os.getenv("LETTRE_JOB_WORKERS", DEFAULT_WORKERS)), 1)
+
+
+def default_max_pending():
+    """Taille de la file d'attente (LETTRE_JOB_QUEUE_SIZE, lue à l'appel)."""
+    return max(int(os.getenv("LETTRE_JOB_QUEUE_SIZE", DEFAULT_MAX_PENDING)), 1)
+
+
+class Job:
+    """Une tâche et ses événements, dans l'ordre où ils ont été émis."""
+
+    def __init__(self, job_id):
+        self.id = job_id
+        self.status = STATUS_QUEUED
+        self.events = []
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._changed = threading.Condition()
+
+    def emit(self, event, data=None):
+        """Ajoute un événement (même format que les événements SSE)."""
+        with self._changed:
+            self.events.append((event, data))
+            self._changed.notify_all()
+
+    def finish(self):
+        """Marque la tâche terminée et réveille les flux qui attendent ses événements."""
+        with self._changed:
+            self.finished_at = time.time()
+            self._changed.notify_all()
+
+    def wait(self, since, timeout=None):
+        """
+        Attend (au plus `timeout` secondes) un événement au-delà des `since`
+        premiers ou la fin de la tâche. Retourne vrai si l'un ou l'autre est arrivé.
+        """
+        with self._changed:
+            return self._changed.wait_for(
+                lambda: len(self.events) > since or self.finished_at is not None, timeout
+            )
+
+
+class JobQueue:
+    """Pool de workers et registre des tâches en mémoire."""
+
+    def __init__(self, workers=None, ttl=JOB_TTL_SECONDS, max_jobs=MAX_JOBS, max_pending=None):
+        self.workers = workers or default_workers()
+        self.max_pending = max_pending or default_max_pending()
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Planifie `func(job, *args, **kwargs)` et retourne l'identifiant de la tâche,
+        ou None si `max_pending` tâches attendent déjà un worker (file pleine).
+        La valeur retournée par `func` devient le résultat de la tâche ; une
+        exception la marque en échec.
+        """
+        job = Job(uuid.uuid4().hex)
+        with self._lock:
+            self._prune()
+            pending = sum(1 for other in self._jobs.values() if other.status == STATUS_QUEUED)
+            if pending >= self.max_pending:
+                return None
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, func, args, kwargs)
+        return job.id
+
+    def _run(self, job, func, args, kwargs):
+        job.started_at = time.time()
+        job.status = STATUS_RUNNING
+        metrics.JOB_WAIT.observe(job.started_at - job.created_at)
+        try:
+            job.result = func(job, *args, **kwargs)
+            job.status = STATUS_DONE
+        except Exception as e:
+            logging.error(f"Tâche {job.id} en échec : {e}")
+            job.error = str(e)
+            job.status = STATUS_FAILED
+        finally:
+            job.finish()
+            metrics.JOBS.inc(status=job.status)
+
+    def _prune(self):
+        """Oublie les tâches terminées expirées, puis les plus anciennes au-delà de max_jobs."""
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at and now - job.finished_at > self.ttl:
+                del self._jobs[job_id]
+        finished = sorted(
+            (job for job in self._jobs.values() if job.finished_at), key=lambda job: job.finished_at
+        )
+        for job in finished[:max(len(self._jobs) - self.max_jobs, 0)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id):
+        """Tâche `job_id`, ou None si elle est inconnue ou expirée."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def position(self, job):
+        """Rang de `job` dans la file d'attente (1 = prochaine à démarrer, 0 si elle a démarré)."""
+        if job.status != STATUS_QUEUED:
+            return 0
+        with self._lock:
+            return 1 + sum(
+                1 for other in self._jobs.values()
+                if other.status == STATUS_QUEUED and other.created_at < job.created_at
+            )
+
+    def stats(self):
+        """Nombre de tâches par statut."""
+        counts = {}
+        with self._lock:
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return {"workers": self.workers, "max_pending": self.max_pending, **counts}
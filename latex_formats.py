@@ -0,0 +1,206 @@
+import os
+import re
+import hashlib
+import logging
+import subprocess
+
+# Formats precompiles (instantane du preambule) des templates LaTeX.
+#
+# Le preambule d'un template charge tikz, fontawesome5, babel, lmodern... a
+# chaque compilation. On le "dumpe" une fois pour toutes dans un fichier .fmt
+# (package mylatexformat), puis on compile les lettres avec `-fmt`. Seule la
+# partie statique du preambule est dumpee : elle s'arrete a la premiere ligne
+# contenant un placeholder (%%NOM_COMPLET%%...), marquee par \endofdump.
+#
+# Le nom du format contient un hash de cette partie statique : modifier le
+# preambule d'un template produit un nouveau nom, donc une reconstruction.
+
+FORMATS_DIR = os.path.join("templates", "formats")
+
+# Premiere ligne ajoutee aux .tex compiles avec un format (un simple commentaire)
+FORMAT_MARKER = "% lettre-format: "
+
+PLACEHOLDER_RE = re.compile(r"%%[A-Z_]+%%")
+
+# Noms des formats deja construits dans ce processus
+_built_formats = set()
+
+
+def static_preamble(template_source):
+    """
+    Retourne la partie du preambule qui ne depend d'aucun placeholder, ou
+    None si le template ne se prete pas a un format precompile.
+    """
+    end = template_source.find("\\begin{document}")
+    if end == -1:
+        return None
+
+    lines = template_source[:end].splitlines(keepends=True)
+    static_lines = []
+    for line in lines:
+        if PLACEHOLDER_RE.search(line):
+            break
+        static_lines.append(line)
+
+    preamble = "".join(static_lines)
+    if "\\documentclass" not in preamble:
+        return None
+    return preamble
+
+
+def format_name(template_source):
+    """Nom du format associe au preambule statique d'un template (None si non applicable)."""
+    preamble = static_preamble(template_source)
+    if preamble is None:
+        return None
+    digest = hashlib.sha256(preamble.encode("utf-8")).hexdigest()[:12]
+    return f"lettre-{digest}"
+
+
+def format_path(name):
+    """Chemin absolu du format, sans l'extension .fmt (forme attendue par `-fmt`)."""
+    return os.path.abspath(os.path.join(FORMATS_DIR, name))
+
+
+def build_format(template_source):
+    """Construit le format d'un template s'il n'existe pas encore. Retourne son nom ou None."""
+    name = format_name(template_source)
+    if name is None:
+        return None
+    if name in _built_formats or os.path.exists(format_path(name) + ".fmt"):
+        _built_formats.add(name)
+        return name
+
+    os.makedirs(FORMATS_DIR, exist_ok=True)
+    source_path = os.path.join(FORMATS_DIR, f"{name}.tex")
+    with open(source_path, "w", encoding="utf-8") as f:
+        f.write(static_preamble(template_source))
+        f.write("\\endofdump\n\\begin{document}\n\\end{document}\n")
+
+    command = [
+        "pdflatex",
+        "-ini",
+        "-interaction=nonstopmode",
+        f"-jobname={name}",
+        f"-output-directory={FORMATS_DIR}",
+        "&pdflatex",
+        "mylatexformat.ltx",
+        source_path,
+    ]
+    try:
+        subprocess.run(command, check=True, capture_output=True, text=True)
+    except FileNotFoundError:
+        logging.warning(" pdflatex introuvable : les formats precompiles ne sont pas construits.")
+        return None
+    except subprocess.CalledProcessError as e:
+        logging.warning(f" Impossible de construire le format {name}, compilation classique utilisee.")
+        logging.debug(e.stdout)
+        return None
+    finally:
+        for ext in [".tex", ".log"]:
+            aux_file = os.path.join(FORMATS_DIR, f"{name}{ext}")
+            if os.path.exists(aux_file):
+                os.remove(aux_file)
+
+    logging.info(f" Format precompile construit : {name}.fmt")
+    _built_formats.add(name)
+    return name
+
+
+def ensure_formats(templates_dict):
+    """
+    Construit (si besoin) le format de chaque template et supprime les formats
+    obsoletes. Retourne {nom_template: nom_format ou None}.
+    """
+    formats = {
+        template_file: build_format(template_source)
+        for template_file, template_source in templates_dict.items()
+    }
+
+    current = {name for name in formats.values() if name}
+    if current and os.path.isdir(FORMATS_DIR):
+        for filename in os.listdir(FORMATS_DIR):
+            stem, ext = os.path.splitext(filename)
+            if ext == ".fmt" and stem.startswith("lettre-") and stem not in current:
+                os.remove(os.path.join(FORMATS_DIR, filename))
+                logging.info(f" Format obsolete supprime : {filename}")
+    return formats
+
+
+def attach_format(tex_content, template_source):
+    """
+    Prepare un .tex rendu pour une compilation avec le format de son template :
+    ajoute la ligne marqueur et \\endofdump apres le preambule statique.
+    Retourne le contenu inchange si le format n'est pas disponible.
+    """
+    name = format_name(template_source)
+    if name is None or name not in _built_formats:
+        return tex_content
+
+    preamble = static_preamble(template_source)
+    if not tex_content.startswith(preamble):
+        return tex_content
+
+    return (
+        f"{FORMAT_MARKER}{name}\n"
+        + preamble
+        + "\\endofdump\n"
+        + tex_content[len(preamble):]
+    )
+
+
+def read_format_marker(tex_filepath):
+    """Retourne le nom du format demande par un .tex, ou None."""
+    with open(tex_filepath, "r", encoding="utf-8") as f:
+        first_line = f.readline().rstrip("\n")
+    if not first_line.startswith(FORMAT_MARKER):
+        return None
+
+    name = first_line[len(FORMAT_MARKER):].strip()
+    if not os.path.exists(format_path(name) + ".fmt"):
+        return None
+    return name
+
+
+def detach_format(tex_filepath):
+    """Retire la ligne marqueur et \\endofdump d'un .tex pour une compilation classique."""
+    with open(tex_filepath, "r", encoding="utf-8") as f:
+        lines = f.readlines()
+    if not lines or not lines[0].startswith(FORMAT_MARKER):
+        return
+
+    lines = [line for line in lines[1:] if line != "\\endofdump\n"]
+    with open(tex_filepath, "w", encoding="utf-8") as f:
+        f.writelines(lines)
+
+
+def discard_format(name):
+    """Supprime un format defectueux ; il sera reconstruit au prochain chargement des templates."""
+    _built_formats.discard(name)
+    try:
+        # Deux compilations en parallele peuvent ecarter le meme format
+        os.remove(format_path(name) + ".fmt")
+    except FileNotFoundError:
+        return
+    logging.warning(f" Format {name} supprime, il sera reconstruit au prochain lancement.")
+
+
+def pdflatex_command(tex_filepath, fmt_name=None):
+    """Commande pdflatex pour compiler `tex_filepath`, avec un format precompile si fourni."""
+    command = ["pdflatex", "-interaction=nonstopmode"]
+    if fmt_name:
+        command.append(f"-fmt={format_path(fmt_name)}")
+    command += [f"-output-directory={os.path.dirname(tex_filepath)}", tex_filepath]
+    return command
+
+
+if __name__ == "__main__":
+    # Construction explicite des formats : python latex_formats.py
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    templates = {}
+    for filename in sorted(os.listdir("templates")):
+        if filename.endswith(".tex"):
+            with open(os.path.join("templates", filename), "r", encoding="utf-8") as f:
+                templates[filename] = f.read()
+    for template_file, name in ensure_formats(templates).items():
+        logging.info(f"{template_file} -> {name or 'aucun format'}")
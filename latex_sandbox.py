@@ -0,0 +1,125 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+
+try:
+    import resource
+except ImportError:  # Windows : pas de limite mémoire, seule l'échéance s'applique
+    resource = None
+
+# Dossiers de compilation isolés.
+#
+# Chaque lettre est rendue et compilée dans son propre dossier temporaire, sur
+# /dev/shm (tmpfs, en mémoire) quand il est disponible : deux générations pour
+# la même entreprise ne se marchent plus dessus (.tex, .aux, .log) et les
+# fichiers intermédiaires ne touchent pas le disque. Le PDF terminé est ensuite
+# copié dans output/ sous un nom temporaire puis renommé, ce qui rend sa
+# publication atomique. pdflatex tourne avec une échéance et, sous POSIX, une
+# limite de mémoire. La limite est posée par un lanceur (prlimit, sinon un petit
+# script Python qui l'applique puis exécute pdflatex) et non par preexec_fn, qui
+# n'est pas sûr quand d'autres threads tournent (workers web, mode --watch).
+
+SANDBOX_PREFIX = "lettre-latex-"
+DEFAULT_TIMEOUT = 60
+DEFAULT_MEMORY_MB = 2048
+# Au-delà, un dossier de compilation laissé par un processus interrompu est supprimé
+STALE_SECONDS = 3600
+
+
+def sandbox_root():
+    """Dossier parent des compilations : LETTRE_COMPILE_DIR, sinon /dev/shm, sinon le dossier temporaire."""
+    configured = os.getenv("LETTRE_COMPILE_DIR")
+    if configured:
+        os.makedirs(configured, exist_ok=True)
+        return configured
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+
+def compile_timeout():
+    """Échéance d'une passe pdflatex en secondes (LETTRE_PDFLATEX_TIMEOUT)."""
+    return float(os.getenv("LETTRE_PDFLATEX_TIMEOUT", DEFAULT_TIMEOUT))
+
+
+def memory_limit_bytes():
+    """Mémoire maximale de pdflatex (LETTRE_PDFLATEX_MEMORY_MB, 0 = sans limite)."""
+    return int(os.getenv("LETTRE_PDFLATEX_MEMORY_MB", DEFAULT_MEMORY_MB)) * 1024 * 1024
+
+
+def create():
+    """Crée un dossier de compilation et retourne son chemin."""
+    return tempfile.mkdtemp(prefix=SANDBOX_PREFIX, dir=sandbox_root())
+
+
+def is_sandbox(directory):
+    """Vrai si `directory` est un dossier de compilation créé par create()."""
+    return os.path.basename(os.path.normpath(directory)).startswith(SANDBOX_PREFIX)
+
+
+def discard(path):
+    """Supprime le dossier de compilation contenant `path` (sans effet hors dossier de compilation)."""
+    directory = os.path.dirname(path)
+    if directory and is_sandbox(directory):
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def purge_stale(max_age=STALE_SECONDS):
+    """Supprime les dossiers de compilation abandonnés (processus interrompu)."""
+    root = sandbox_root()
+    now = time.time()
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        try:
+            if name.startswith(SANDBOX_PREFIX) and now - os.path.getmtime(path) > max_age:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            continue
+
+
+def publish(src_path, dest_path):
+    """
+    Copie `src_path` en `dest_path` de façon atomique : copie sous un nom
+    temporaire dans le dossier de destination, puis renommage.
+    """
+    directory = os.path.dirname(dest_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{dest_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, dest_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+# Lanceur de secours sans prlimit : fixe RLIMIT_AS puis remplace le processus par la commande
+_LIMIT_WRAPPER = (
+    "import os, sys, resource; "
+    "limit = int(sys.argv[1]); "
+    "resource.setrlimit(resource.RLIMIT_AS, (limit, limit)); "
+    "os.execvp(sys.argv[2], sys.argv[2:])"
+)
+
+
+def limited_command(command):
+    """
+    `command` précédée d'un lanceur qui plafonne l'espace d'adressage de pdflatex.
+    Sans limite possible (Windows, limite à 0, pdflatex introuvable), la
+    commande est retournée telle quelle.
+    """
+    limit = memory_limit_bytes()
+    if limit <= 0 or resource is None or os.name != "posix" or shutil.which(command[0]) is None:
+        return command
+    if shutil.which("prlimit"):
+        return ["prlimit", f"--as={limit}", "--", *command]
+    return [sys.executable, "-c", _LIMIT_WRAPPER, str(limit), *command]
+
+
+def subprocess_options():
+    """Options de subprocess.run pour pdflatex : échéance."""
+    return {"timeout": compile_timeout()}
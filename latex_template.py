@@ -0,0 +1,99 @@
+import re
+import logging
+
+# Moteur de rendu des templates LaTeX.
+#
+# Un template est découpé une seule fois, au chargement, en une liste de
+# segments : texte littéral et emplacements (%%NOM_COMPLET%%, %%CORPS_LETTRE%%...).
+# Le rendu se fait ensuite en un seul join, chaque valeur étant échappée pour
+# LaTeX, au lieu d'un str.replace par placeholder sur tout le template.
+
+PLACEHOLDER_RE = re.compile(r"%%([A-Z_]+)%%")
+
+# Les valeurs (profil, entreprise, poste, texte de Gemini) sont du texte brut :
+# tous les caractères spéciaux LaTeX sont échappés, antislash et accolades compris,
+# pour qu'une valeur ne puisse ni casser la compilation ni injecter une commande.
+LATEX_ESCAPES = {
+    "\\": r"\textbackslash{}",
+    "{": r"\{",
+    "}": r"\}",
+    "&": r"\&",
+    "%": r"\%",
+    "$": r"\$",
+    "#": r"\#",
+    "_": r"\_",
+    "~": r"\textasciitilde{}",
+    "^": r"\textasciicircum{}",
+}
+LATEX_SPECIAL_RE = re.compile("|".join(re.escape(char) for char in LATEX_ESCAPES))
+
+# Placeholders qu'un template de lettre doit contenir
+REQUIRED_PLACEHOLDERS = ("CORPS_LETTRE",)
+
+
+def escape_latex(value):
+    """Échappe les caractères spéciaux LaTeX (\\ { } & % $ # _ ~ ^) d'une valeur insérée dans un template."""
+    return LATEX_SPECIAL_RE.sub(lambda match: LATEX_ESCAPES[match.group()], str(value))
+
+
+class CompiledTemplate:
+    """
+    Template LaTeX précompilé : segments littéraux aux indices pairs,
+    noms de placeholders aux indices impairs. Le texte d'origine reste
+    disponible dans `source` (formats précompilés, prévisualisations).
+    """
+
+    def __init__(self, source, name="template"):
+        self.source = source
+        self.name = name
+        self.segments = PLACEHOLDER_RE.split(source)
+        self.placeholders = set(self.segments[1::2])
+        self._reported_missing = set()
+
+    def check(self, known_placeholders, required_placeholders=REQUIRED_PLACEHOLDERS):
+        """
+        Signale les placeholders inconnus (aucune valeur ne leur sera fournie)
+        et les placeholders obligatoires absents. Retourne (inconnus, manquants).
+        """
+        unknown = sorted(self.placeholders - set(known_placeholders))
+        missing = sorted(set(required_placeholders) - self.placeholders)
+        if unknown:
+            logging.warning(
+                f"Template {self.name} : placeholder(s) inconnu(s) {', '.join(unknown)} "
+                "(laissés visibles dans le PDF)."
+            )
+        if missing:
+            logging.warning(
+                f"Template {self.name} : placeholder(s) obligatoire(s) absent(s) {', '.join(missing)}."
+            )
+        return unknown, missing
+
+    def render(self, values):
+        """
+        Remplit le template en un seul passage ; les valeurs sont échappées pour
+        LaTeX. Un placeholder sans valeur reste visible dans le PDF (%%NOM%%) et
+        est signalé dans les logs.
+        """
+        parts = list(self.segments)
+        missing = set()
+        for i in range(1, len(parts), 2):
+            value = values.get(parts[i])
+            if value is None:
+                missing.add(parts[i])
+                value = f"%%{parts[i]}%%"
+            parts[i] = escape_latex(value)
+        if missing - self._reported_missing:
+            logging.warning(
+                f"Template {self.name} : placeholder(s) sans valeur {', '.join(sorted(missing))} "
+                "(laissés visibles dans le PDF)."
+            )
+            self._reported_missing |= missing
+        return "".join(parts)
+
+
+def compile_template(source, name="template", known_placeholders=None):
+    """Découpe un template en segments et, si `known_placeholders` est fourni, le vérifie."""
+    template = CompiledTemplate(source, name)
+    if known_placeholders is not None:
+        template.check(known_placeholders)
+    return template
@@ -1,10 +1,27 @@
 ﻿import os
 import json
+import hashlib
+import argparse
+import functools
+import time
 import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import google.generativeai as genai
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
 
 from dotenv import load_dotenv
+from cache_utils import CACHE_DB_PATH, FileCache, SQLiteCache, make_key, normalize_text
+import ad_compaction
+import ad_manifest
+import duplicate_index
+import gemini_client
+import gemini_fake
+import latex_formats
+import latex_sandbox
+import latex_template
+import metrics
+import skill_matching
+import watch_folder
 import logging
 from datetime import datetime
 
@@ -17,22 +34,29 @@ logging.basicConfig(
 
 
 def load_config():
-    """Charge la cle API depuis .env et la configuration utilisateur depuis config.json."""
+    """
+    Charge la cle API depuis .env et la configuration utilisateur depuis
+    config.json (ou le fichier indique par LETTRE_CONFIG).
+    """
+    config_path = os.getenv("LETTRE_CONFIG", "config.json")
     try:
         load_dotenv()
         api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key and gemini_fake.enabled():
+            logging.info("Backend Gemini factice actif (GEMINI_BACKEND=fake) : aucune cle API requise.")
+            api_key = "fake"
         if not api_key:
             logging.error(
                 "Cle API Gemini non trouvee. Assurez-vous qu'elle est definie dans le fichier .env"
             )
             return None, None
 
-        with open("config.json", "r", encoding="utf-8") as f:
+        with open(config_path, "r", encoding="utf-8") as f:
             user_config = json.load(f)
 
         return api_key, user_config
     except FileNotFoundError:
-        logging.error("Le fichier 'config.json' est introuvable. Veuillez le creer.")
+        logging.error(f"Le fichier '{config_path}' est introuvable. Veuillez le creer (modele : config.example).")
         return None, None
     except Exception as e:
         logging.error(f"Erreur lors du chargement de la configuration : {e}")
@@ -42,10 +66,21 @@ def load_config():
 # --- 2. INTERACTION AVEC L'API GEMINI ---
 
 
-def extract_job_info(job_ad_text):
-    """Extrait automatiquement les informations cles de l'annonce avec Gemini."""
+def strip_json_fences(text):
+    """Retire les balises markdown (```json ... ```) entourant une reponse JSON."""
+    text = text.strip()
+    if text.startswith("```json"):
+        text = text[7:]
+    if text.startswith("```"):
+        text = text[3:]
+    if text.endswith("```"):
+        text = text[:-3]
+    return text.strip()
 
-    prompt = f"""
+
+EXTRACTION_MODEL = "gemini-2.5-flash"
+
+EXTRACTION_PROMPT = """
     Tu es un expert en analyse d'annonces d'emploi. Analyse cette annonce et extrais les informations suivantes au format JSON strict.
     
     **Annonce :**
@@ -77,10 +112,54 @@ def extract_job_info(job_ad_text):
     Si une information n'est pas disponible, utilise null ou une liste vide selon le type.
     """
 
+# Toute modification du prompt change sa version et invalide le cache d'extraction
+EXTRACTION_PROMPT_VERSION = hashlib.sha256(EXTRACTION_PROMPT.encode("utf-8")).hexdigest()[:12]
+
+EXTRACTION_CACHE = SQLiteCache("extraction")
+
+
+def compact_ad_for_prompt(job_ad_text, stage, with_job_info=False):
+    """
+    Compacte l'annonce avant de l'insérer dans un prompt (voir ad_compaction.py)
+    et comptabilise les tokens économisés pour l'étape `stage`.
+    """
+    compacted, report = ad_compaction.compact_job_ad(
+        job_ad_text, ad_compaction.default_budget(with_job_info)
+    )
+    if report["tokens_economises"] > 0:
+        metrics.PROMPT_TOKENS_SAVED.inc(report["tokens_economises"], stage=stage)
+        logging.info(
+            f"Annonce compactée ({stage}) : {report['caracteres_avant']} -> {report['caracteres_apres']} caractères, "
+            f"~{report['tokens_economises']} tokens économisés"
+            + (" (tronquée au budget)" if report["tronquee"] else "")
+        )
+    return compacted
+
+
+@metrics.timed("extraction")
+def extract_job_info(job_ad_text, use_cache=True):
+    """Extrait automatiquement les informations cles de l'annonce avec Gemini."""
+
+    # La clé porte sur l'annonce compactée : seul ce texte est envoyé au modèle
+    job_ad_text = compact_ad_for_prompt(job_ad_text, "extraction")
+    cache_key = make_key(
+        normalize_text(job_ad_text),
+        EXTRACTION_PROMPT_VERSION,
+        gemini_client.backend_model_id(EXTRACTION_MODEL),
+    )
+    if use_cache:
+        cached = EXTRACTION_CACHE.get(cache_key)
+        if cached is not None:
+            logging.info(
+                f" Informations extraites depuis le cache : {cached.get('entreprise', 'N/A')} - {cached.get('poste', 'N/A')}"
+            )
+            return cached
+
+    prompt = EXTRACTION_PROMPT.format(job_ad_text=job_ad_text)
+
     try:
         logging.info(" Extraction des informations de l'annonce...")
-        model = genai.GenerativeModel("gemini-2.5-flash")
-        response = model.generate_content(prompt)
+        response = gemini_client.generate(prompt, EXTRACTION_MODEL)
 
         # Nettoyer la reponse pour extraire uniquement le JSON
         text = response.text.strip()
@@ -90,15 +169,8 @@ def extract_job_info(job_ad_text):
                 print(f"Safety ratings: {candidate.safety_ratings}")
 
         # Enlever les balises markdown si presentes
-        if text.startswith("```json"):
-            text = text[7:]
-        if text.startswith("```"):
-            text = text[3:]
-        if text.endswith("```"):
-            text = text[:-3]
-        text = text.strip()
-
-        job_info = json.loads(text)
+        job_info = json.loads(strip_json_fences(text))
+        EXTRACTION_CACHE.set(cache_key, job_info)
 
         logging.info(f" Informations extraites :")
         logging.info(f"   - Entreprise : {job_info.get('entreprise', 'N/A')}")
@@ -112,60 +184,91 @@ def extract_job_info(job_ad_text):
         return job_info
 
     except json.JSONDecodeError as e:
+        metrics.FAILURES.inc(stage="extraction")
         logging.error(f" Erreur de parsing JSON : {e}")
         logging.error(f"Reponse brute : {response.text[:500]}")
         return None
     except Exception as e:
+        metrics.FAILURES.inc(stage="extraction")
         logging.error(f" Erreur lors de l'extraction : {e}")
         return None
 
 
+@metrics.timed("score")
 def calculate_match_score(user_profile, job_info):
     """Calcule un score de compatibilite entre le profil et l'annonce."""
     if not job_info:
         return None
+    return skill_matching.score_job_infos(user_profile, [job_info])[0]
 
-    score = 0
-    details = []
 
-    user_skills = set([s.lower() for s in user_profile.get("competences_cles", [])])
-    required_skills = set([s.lower() for s in job_info.get("competences_requises", [])])
-    required_tools = set([s.lower() for s in job_info.get("outils_technologies", [])])
+@metrics.timed("score_lot")
+def calculate_match_scores(user_profile, job_infos):
+    """
+    Score de compatibilité d'un lot d'annonces en un seul passage (voir
+    skill_matching.py). Retourne une liste alignée sur `job_infos`.
+    """
+    return skill_matching.score_job_infos(user_profile, job_infos)
 
-    # Matching des competences
-    matching_skills = user_skills.intersection(required_skills)
-    matching_tools = user_skills.intersection(required_tools)
 
-    if matching_skills:
-        score += len(matching_skills) * 20
-        details.append(
-            f" {len(matching_skills)} competences correspondent : {', '.join(matching_skills)}"
-        )
+LETTER_MODEL = "gemini-2.5-flash"
 
-    if matching_tools:
-        score += len(matching_tools) * 15
-        details.append(f" {len(matching_tools)} outils  : {', '.join(matching_tools)}")
+LETTER_GENERATION_CONFIG = {
+    "temperature": 0.6,
+    "top_p": 0.9,
+    "top_k": 64,
+}
 
-    # Bonus si toutes les competences requises sont couvertes
-    if required_skills and required_skills.issubset(user_skills):
-        score += 20
-        details.append(" Toutes les competences requises sont maitrisees ")
+LETTER_SAFETY_SETTINGS = {
+    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_ONLY_HIGH,
+    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_ONLY_HIGH,
+    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_ONLY_HIGH,
+    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_ONLY_HIGH,
+}
 
-    score = min(score, 100)  # Plafonner à 100
+LETTER_CACHE = SQLiteCache("letter_body")
 
-    return {
-        "score": score,
-        "details": details,
-        "matching_skills": list(matching_skills),
-        "matching_tools": list(matching_tools),
-        "missing_skills": list(required_skills - user_skills),
-    }
+# Consignes de rédaction partagées par le mode en deux appels et le mode single-pass
+LETTER_GUIDELINES = """FORMAT :
+- Génère UNIQUEMENT le corps de la lettre (3 paragraphes maximum)
+- N'inclus PAS : formule d'appel, objet, adresse, date, formule de politesse finale
+- Commence directement par le premier paragraphe
+- Maximum 2500 caractères espaces compris
 
+STRUCTURE OBLIGATOIRE :
 
-def generate_letter_body(
-    user_profile, job_ad_text, job_info=None, custom_instructions=None
-):
-    """Construit le prompt et interroge l'API Gemini pour générer le corps de la lettre."""
+① - ACCROCHE (3-4 lignes)
+Indique la formation actuelle et précise (anciennement Mines de Douai) à la première mention d'IMT Nord Europe, explique pourquoi cette entreprise/ce poste précisément en citant des éléments concrets de l'annonce. Fais le lien avec une expérience pertinente du candidat si pertinent.
+
+② - COMPÉTENCES TECHNIQUES (5-6 lignes)
+Mets en avant les compétences techniques clés si pertinents (CAO, simulations, programmation), les expériences professionnelles pertinentes, et les projets académiques en lien direct avec les missions décrites dans l'annonce. Sois précis et factuel.
+
+③ - APPORT MUTUEL (4-5 lignes)
+Explique ce que le candidat apporte concrètement à l'entreprise et ce qu'il souhaite développer pendant ce stage. Termine par une phrase d'ouverture vers un entretien sans formule de politesse.
+
+TON, À RESPECTER ABSOLUMENT :
+- Courant, simple et direct
+- Évite le jargon pompeux et les formules convenues ("je me permets de", "vivement intéressé par", "immédiatement retenu mon attention", "opportunité unique", "défi technique","je souhaite mettre ma rigueur technique au service d'un enjeu stratégique", "complexes problématiques","correspondent précisément", etc.)
+- Privilégie les verbes d'action, phrases courtes (maximum 2 lignes par phrase) et les faits concrets : "correspond à", "m'intéresse", "je peux apporter"
+- Naturel et authentique
+- Utilise la forme active : "Je peux apporter" plutôt que "Je souhaite apporter"
+
+
+RÈGLES IMPORTANTES :
+- Personnalise systématiquement en citant des éléments précis de l'annonce
+- Ne répète pas le CV, apporte de la valeur ajoutée
+- Montre une réelle connaissance de l'entreprise et du secteur
+- Sois concis : chaque mot doit compter
+- Pour citer le nom du poste, utilise le mot stage si c'est un stage
+"""
+
+
+def build_letter_prompt(user_profile, job_ad_text, job_info=None, custom_instructions=None):
+    """
+    Construit le prompt de rédaction du corps de la lettre. L'annonce est
+    compactée, avec un budget plus serré quand job_info la résume déjà.
+    """
+    job_ad_text = compact_ad_for_prompt(job_ad_text, "redaction", with_job_info=bool(job_info))
 
     # Enrichir le prompt avec les informations extraites
     context_info = ""
@@ -210,91 +313,294 @@ def generate_letter_body(
 
     CONSIGNES STRICTES :
 
-FORMAT :
-- Génère UNIQUEMENT le corps de la lettre (3 paragraphes maximum)
-- N'inclus PAS : formule d'appel, objet, adresse, date, formule de politesse finale
-- Commence directement par le premier paragraphe
-- Maximum 2500 caractères espaces compris
-
-STRUCTURE OBLIGATOIRE :
-
-① - ACCROCHE (3-4 lignes)
-Indique la formation actuelle et précise (anciennement Mines de Douai) à la première mention d'IMT Nord Europe, explique pourquoi cette entreprise/ce poste précisément en citant des éléments concrets de l'annonce. Fais le lien avec une expérience pertinente du candidat si pertinent.
-
-② - COMPÉTENCES TECHNIQUES (5-6 lignes)
-Mets en avant les compétences techniques clés si pertinents (CAO, simulations, programmation), les expériences professionnelles pertinentes, et les projets académiques en lien direct avec les missions décrites dans l'annonce. Sois précis et factuel.
+{LETTER_GUIDELINES}Génère maintenant la lettre de motivation.
+"""
+    return prompt
 
-③ - APPORT MUTUEL (4-5 lignes)
-Explique ce que le candidat apporte concrètement à l'entreprise et ce qu'il souhaite développer pendant ce stage. Termine par une phrase d'ouverture vers un entretien sans formule de politesse.
 
-TON, À RESPECTER ABSOLUMENT :
-- Courant, simple et direct
-- Évite le jargon pompeux et les formules convenues ("je me permets de", "vivement intéressé par", "immédiatement retenu mon attention", "opportunité unique", "défi technique","je souhaite mettre ma rigueur technique au service d'un enjeu stratégique", "complexes problématiques","correspondent précisément", etc.)
-- Privilégie les verbes d'action, phrases courtes (maximum 2 lignes par phrase) et les faits concrets : "correspond à", "m'intéresse", "je peux apporter"
-- Naturel et authentique
-- Utilise la forme active : "Je peux apporter" plutôt que "Je souhaite apporter"
+@metrics.timed("redaction")
+def generate_letter_body(
+    user_profile, job_ad_text, job_info=None, custom_instructions=None, variant=0, use_cache=True
+):
+    """
+    Interroge l'API Gemini pour générer le corps de la lettre.
 
+    Le résultat est mis en cache : le prompt final (profil, annonce, informations
+    extraites, instructions) ainsi que le modèle et sa configuration forment la clé.
+    `variant` sélectionne un emplacement distinct du cache pour obtenir une nouvelle
+    rédaction, `use_cache=False` ignore l'entrée existante et la remplace.
+    """
+    prompt = build_letter_prompt(user_profile, job_ad_text, job_info, custom_instructions)
+    cache_key = make_key(
+        prompt, gemini_client.backend_model_id(LETTER_MODEL), LETTER_GENERATION_CONFIG, variant
+    )
+    if use_cache:
+        cached = LETTER_CACHE.get(cache_key)
+        if cached is not None:
+            logging.info(f"Corps de la lettre récupéré depuis le cache (variante {variant}).")
+            return cached
 
-RÈGLES IMPORTANTES :
-- Personnalise systématiquement en citant des éléments précis de l'annonce
-- Ne répète pas le CV, apporte de la valeur ajoutée
-- Montre une réelle connaissance de l'entreprise et du secteur
-- Sois concis : chaque mot doit compter
-- Pour citer le nom du poste, utilise le mot stage si c'est un stage
-Génère maintenant la lettre de motivation.
-"""
     try:
         logging.info("Génération du corps de la lettre...")
-        model = genai.GenerativeModel(
-            "gemini-2.5-flash",
-            generation_config={
-                "temperature": 0.6,
-                "top_p": 0.9,
-                "top_k": 64,
-            },
-            safety_settings={
-                HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_ONLY_HIGH,
-                HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_ONLY_HIGH,
-                HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_ONLY_HIGH,
-                HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_ONLY_HIGH,
-            },
+        response = gemini_client.generate(
+            prompt,
+            LETTER_MODEL,
+            generation_config=LETTER_GENERATION_CONFIG,
+            safety_settings=LETTER_SAFETY_SETTINGS,
         )
-        response = model.generate_content(prompt)
         if hasattr(response, "candidates"):
             for candidate in response.candidates:
                 print(f"Finish reason: {candidate.finish_reason}")
                 print(f"Safety ratings: {candidate.safety_ratings}")
 
         logging.info("Réponse de l'API Gemini reçue.")
-        return response.text
+        letter_body = response.text
+        if letter_body:
+            LETTER_CACHE.set(cache_key, letter_body)
+        return letter_body
     except Exception as e:
+        metrics.FAILURES.inc(stage="redaction")
         logging.error(f"Erreur lors de l'appel à l'API Gemini : {e}")
         return None
 
 
+def stream_letter_body(
+    user_profile, job_ad_text, job_info=None, custom_instructions=None, variant=0, use_cache=True
+):
+    """
+    Variante de generate_letter_body qui produit le corps de la lettre morceau
+    par morceau (`stream=True`). Un corps déjà en cache est renvoyé d'un bloc ;
+    le texte complet est mis en cache une fois le flux terminé.
+    """
+    prompt = build_letter_prompt(user_profile, job_ad_text, job_info, custom_instructions)
+    cache_key = make_key(
+        prompt, gemini_client.backend_model_id(LETTER_MODEL), LETTER_GENERATION_CONFIG, variant
+    )
+    if use_cache:
+        cached = LETTER_CACHE.get(cache_key)
+        if cached is not None:
+            logging.info(f"Corps de la lettre récupéré depuis le cache (variante {variant}).")
+            yield cached
+            return
+
+    parts = []
+    try:
+        logging.info("Génération du corps de la lettre (streaming)...")
+        for text in gemini_client.stream(
+            prompt,
+            LETTER_MODEL,
+            generation_config=LETTER_GENERATION_CONFIG,
+            safety_settings=LETTER_SAFETY_SETTINGS,
+        ):
+            parts.append(text)
+            yield text
+    except Exception as e:
+        metrics.FAILURES.inc(stage="redaction")
+        logging.error(f"Erreur lors de l'appel à l'API Gemini (streaming) : {e}")
+        return
+
+    letter_body = "".join(parts)
+    if letter_body:
+        logging.info("Réponse de l'API Gemini reçue.")
+        LETTER_CACHE.set(cache_key, letter_body)
+
+
+JOB_INFO_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "entreprise": {"type": "string"},
+        "poste": {"type": "string"},
+        "type_contrat": {"type": "string", "nullable": True},
+        "duree": {"type": "string", "nullable": True},
+        "localisation": {"type": "string", "nullable": True},
+        "date_debut": {"type": "string", "nullable": True},
+        "competences_requises": {"type": "array", "items": {"type": "string"}},
+        "outils_technologies": {"type": "array", "items": {"type": "string"}},
+        "niveau_etudes": {"type": "string", "nullable": True},
+        "langues": {
+            "type": "object",
+            "nullable": True,
+            "properties": {
+                "francais": {"type": "string", "nullable": True},
+                "anglais": {"type": "string", "nullable": True},
+            },
+        },
+        "salaire": {"type": "string", "nullable": True},
+        "avantages": {"type": "array", "items": {"type": "string"}},
+        "missions_principales": {"type": "array", "items": {"type": "string"}},
+        "secteur": {"type": "string", "nullable": True},
+        "valeurs_entreprise": {"type": "array", "items": {"type": "string"}},
+        "ton_annonce": {"type": "string", "nullable": True},
+    },
+    "required": ["entreprise", "poste", "competences_requises", "outils_technologies"],
+}
+
+SINGLE_PASS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "job_info": JOB_INFO_SCHEMA,
+        "corps_lettre": {"type": "string"},
+    },
+    "required": ["job_info", "corps_lettre"],
+}
+
+SINGLE_PASS_PROMPT = """
+    Tu es un expert en recrutement et un excellent rédacteur. Tu dois d'abord analyser une annonce d'emploi, puis rédiger le corps d'une lettre de motivation percutante et personnalisée en français.
+
+    **Voici les informations sur le candidat :**
+    - Nom : {nom_complet}
+    - Mon profil résumé : {resume_personnel}
+    - Mes compétences clés : {competences_cles}
+
+    {instructions_block}
+
+    **Annonce :**
+    ---
+    {job_ad_text}
+    ---
+
+    ÉTAPE 1 - ANALYSE (champ "job_info") :
+    Remplis chaque champ à partir de l'annonce. Le champ "poste" est le titre exact du poste sans "H/F", résumé à 6 mots maximum ; le mot 'stage' doit être inclus si c'est un stage, 'Candidature spontanée' + le titre du poste doit figurer si c'est une candidature spontanée.
+    Si une information n'est pas disponible, utilise null ou une liste vide selon le type.
+
+    ÉTAPE 2 - RÉDACTION (champ "corps_lettre") :
+    Rédige le corps de la lettre en t'appuyant sur ton analyse et en respectant les consignes suivantes.
+
+    CONSIGNES STRICTES :
+
+{guidelines}"""
+
+
+@metrics.timed("single_pass")
+def generate_job_info_and_letter(
+    user_profile, job_ad_text, custom_instructions=None, variant=0, use_cache=True
+):
+    """
+    Mode single-pass : un seul appel Gemini avec un schéma de réponse structuré
+    retourne à la fois les informations de l'annonce et le corps de la lettre.
+
+    Retourne un tuple (job_info, letter_body), ou (None, None) en cas d'échec.
+    """
+    instructions_block = ""
+    if custom_instructions:
+        instructions_block = f"""
+    **Instructions supplémentaires à respecter absolument :**
+    {custom_instructions}
+    """
+
+    job_ad_text = compact_ad_for_prompt(job_ad_text, "single_pass")
+    prompt = SINGLE_PASS_PROMPT.format(
+        nom_complet=user_profile.get("nom_complet", "N/A"),
+        resume_personnel=user_profile.get("resume_personnel", "N/A"),
+        competences_cles=", ".join(user_profile.get("competences_cles", [])),
+        instructions_block=instructions_block,
+        job_ad_text=job_ad_text,
+        guidelines=LETTER_GUIDELINES,
+    )
+    generation_config = dict(
+        LETTER_GENERATION_CONFIG,
+        response_mime_type="application/json",
+        response_schema=SINGLE_PASS_SCHEMA,
+    )
+
+    cache_key = make_key(
+        "single_pass",
+        prompt,
+        gemini_client.backend_model_id(LETTER_MODEL),
+        generation_config,
+        variant,
+    )
+    if use_cache:
+        cached = LETTER_CACHE.get(cache_key)
+        if cached is not None:
+            logging.info(f"Analyse et lettre récupérées depuis le cache (variante {variant}).")
+            return cached["job_info"], cached["corps_lettre"]
+
+    try:
+        logging.info("Analyse de l'annonce et rédaction de la lettre (single-pass)...")
+        response = gemini_client.generate(
+            prompt,
+            LETTER_MODEL,
+            generation_config=generation_config,
+            safety_settings=LETTER_SAFETY_SETTINGS,
+        )
+        data = json.loads(strip_json_fences(response.text))
+        job_info = data["job_info"]
+        letter_body = data["corps_lettre"]
+    except (json.JSONDecodeError, KeyError, TypeError) as e:
+        metrics.FAILURES.inc(stage="single_pass")
+        logging.error(f"Réponse single-pass invalide : {e}")
+        return None, None
+    except Exception as e:
+        metrics.FAILURES.inc(stage="single_pass")
+        logging.error(f"Erreur lors de l'appel single-pass à l'API Gemini : {e}")
+        return None, None
+
+    if not job_info or not letter_body:
+        metrics.FAILURES.inc(stage="single_pass")
+        return None, None
+
+    LETTER_CACHE.set(cache_key, {"job_info": job_info, "corps_lettre": letter_body})
+    logging.info(
+        f"Réponse single-pass reçue : {job_info.get('entreprise', 'N/A')} - {job_info.get('poste', 'N/A')}"
+    )
+    return job_info, letter_body
+
+
 # --- 3. MANIPULATION DES FICHIERS ET COMPILATION LATEX ---
 
 
+def pdf_path_for(tex_filepath):
+    """
+    Chemin du PDF produit à partir d'un .tex : dans output/ pour un .tex rendu
+    dans un dossier de compilation, sinon à côté du .tex.
+    """
+    base_filename = os.path.splitext(os.path.basename(tex_filepath))[0]
+    if latex_sandbox.is_sandbox(os.path.dirname(tex_filepath)):
+        return os.path.join("output", f"{base_filename}.pdf")
+    return os.path.splitext(tex_filepath)[0] + ".pdf"
+
+
 def compile_latex_to_pdf(tex_filepath):
-    """Compile un fichier .tex en .pdf et nettoie les fichiers temporaires."""
+    """
+    Compile un .tex en .pdf et nettoie les fichiers temporaires. Un .tex rendu
+    dans un dossier de compilation (latex_sandbox) y est compilé, puis le PDF
+    est publié atomiquement dans output/ et le dossier supprimé.
+    """
+    pdf_filepath = pdf_path_for(tex_filepath)
+    built_pdf = os.path.splitext(tex_filepath)[0] + ".pdf"
+    try:
+        success = run_pdflatex(tex_filepath)
+        if success and built_pdf != pdf_filepath:
+            latex_sandbox.publish(built_pdf, pdf_filepath)
+        elif not success and latex_sandbox.is_sandbox(os.path.dirname(tex_filepath)):
+            # Le dossier de compilation va disparaître : le .log est gardé à côté du PDF attendu
+            log_file = os.path.splitext(tex_filepath)[0] + ".log"
+            if os.path.exists(log_file):
+                latex_sandbox.publish(log_file, os.path.splitext(pdf_filepath)[0] + ".log")
+        return success
+    finally:
+        latex_sandbox.discard(tex_filepath)
+
+
+def run_pdflatex(tex_filepath):
+    """Lance pdflatex (avec échéance et limite mémoire) dans le dossier du .tex."""
     directory = os.path.dirname(tex_filepath)
     filename = os.path.basename(tex_filepath)
     base_filename = os.path.splitext(filename)[0]
 
     # La commande pour compiler. L'option -interaction=nonstopmode evite que le script se bloque en cas d'erreur LaTeX.
-    command = [
-        "pdflatex",
-        "-interaction=nonstopmode",
-        f"-output-directory={directory}",
-        tex_filepath,
-    ]
+    # Si le .tex a ete prepare pour un format precompile, on l'utilise pour ne pas recharger le preambule.
+    fmt_name = latex_formats.read_format_marker(tex_filepath)
+    command = latex_sandbox.limited_command(latex_formats.pdflatex_command(tex_filepath, fmt_name))
+    options = latex_sandbox.subprocess_options()
 
     try:
         logging.info(f" Compilation de {filename} en PDF...")
         # On lance la compilation 2 fois pour s'assurer que les references sont correctes (table des matiÃ¨res, etc.)
-        subprocess.run(command, check=True, capture_output=True, text=True)
+        subprocess.run(command, check=True, capture_output=True, text=True, **options)
         subprocess.run(
-            command, check=True, capture_output=True, text=True
+            command, check=True, capture_output=True, text=True, **options
         )  # Seconde passe
         logging.info(f" PDF  avec succes : {base_filename}.pdf")
 
@@ -311,16 +617,100 @@ def compile_latex_to_pdf(tex_filepath):
             " La commande 'pdflatex' est introuvable. Assurez-vous d'avoir une distribution LaTeX installee et dans votre PATH."
         )
         return False
+    except subprocess.TimeoutExpired:
+        logging.error(
+            f" pdflatex a dépassé l'échéance de {options['timeout']:g} s pour {filename} (LETTRE_PDFLATEX_TIMEOUT)."
+        )
+        return False
     except subprocess.CalledProcessError as e:
+        if fmt_name:
+            logging.warning(
+                f" Echec de la compilation avec le format {fmt_name}, nouvel essai sans format precompile."
+            )
+            latex_formats.detach_format(tex_filepath)
+            success = run_pdflatex(tex_filepath)
+            if success:
+                # Le document compile sans format : c'est le format qui est en cause
+                latex_formats.discard_format(fmt_name)
+            return success
         logging.error(f" Erreur lors de la compilation LaTeX pour {filename}.")
         logging.error("--- LOG LATEX ---")
         logging.error(e.stdout)
         logging.error(e.stderr)
         logging.error("--- FIN LOG ---")
-        logging.error(f"Le fichier .log complet se trouve dans le dossier {directory}")
+        logging.error(f"Le fichier .log complet se trouve dans le dossier {os.path.dirname(pdf_path_for(tex_filepath))}")
         return False
 
 
+PDF_CACHE = FileCache(
+    "pdf", os.path.join(os.path.dirname(CACHE_DB_PATH), "pdf_cache"), max_bytes=200 * 1024 * 1024
+)
+
+
+@functools.lru_cache(maxsize=1)
+def latex_compiler_identity():
+    """Identifie la distribution LaTeX utilisée (première ligne de `pdflatex --version`)."""
+    try:
+        completed = subprocess.run(
+            ["pdflatex", "--version"], check=True, capture_output=True, text=True
+        )
+        return completed.stdout.splitlines()[0].strip()
+    except (FileNotFoundError, subprocess.CalledProcessError, IndexError):
+        return "pdflatex-inconnu"
+
+
+def fetch_cached_pdf(tex_filepath):
+    """
+    Cherche dans le cache un PDF déjà compilé à partir du même source TeX
+    (et du même compilateur). En cas de succès, le PDF est publié comme après
+    une compilation (voir pdf_path_for) et le .tex est supprimé.
+
+    Retourne (clé de cache, trouvé).
+    """
+    with open(tex_filepath, "r", encoding="utf-8") as f:
+        cache_key = make_key(f.read(), latex_compiler_identity())
+
+    pdf_filepath = pdf_path_for(tex_filepath)
+    fetched_pdf = os.path.splitext(tex_filepath)[0] + ".pdf"
+    if not PDF_CACHE.fetch(cache_key, fetched_pdf):
+        return cache_key, False
+
+    if fetched_pdf != pdf_filepath:
+        latex_sandbox.publish(fetched_pdf, pdf_filepath)
+    os.remove(tex_filepath)
+    latex_sandbox.discard(tex_filepath)
+    logging.info(f" PDF récupéré depuis le cache : {os.path.basename(pdf_filepath)}")
+    return cache_key, True
+
+
+def timed_compile(tex_filepath):
+    """compile_latex_to_pdf chronométré ; retourne (succès, durée en secondes)."""
+    start = time.perf_counter()
+    success = compile_latex_to_pdf(tex_filepath)
+    return success, time.perf_counter() - start
+
+
+def record_compile(template_name, success, seconds):
+    """Enregistre la durée (et l'éventuel échec) d'une compilation."""
+    metrics.COMPILE_DURATION.observe(seconds, template=template_name or "inconnu")
+    if not success:
+        metrics.FAILURES.inc(stage="compilation")
+
+
+def build_pdf(tex_filepath, template_name=None):
+    """Produit le PDF d'un .tex en réutilisant le cache de PDF, sinon en compilant."""
+    cache_key, hit = fetch_cached_pdf(tex_filepath)
+    if hit:
+        return True
+
+    success, seconds = timed_compile(tex_filepath)
+    record_compile(template_name, success, seconds)
+    if success:
+        PDF_CACHE.store(cache_key, pdf_path_for(tex_filepath))
+    return success
+
+
+@metrics.timed("metadata")
 def save_job_metadata(job_info, match_info, output_path):
     """Sauvegarde  de l'annonce et du matching."""
     if not job_info:
@@ -339,6 +729,7 @@ def save_job_metadata(job_info, match_info, output_path):
     logging.info(f"  sauvegardees : {os.path.basename(metadata_path)}")
 
 
+@metrics.timed("selection_template")
 def select_template_by_tone(job_info):
     """
     Selectionne automatiquement le meilleur template selon le ton de l'annonce
@@ -374,81 +765,84 @@ def select_template_by_tone(job_info):
     return "lettre_template_moderne.tex"
 
 
-def generate_pdf_from_content(user_config, template_content, entreprise, poste, letter_body, output_filename_base):
-    """Génère le PDF à partir du contenu fourni."""
-    final_tex_content = template_content
+def template_values(user_config, entreprise, poste, letter_body):
+    """Valeurs des placeholders d'un template (clé = nom du placeholder sans les %%)."""
+    values = {}
     for key, value in user_config.items():
         if isinstance(value, list):
             value = ", ".join(value)
-        final_tex_content = final_tex_content.replace(f"%%{key.upper()}%%", str(value))
+        values[key.upper()] = str(value)
+
+    values["CORPS_LETTRE"] = letter_body
+    values["POSTE_VISE"] = poste
+    values["NOM_ENTREPRISE"] = entreprise
+    values["ADRESSE_ENTREPRISE"] = "Adresse de l'entreprise"
+    return values
+
+
+def load_letter_template(template_source, template_file, user_config):
+    """Précompile un template et signale les placeholders inconnus ou manquants."""
+    known_placeholders = template_values(user_config, "", "", "").keys()
+    return latex_template.compile_template(template_source, template_file, known_placeholders)
+
+
+@metrics.timed("rendu_tex")
+def write_tex_from_content(user_config, template, entreprise, poste, letter_body, output_filename_base):
+    """
+    Remplit le template avec le contenu fourni et écrit le fichier .tex dans un
+    dossier de compilation isolé. Retourne (chemin du .tex, chemin du PDF dans output/).
+    """
+    if isinstance(template, str):
+        template = latex_template.compile_template(template)
 
-    final_tex_content = final_tex_content.replace("%%CORPS_LETTRE%%", letter_body)
-    final_tex_content = final_tex_content.replace("%%POSTE_VISE%%", poste)
-    final_tex_content = final_tex_content.replace("%%NOM_ENTREPRISE%%", entreprise)
-    final_tex_content = final_tex_content.replace(
-        "%%ADRESSE_ENTREPRISE%%", "Adresse de l'entreprise"
+    final_tex_content = template.render(
+        template_values(user_config, entreprise, poste, letter_body)
     )
+    final_tex_content = latex_formats.attach_format(final_tex_content, template.source)
 
-    tex_filepath = os.path.join("output", f"{output_filename_base}.tex")
-    pdf_filepath = os.path.join("output", f"{output_filename_base}.pdf")
+    tex_filepath = os.path.join(latex_sandbox.create(), f"{output_filename_base}.tex")
+    pdf_filepath = pdf_path_for(tex_filepath)
 
     with open(tex_filepath, "w", encoding="utf-8") as f:
         f.write(final_tex_content)
 
-    success = compile_latex_to_pdf(tex_filepath)
-    return success, pdf_filepath, tex_filepath
+    return tex_filepath, pdf_filepath
 
 
-def create_cover_letter(
-    user_config, job_ad_path, templates_dict, custom_instructions=None
-):
-    """Orchestre la création d'une lettre de motivation pour une annonce."""
-
-    with open(job_ad_path, "r", encoding="utf-8") as f:
-        job_ad_text = f.read()
-
-    job_info = extract_job_info(job_ad_text)
-    template_name = select_template_by_tone(job_info)
-    template_content = templates_dict.get(
-        template_name, templates_dict["lettre_template.tex"]
+def generate_pdf_from_content(user_config, template, entreprise, poste, letter_body, output_filename_base):
+    """Génère le PDF à partir du contenu fourni."""
+    tex_filepath, pdf_filepath = write_tex_from_content(
+        user_config, template, entreprise, poste, letter_body, output_filename_base
     )
+    success = build_pdf(tex_filepath, getattr(template, "name", None))
+    return success, pdf_filepath, tex_filepath
 
-    logging.info(f"Template sélectionné : {template_name}")
 
-    match_info = None
-    if job_info:
-        match_info = calculate_match_score(user_config, job_info)
-        if match_info:
-            logging.info(f"Score de compatibilité : {match_info['score']}/100")
-            for detail in match_info["details"]:
-                logging.info(f"   {detail}")
-            if match_info["missing_skills"]:
-                logging.warning(
-                    "Compétences manquantes : "
-                    + ", ".join(match_info["missing_skills"])
-                )
-
-    result = {
-        "success": False,
-        "pdf_path": None,
-        "tex_path": None,
-        "job_info": job_info,
-        "match_info": match_info,
-        "letter_body": None,
-        "template_name": template_name
-    }
+def score_job(user_config, job_info):
+    """Calcule le score de compatibilité et le détaille dans les logs."""
+    if not job_info:
+        return None
 
-    letter_body = generate_letter_body(
-        user_config,
-        job_ad_text,
-        job_info,
-        custom_instructions=custom_instructions,
-    )
-    if not letter_body:
-        return result
+    match_info = calculate_match_score(user_config, job_info)
+    log_match_info(match_info)
+    return match_info
+
+
+def log_match_info(match_info, prefix=""):
+    """Détaille un score de compatibilité dans les logs."""
+    if match_info:
+        logging.info(f"{prefix}Score de compatibilité : {match_info['score']}/100")
+        for detail in match_info["details"]:
+            logging.info(f"{prefix}   {detail}")
+        if match_info["missing_skills"]:
+            logging.warning(
+                f"{prefix}Compétences manquantes : "
+                + ", ".join(match_info["missing_skills"])
+            )
 
-    result["letter_body"] = letter_body
 
+def build_output_names(job_info, job_ad_path):
+    """Détermine l'entreprise, le poste et le nom de base des fichiers de sortie."""
     if job_info:
         poste = job_info.get("poste", "Candidature")
         entreprise = job_info.get("entreprise", "Nom de l'entreprise")
@@ -472,30 +866,605 @@ def create_cover_letter(
         entreprise = "Nom de l'entreprise"
         output_filename_base = f"lettre_motivation_{base_name.replace(' ', '_')}"
 
-    success, pdf_filepath, tex_filepath = generate_pdf_from_content(
-        user_config, template_content, entreprise, poste, letter_body, output_filename_base
+    return entreprise, poste, output_filename_base
+
+
+def prepare_cover_letter(
+    user_config,
+    job_ad_path,
+    templates_dict,
+    custom_instructions=None,
+    variant=0,
+    use_letter_cache=True,
+    single_pass=False,
+    score=True,
+):
+    """
+    Exécute les étapes réseau du pipeline (extraction, scoring, rédaction)
+    et écrit le fichier .tex, sans lancer la compilation LaTeX.
+
+    Avec `single_pass=True`, l'extraction et la rédaction sont faites en un seul
+    appel Gemini ; en cas d'échec on revient au mode en deux appels. Avec
+    `score=False`, le score est laissé à l'appelant (calcul par lot de run_batch).
+    """
+    mark_ad_running(job_ad_path)
+
+    with open(job_ad_path, "r", encoding="utf-8") as f:
+        job_ad_text = f.read()
+
+    job_info = letter_body = None
+    if single_pass:
+        job_info, letter_body = generate_job_info_and_letter(
+            user_config,
+            job_ad_text,
+            custom_instructions=custom_instructions,
+            variant=variant,
+            use_cache=use_letter_cache,
+        )
+        if letter_body is None:
+            logging.warning("Échec du mode single-pass, retour au mode en deux appels.")
+
+    if letter_body is None:
+        job_info = extract_job_info(job_ad_text)
+    template_name = select_template_by_tone(job_info)
+    template = templates_dict.get(
+        template_name, templates_dict["lettre_template.tex"]
+    )
+
+    logging.info(f"Template sélectionné : {template_name}")
+
+    match_info = score_job(user_config, job_info) if score else None
+
+    result = {
+        "success": False,
+        "job_ad_path": job_ad_path,
+        "pdf_path": None,
+        "tex_path": None,
+        "job_info": job_info,
+        "match_info": match_info,
+        "letter_body": None,
+        "template_name": template_name
+    }
+
+    if letter_body is None:
+        letter_body = generate_letter_body(
+            user_config,
+            job_ad_text,
+            job_info,
+            custom_instructions=custom_instructions,
+            variant=variant,
+            use_cache=use_letter_cache,
+        )
+    if not letter_body:
+        return result
+
+    result["letter_body"] = letter_body
+
+    entreprise, poste, output_filename_base = build_output_names(job_info, job_ad_path)
+    tex_filepath, _ = write_tex_from_content(
+        user_config, template, entreprise, poste, letter_body, output_filename_base
     )
+    result["tex_path"] = tex_filepath
+
+    return result
+
+
+def finalize_cover_letter(user_config, result, success):
+    """Complète le résultat après la compilation LaTeX (statut, chemin du PDF, metadata)."""
+    pdf_filepath = pdf_path_for(result["tex_path"])
 
     json_export = user_config.get("json_export", False)
-    if success and job_info and json_export:
-        save_job_metadata(job_info, match_info, pdf_filepath)
+    if success and result["job_info"] and json_export:
+        save_job_metadata(result["job_info"], result["match_info"], pdf_filepath)
 
     result.update(
         {
             "success": bool(success),
             "pdf_path": pdf_filepath if success else None,
-            "tex_path": tex_filepath,
         }
     )
+    if success:
+        result["ad_id"] = index_processed_ad(result)
+
+    return result
+
+
+DUPLICATE_INDEX = duplicate_index.DuplicateIndex()
+MANIFEST = ad_manifest.AdManifest()
+
+
+def mark_ad_running(job_ad_path):
+    """Signale dans le manifeste qu'une annonce est en cours de traitement."""
+    try:
+        MANIFEST.mark_running(job_ad_path)
+    except Exception as e:
+        logging.warning(f"[{os.path.basename(job_ad_path)}] Manifeste non mis à jour : {e}")
+
+
+def record_processed_ad(job_ad_path, result, error=None):
+    """Note l'issue du pipeline dans le manifeste (sans interrompre le traitement)."""
+    try:
+        MANIFEST.record(job_ad_path, result, error)
+    except Exception as e:
+        logging.warning(f"[{os.path.basename(job_ad_path)}] Manifeste non mis à jour : {e}")
+
+
+def find_duplicate_ad(job_ad_text, signature=None):
+    """
+    Annonce déjà traitée quasi identique à `job_ad_text` et dont le PDF existe
+    encore, ou None. Un index indisponible n'empêche pas la génération.
+    """
+    try:
+        match = DUPLICATE_INDEX.find(job_ad_text, signature)
+    except Exception as e:
+        logging.warning(f"Index des doublons indisponible : {e}")
+        return None
+    if match and match.get("pdf_path") and os.path.exists(match["pdf_path"]):
+        return match
+    return None
+
+
+def index_processed_ad(result):
+    """Ajoute l'annonce d'un résultat réussi à l'index des doublons ; retourne son identifiant."""
+    try:
+        with open(result["job_ad_path"], "r", encoding="utf-8") as f:
+            job_ad_text = f.read()
+        return DUPLICATE_INDEX.add(
+            job_ad_text,
+            source=os.path.basename(result["job_ad_path"]),
+            pdf_path=result["pdf_path"],
+            result={
+                key: result.get(key)
+                for key in ("job_info", "match_info", "letter_body", "template_name")
+            },
+        )
+    except Exception as e:
+        logging.warning(f"Annonce non ajoutée à l'index des doublons : {e}")
+        return None
+
+
+def duplicate_result(job_ad_path, match):
+    """Résultat au format de create_cover_letter pour un doublon relié à une lettre existante."""
+    job_ad_filename = os.path.basename(job_ad_path)
+    if match.get("source") == job_ad_filename:
+        origin = "Annonce déjà traitée"
+    else:
+        origin = f"Quasi-doublon de {match.get('source')}"
+    logging.info(
+        f"[{job_ad_filename}] {origin} (similarité {match['similarity']:.2f}) : "
+        f"lettre existante réutilisée ({match['pdf_path']})."
+    )
+    return {
+        "success": True,
+        "job_ad_path": job_ad_path,
+        "pdf_path": match["pdf_path"],
+        "tex_path": None,
+        "job_info": match.get("job_info"),
+        "match_info": match.get("match_info"),
+        "letter_body": match.get("letter_body"),
+        "template_name": match.get("template_name"),
+        "duplicate_of": match,
+    }
+
+
+def split_duplicates(job_ad_paths):
+    """
+    Sépare les annonces à générer des quasi-doublons, qu'ils doublent une annonce
+    déjà traitée (index persistant) ou une autre annonce du même lot.
+
+    Retourne (annonces à générer, {doublon: entrée de l'index},
+    {doublon: (annonce du lot, similarité)}).
+    """
+    to_process, known, in_batch = [], {}, {}
+    batch_signatures = []
+    threshold = duplicate_index.duplicate_threshold()
+    for job_ad_path in job_ad_paths:
+        try:
+            with open(job_ad_path, "r", encoding="utf-8") as f:
+                job_ad_text = f.read()
+            signature = duplicate_index.signature(job_ad_text)
+        except (OSError, UnicodeDecodeError):
+            # L'erreur sera signalée par le pipeline, annonce par annonce
+            to_process.append(job_ad_path)
+            continue
+
+        match = find_duplicate_ad(job_ad_text, signature)
+        # Le fichier lui-même, déjà traité : le manifeste a décidé de le retraiter
+        if match and match.get("source") != os.path.basename(job_ad_path):
+            known[job_ad_path] = match
+            continue
+        scores = [(duplicate_index.similarity(signature, sig), p) for p, sig in batch_signatures]
+        best = max(scores, default=None)
+        if best and best[0] >= threshold:
+            in_batch[job_ad_path] = (best[1], best[0])
+            continue
+        batch_signatures.append((job_ad_path, signature))
+        to_process.append(job_ad_path)
+    return to_process, known, in_batch
+
+
+def create_cover_letter(
+    user_config,
+    job_ad_path,
+    templates_dict,
+    custom_instructions=None,
+    variant=0,
+    use_letter_cache=True,
+    single_pass=False,
+):
+    """Orchestre la création d'une lettre de motivation pour une annonce."""
+    result = prepare_cover_letter(
+        user_config,
+        job_ad_path,
+        templates_dict,
+        custom_instructions=custom_instructions,
+        variant=variant,
+        use_letter_cache=use_letter_cache,
+        single_pass=single_pass,
+    )
+    if not result["tex_path"]:
+        record_processed_ad(job_ad_path, result)
+        return result
 
+    success = build_pdf(result["tex_path"], result["template_name"])
+    result = finalize_cover_letter(user_config, result, success)
+    record_processed_ad(job_ad_path, result)
     return result
 
 
+def process_ad(user_config, job_ad_path, templates_dict, check_duplicates=True, **options):
+    """
+    Traite une annonce isolée (mode --watch) : un quasi-doublon d'une autre
+    annonce est relié à la lettre existante, sinon create_cover_letter est lancé.
+    """
+    if check_duplicates:
+        with open(job_ad_path, "r", encoding="utf-8") as f:
+            match = find_duplicate_ad(f.read())
+        if match and match.get("source") != os.path.basename(job_ad_path):
+            result = duplicate_result(job_ad_path, match)
+            record_processed_ad(job_ad_path, result)
+            return result
+    return create_cover_letter(user_config, job_ad_path, templates_dict, **options)
+
+
+def watch_input(user_config, input_dir, templates_dict, args):
+    """
+    Mode --watch : traite les annonces au fil de leur arrivée dans `input_dir`,
+    avec les templates et la configuration Gemini chargés une seule fois.
+    """
+
+    def should_process(job_ad_path):
+        planned, _ = MANIFEST.plan([job_ad_path], only=args.only)
+        if job_ad_path in planned:
+            logging.info(f"[{os.path.basename(job_ad_path)}] à traiter : {planned[job_ad_path]}")
+            return True
+        return False
+
+    def process(job_ad_path):
+        result = process_ad(
+            user_config,
+            job_ad_path,
+            templates_dict,
+            check_duplicates=not args.no_dedup,
+            variant=args.variant,
+            use_letter_cache=not args.no_letter_cache,
+            single_pass=args.single_pass,
+        )
+        if result and result.get("success"):
+            logging.info(f"[{os.path.basename(job_ad_path)}] -> {result['pdf_path']}")
+        else:
+            logging.warning(f"[{os.path.basename(job_ad_path)}] : échec de génération.")
+
+    watch_folder.watch(
+        input_dir,
+        process,
+        workers=args.llm_concurrency,
+        queue_size=args.queue_size,
+        debounce=args.debounce,
+        should_process=should_process,
+    )
+
+
+def iter_cover_letter_events(
+    user_config,
+    job_ad_path,
+    templates_dict,
+    custom_instructions=None,
+    variant=0,
+    use_letter_cache=True,
+):
+    """
+    Version pas-à-pas de create_cover_letter, pour l'affichage en direct.
+
+    Produit des tuples (événement, données) au fil des étapes : "extracted",
+    "scored", "template", puis un "chunk" par morceau du corps de la lettre
+    et enfin "result" avec le même dictionnaire que create_cover_letter.
+    """
+    mark_ad_running(job_ad_path)
+    with open(job_ad_path, "r", encoding="utf-8") as f:
+        job_ad_text = f.read()
+
+    job_info = extract_job_info(job_ad_text)
+    yield "extracted", job_info
+
+    match_info = score_job(user_config, job_info)
+    yield "scored", match_info
+
+    template_name = select_template_by_tone(job_info)
+    template = templates_dict.get(
+        template_name, templates_dict["lettre_template.tex"]
+    )
+    logging.info(f"Template sélectionné : {template_name}")
+    yield "template", {"template_name": template_name}
+
+    result = {
+        "success": False,
+        "job_ad_path": job_ad_path,
+        "pdf_path": None,
+        "tex_path": None,
+        "job_info": job_info,
+        "match_info": match_info,
+        "letter_body": None,
+        "template_name": template_name
+    }
+
+    parts = []
+    with metrics.span("redaction"):
+        for text in stream_letter_body(
+            user_config,
+            job_ad_text,
+            job_info,
+            custom_instructions=custom_instructions,
+            variant=variant,
+            use_cache=use_letter_cache,
+        ):
+            parts.append(text)
+            yield "chunk", {"text": text}
+
+    letter_body = "".join(parts)
+    if not letter_body:
+        record_processed_ad(job_ad_path, result)
+        yield "result", result
+        return
+
+    result["letter_body"] = letter_body
+    entreprise, poste, output_filename_base = build_output_names(job_info, job_ad_path)
+    tex_filepath, _ = write_tex_from_content(
+        user_config, template, entreprise, poste, letter_body, output_filename_base
+    )
+    result["tex_path"] = tex_filepath
+
+    success = build_pdf(tex_filepath, template_name)
+    result = finalize_cover_letter(user_config, result, success)
+    record_processed_ad(job_ad_path, result)
+    yield "result", result
+
+
+def score_prepared(user_config, prepared):
+    """Score de compatibilité des annonces préparées {chemin: résultat}, en un seul passage."""
+    scored = [(path, result) for path, result in prepared.items() if result["job_info"]]
+    if not scored:
+        return
+    match_infos = calculate_match_scores(user_config, [result["job_info"] for _, result in scored])
+    for (job_ad_path, result), match_info in zip(scored, match_infos):
+        result["match_info"] = match_info
+        log_match_info(match_info, prefix=f"[{os.path.basename(job_ad_path)}] ")
+
+
+def run_batch(
+    user_config,
+    job_ad_paths,
+    templates_dict,
+    llm_concurrency=4,
+    compile_workers=None,
+    variant=0,
+    use_letter_cache=True,
+    single_pass=False,
+    check_duplicates=True,
+):
+    """
+    Traite un lot d'annonces en parallèle.
+
+    Les étapes réseau (appels Gemini) tournent sur un pool de threads borné par
+    `llm_concurrency`, les compilations LaTeX sur un second pool de threads
+    (par défaut un worker par cœur) qui attendent chacun leur processus
+    pdflatex : pas de fork de l'interpréteur pendant que d'autres threads
+    tournent. Chaque annonce est isolée : une erreur sur l'une n'interrompt
+    pas le reste du lot. Avec `check_duplicates`, les quasi-doublons sont
+    reliés à la lettre existante au lieu d'être régénérés.
+
+    Retourne un dictionnaire {chemin_annonce: résultat ou None}.
+    """
+    compile_workers = compile_workers or os.cpu_count() or 1
+    results = {}
+    errors = {}
+    in_batch = {}
+    if check_duplicates:
+        job_ad_paths, known, in_batch = split_duplicates(job_ad_paths)
+        for job_ad_path, match in known.items():
+            results[job_ad_path] = duplicate_result(job_ad_path, match)
+
+    with ThreadPoolExecutor(max_workers=llm_concurrency) as llm_pool, ThreadPoolExecutor(
+        max_workers=compile_workers
+    ) as compile_pool:
+        prepare_futures = {
+            llm_pool.submit(
+                prepare_cover_letter,
+                user_config,
+                job_ad_path,
+                templates_dict,
+                variant=variant,
+                use_letter_cache=use_letter_cache,
+                single_pass=single_pass,
+                score=False,
+            ): job_ad_path
+            for job_ad_path in job_ad_paths
+        }
+
+        # Les compilations partent au fil des annonces prêtes ; le score (nécessaire
+        # aux métadonnées) est calculé pour tout le lot une fois les annonces préparées
+        prepared = {}
+        cache_hits = []
+        compile_futures = {}
+        for future in as_completed(prepare_futures):
+            job_ad_path = prepare_futures[future]
+            job_ad_filename = os.path.basename(job_ad_path)
+            try:
+                result = future.result()
+            except Exception as e:
+                metrics.FAILURES.inc(stage="pipeline")
+                logging.error(f"[{job_ad_filename}] Erreur pendant la génération : {e}")
+                errors[job_ad_path] = str(e)
+                results[job_ad_path] = None
+                continue
+
+            prepared[job_ad_path] = result
+            if not result["tex_path"]:
+                logging.warning(f"[{job_ad_filename}] Aucun corps de lettre généré.")
+                results[job_ad_path] = result
+                continue
+
+            try:
+                cache_key, hit = fetch_cached_pdf(result["tex_path"])
+            except OSError as e:
+                logging.error(f"[{job_ad_filename}] Erreur d'accès au cache de PDF : {e}")
+                latex_sandbox.discard(result["tex_path"])
+                errors[job_ad_path] = str(e)
+                results[job_ad_path] = None
+                continue
+            if hit:
+                cache_hits.append(job_ad_path)
+                continue
+
+            logging.info(f"[{job_ad_filename}] Contenu prêt, compilation en file d'attente.")
+            compile_future = compile_pool.submit(timed_compile, result["tex_path"])
+            compile_futures[compile_future] = (job_ad_path, result, cache_key)
+
+        score_prepared(user_config, prepared)
+        for job_ad_path in cache_hits:
+            results[job_ad_path] = finalize_cover_letter(user_config, prepared[job_ad_path], True)
+
+        for future in as_completed(compile_futures):
+            job_ad_path, result, cache_key = compile_futures[future]
+            try:
+                success, seconds = future.result()
+                record_compile(result.get("template_name"), success, seconds)
+                if success:
+                    PDF_CACHE.store(cache_key, pdf_path_for(result["tex_path"]))
+            except Exception as e:
+                metrics.FAILURES.inc(stage="compilation")
+                latex_sandbox.discard(result["tex_path"])
+                logging.error(
+                    f"[{os.path.basename(job_ad_path)}] Erreur pendant la compilation : {e}"
+                )
+                errors[job_ad_path] = str(e)
+                success = False
+            results[job_ad_path] = finalize_cover_letter(user_config, result, success)
+
+    for job_ad_path, (leader, score) in in_batch.items():
+        leader_result = results.get(leader)
+        if not (leader_result and leader_result.get("success")):
+            logging.warning(
+                f"[{os.path.basename(job_ad_path)}] Quasi-doublon de {os.path.basename(leader)}, "
+                "dont la génération a échoué."
+            )
+            results[job_ad_path] = None
+            continue
+        match = dict(leader_result, source=os.path.basename(leader), similarity=score)
+        results[job_ad_path] = duplicate_result(job_ad_path, match)
+
+    for job_ad_path, result in results.items():
+        record_processed_ad(job_ad_path, result, errors.get(job_ad_path))
+
+    return results
+
+
 # --- 4. POINT D'ENTRÃ‰E PRINCIPAL ---
 
 
-def main():
+def parse_args(argv=None):
+    """Analyse les options de la ligne de commande."""
+    parser = argparse.ArgumentParser(
+        description="Génère les lettres de motivation pour les annonces du dossier input/."
+    )
+    parser.add_argument(
+        "--llm-concurrency",
+        type=int,
+        default=4,
+        help="Nombre maximal d'annonces traitées simultanément par Gemini (défaut : 4).",
+    )
+    parser.add_argument(
+        "--compile-workers",
+        type=int,
+        default=None,
+        help="Nombre de processus pdflatex en parallèle (défaut : nombre de cœurs).",
+    )
+    parser.add_argument(
+        "--variant",
+        type=int,
+        default=0,
+        help="Emplacement du cache des lettres : changer d'indice demande une nouvelle rédaction (défaut : 0).",
+    )
+    parser.add_argument(
+        "--no-letter-cache",
+        action="store_true",
+        help="Ignore les corps de lettre déjà en cache et les régénère.",
+    )
+    parser.add_argument(
+        "--single-pass",
+        action="store_true",
+        help="Analyse l'annonce et rédige la lettre en un seul appel Gemini.",
+    )
+    parser.add_argument(
+        "--no-dedup",
+        action="store_true",
+        help="Génère aussi les quasi-doublons d'annonces déjà traitées au lieu de réutiliser leur lettre.",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Retraite les annonces déjà traitées (par défaut, seules les nouvelles, modifiées ou en échec le sont).",
+    )
+    parser.add_argument(
+        "--only",
+        action="append",
+        metavar="MOTIF",
+        help="Ne traite que les fichiers dont le nom correspond au motif (ex. 'airbus_*.txt'). Répétable.",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Reste actif et traite les annonces au fur et à mesure de leur arrivée dans input/.",
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=watch_folder.DEBOUNCE_SECONDS,
+        help="Mode --watch : délai de stabilité d'un fichier avant traitement, en secondes (défaut : 2).",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=watch_folder.QUEUE_SIZE,
+        help="Mode --watch : nombre maximal d'annonces en attente (défaut : 100).",
+    )
+    args = parser.parse_args(argv)
+    if args.variant < 0:
+        parser.error("--variant doit être positif.")
+    if args.llm_concurrency < 1:
+        parser.error("--llm-concurrency doit être supérieur ou égal à 1.")
+    if args.compile_workers is not None and args.compile_workers < 1:
+        parser.error("--compile-workers doit être supérieur ou égal à 1.")
+    if args.queue_size < 1:
+        parser.error("--queue-size doit être supérieur ou égal à 1.")
+    if args.debounce < 0:
+        parser.error("--debounce doit être positif.")
+    return args
+
+
+def main(argv=None):
     """Fonction principale qui exécute le script."""
+    args = parse_args(argv)
     api_key, user_config = load_config()
     if not api_key or not user_config:
         return
@@ -525,7 +1494,9 @@ def main():
         template_path = os.path.join(templates_dir, template_file)
         if os.path.exists(template_path):
             with open(template_path, "r", encoding="utf-8") as f:
-                templates_dict[template_file] = f.read()
+                templates_dict[template_file] = load_letter_template(
+                    f.read(), template_file, user_config
+                )
             logging.info(f"Template chargé : {template_file}")
         else:
             logging.warning(f"Template non trouvé : {template_file}")
@@ -534,34 +1505,86 @@ def main():
         logging.error("Aucun template disponible !")
         return
 
+    latex_formats.ensure_formats(
+        {name: template.source for name, template in templates_dict.items()}
+    )
+    latex_sandbox.purge_stale()
+
+    if args.watch:
+        watch_input(user_config, input_dir, templates_dict, args)
+        return
+
     job_ads = [f for f in os.listdir(input_dir) if f.endswith(".txt")]
     if not job_ads:
         logging.warning(f"Aucun fichier .txt trouvé dans le dossier '{input_dir}'.")
         return
 
+    all_paths = [os.path.join(input_dir, job_ad_filename) for job_ad_filename in sorted(job_ads)]
+    planned, skipped = MANIFEST.plan(all_paths, force=args.force, only=args.only)
+    for job_ad_path, reason in skipped.items():
+        logging.debug(f"[{os.path.basename(job_ad_path)}] ignorée : {reason}")
+    if skipped:
+        logging.info(f"{len(skipped)} annonce(s) déjà traitée(s) ignorée(s) (--force pour les retraiter).")
+    if not planned:
+        logging.info("Aucune annonce nouvelle, modifiée ou en échec à traiter.")
+        return
+    for job_ad_path, reason in planned.items():
+        logging.info(f"[{os.path.basename(job_ad_path)}] à traiter : {reason}")
+
+    job_ad_paths = list(planned)
+    job_ads = [os.path.basename(job_ad_path) for job_ad_path in job_ad_paths]
+
     logging.info(f"\n{'='*60}")
     logging.info(f"Génération de {len(job_ads)} lettre(s) de motivation")
     logging.info(f"{'='*60}\n")
 
-    for i, job_ad_filename in enumerate(job_ads, 1):
-        logging.info(f"\n{'-'*60}")
-        logging.info(f"[{i}/{len(job_ads)}] Traitement : {job_ad_filename}")
-        logging.info(f"{'-'*60}")
-        job_ad_path = os.path.join(input_dir, job_ad_filename)
-        result = create_cover_letter(
-            user_config,
-            job_ad_path,
-            templates_dict,
-            custom_instructions=None,
-        )
-        if result and result.get("success") and result.get("pdf_path"):
-            logging.info(f"Lettre générée : {result['pdf_path']}")
+    results = run_batch(
+        user_config,
+        job_ad_paths,
+        templates_dict,
+        llm_concurrency=args.llm_concurrency,
+        compile_workers=args.compile_workers,
+        variant=args.variant,
+        use_letter_cache=not args.no_letter_cache,
+        single_pass=args.single_pass,
+        check_duplicates=not args.no_dedup,
+    )
+
+    generated = duplicates = 0
+    for i, job_ad_path in enumerate(job_ad_paths, 1):
+        result = results.get(job_ad_path)
+        job_ad_filename = os.path.basename(job_ad_path)
+        if result and result.get("duplicate_of"):
+            duplicates += 1
+            logging.info(f"[{i}/{len(job_ads)}] {job_ad_filename} -> doublon, {result['pdf_path']}")
+        elif result and result.get("success") and result.get("pdf_path"):
+            generated += 1
+            logging.info(f"[{i}/{len(job_ads)}] {job_ad_filename} -> {result['pdf_path']}")
         else:
-            logging.warning("Échec de génération pour cette annonce.")
-        logging.info(f"{'-'*60}\n")
+            logging.warning(f"[{i}/{len(job_ads)}] {job_ad_filename} : échec de génération.")
+
+    for label, cache in [
+        ("d'extraction", EXTRACTION_CACHE),
+        ("des lettres", LETTER_CACHE),
+        ("des PDF", PDF_CACHE),
+    ]:
+        stats = cache.stats()
+        logging.info(
+            f"Cache {label} : {stats['hits']} hit(s), {stats['misses']} miss(es), "
+            f"{stats['entries']} entrée(s) stockée(s)"
+        )
+
+    logging.info(
+        f"Index des doublons : {DUPLICATE_INDEX.stats()['entries']} annonce(s), "
+        f"{duplicates} doublon(s) relié(s) à une lettre existante"
+    )
+
+    logging.info("Métriques du traitement :")
+    for line in metrics.format_summary():
+        logging.info(f"   - {line}")
 
     logging.info(f"\n{'='*60}")
-    logging.info(f"Génération terminée ! Consultez le dossier '{output_dir}'")
+    logging.info(f"Génération terminée ({generated}/{len(job_ads)}) ! Consultez le dossier '{output_dir}'")
     logging.info(f"{'='*60}\n")
 
 
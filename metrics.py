@@ -0,0 +1,243 @@
+import time
+import functools
+import threading
+import contextlib
+
+# Métriques internes du générateur (histogrammes et compteurs en mémoire).
+#
+# Exposées au format texte Prometheus par la route /metrics de web_app.py et
+# résumées en fin de traitement par la CLI. Volontairement minimal : pas de
+# dépendance à prometheus_client, un seul processus (les compilations pdflatex
+# sont chronométrées par le thread qui les attend).
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _escape_label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = list(zip(labelnames, key)) + list(extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """Compteur monotone, avec étiquettes."""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return sorted(self._values.items())
+
+    def expose(self):
+        lines = []
+        for key, value in self.samples():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """Histogramme cumulatif (buckets, somme, nombre), avec étiquettes."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {
+                    "buckets": [0] * len(self.buckets),
+                    "sum": 0.0,
+                    "count": 0,
+                    "max": 0.0,
+                }
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+            series["max"] = max(series["max"], value)
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            return sorted(
+                (key, dict(series, buckets=list(series["buckets"])))
+                for key, series in self._series.items()
+            )
+
+    def quantile(self, series, q):
+        """Estimation d'un quantile : borne supérieure du bucket qui l'atteint."""
+        target = q * series["count"]
+        cumulative = 0
+        for bound, count in zip(self.buckets, series["buckets"]):
+            cumulative += count
+            if cumulative >= target:
+                return min(bound, series["max"])
+        return series["max"]
+
+    def expose(self):
+        lines = []
+        for key, series in self.samples():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["buckets"]):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [("le", repr(float(bound)))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key, [("le", "+Inf")])
+            lines.append(f"{self.name}_bucket{labels} {series['count']}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {series['sum']}")
+            lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+
+def _register(metric):
+    with _registry_lock:
+        return _registry.setdefault(metric.name, metric)
+
+
+def counter(name, documentation, labelnames=()):
+    """Déclare (ou retrouve) un compteur."""
+    return _register(Counter(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    """Déclare (ou retrouve) un histogramme."""
+    return _register(Histogram(name, documentation, labelnames, buckets))
+
+
+STAGE_DURATION = histogram(
+    "lettre_stage_duration_seconds", "Durée des étapes du pipeline.", ["stage"]
+)
+LLM_DURATION = histogram(
+    "lettre_llm_request_duration_seconds", "Latence des appels Gemini réussis.", ["model"]
+)
+LLM_FIRST_CHUNK = histogram(
+    "lettre_llm_first_chunk_seconds", "Délai jusqu'au premier morceau des appels Gemini en streaming.", ["model"]
+)
+LLM_REQUESTS = counter(
+    "lettre_llm_requests_total",
+    "Appels Gemini par issue (ok, error, retry, hedge, hedge_skipped).",
+    ["model", "outcome"],
+)
+COMPILE_DURATION = histogram(
+    "lettre_latex_compile_duration_seconds", "Durée des compilations pdflatex.", ["template"]
+)
+CACHE_REQUESTS = counter(
+    "lettre_cache_requests_total", "Lectures de cache par résultat (hit, miss).", ["cache", "result"]
+)
+CACHE_DURATION = histogram(
+    "lettre_cache_operation_duration_seconds",
+    "Durée des opérations de cache (SQLite, fichiers).",
+    ["cache", "operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+)
+FAILURES = counter("lettre_failures_total", "Échecs par étape.", ["stage"])
+PROMPT_TOKENS_SAVED = counter(
+    "lettre_prompt_tokens_saved_total",
+    "Tokens (estimés) retirés des annonces par la compaction, par étape.",
+    ["stage"],
+)
+JOBS = counter("lettre_web_jobs_total", "Tâches de génération web terminées, par statut.", ["status"])
+JOB_WAIT = histogram(
+    "lettre_web_job_wait_seconds", "Attente des tâches web avant leur prise en charge par un worker."
+)
+
+
+@contextlib.contextmanager
+def span(stage):
+    """Chronomètre une étape ; une exception est comptée comme échec de l'étape."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        FAILURES.inc(stage=stage)
+        raise
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - start, stage=stage)
+
+
+def timed(stage):
+    """Décorateur : exécute la fonction dans un span `stage`."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def render_prometheus():
+    """Toutes les métriques au format texte d'exposition Prometheus (0.0.4)."""
+    lines = []
+    with _registry_lock:
+        metrics = list(_registry.values())
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.expose())
+    return "\n".join(lines) + "\n"
+
+
+def format_summary():
+    """Résumé lisible des métriques non vides (une ligne par série)."""
+    lines = []
+    with _registry_lock:
+        metrics = list(_registry.values())
+    for metric in metrics:
+        for key, value in metric.samples():
+            labels = ", ".join(f"{name}={v}" for name, v in zip(metric.labelnames, key))
+            if metric.kind == "counter":
+                lines.append(f"{metric.name} [{labels}] : {value:g}")
+                continue
+            mean = value["sum"] / value["count"]
+            lines.append(
+                f"{metric.name} [{labels}] : n={value['count']}, moyenne={mean:.3f} s, "
+                f"p95<={metric.quantile(value, 0.95):.3f} s, max={value['max']:.3f} s"
+            )
+    return lines
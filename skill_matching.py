@@ -0,0 +1,261 @@
+import re
+import threading
+import unicodedata
+
+import numpy as np
+
+from cache_utils import make_key
+
+# Rapprochement des compétences du profil avec celles des annonces.
+#
+# Les libellés sont normalisés (casse, accents, numéros de version en fin de
+# libellé : « Python 3 » = « python », « SolidWorks 2022 » = « solidworks », mais
+# « ISO 9001 » et « ISO 14001 » restent distincts) puis ramenés à un nom
+# canonique via une table de synonymes (« CAO » = « conception assistée par
+# ordinateur »). Les compétences du profil, étendues à leurs synonymes, forment
+# un index précalculé : vecteurs de trigrammes de caractères et de mots.
+# Tous les termes d'un lot d'annonces sont comparés à l'index en une seule
+# multiplication de matrices ; un terme correspond à une compétence si la
+# similarité cosinus des trigrammes dépasse FUZZY_THRESHOLD, ou s'il contient
+# tous les mots de la compétence (pour les compétences d'au moins
+# MIN_CONTAINED_LENGTH caractères : « R » ne correspond pas à « R&D »).
+
+FUZZY_THRESHOLD = 0.8
+MIN_CONTAINED_LENGTH = 3
+
+# Points du score, inchangés par rapport à l'ancien calcul par intersection
+SKILL_POINTS = 20
+TOOL_POINTS = 15
+FULL_COVERAGE_BONUS = 20
+
+# Nom canonique -> variantes. Complété par `synonymes_competences` dans config.json.
+SYNONYMS = {
+    "cao": ["cad", "conception assistee par ordinateur", "computer aided design"],
+    "machine learning": ["apprentissage automatique", "ml", "intelligence artificielle", "ia", "ai"],
+    "gestion de projet": ["project management", "pilotage de projet", "conduite de projet"],
+    "analyse de donnees": ["data analysis", "analyse des donnees", "data analytics"],
+    "simulation": ["simulation numerique", "calcul numerique"],
+    "elements finis": ["fem", "fea", "finite element analysis", "calcul par elements finis"],
+    "programmation": ["developpement logiciel", "software development", "coding"],
+    "anglais": ["english"],
+    "c++": ["cpp"],
+    "javascript": ["js"],
+    "matlab": ["matlab simulink"],
+    "solidworks": ["solid works"],
+    "catia": ["catia v5", "catia v6"],
+}
+
+STOPWORDS = {"de", "des", "du", "d", "la", "le", "les", "l", "et", "en", "a", "au", "aux", "of", "and", "the", "for"}
+
+# Numéro de version : v5, 3, 11 (de 3.11), ou une année. Les numéros plus longs
+# font partie du nom (ISO 9001, Office 365).
+VERSION_RE = re.compile(r"v\d+|\d{1,2}|19\d\d|20\d\d")
+NON_WORD_RE = re.compile(r"[^a-z0-9+#]+")
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def normalize_skill(label):
+    """Forme normalisée d'un libellé : minuscules, sans accents ni numéro de version final."""
+    text = unicodedata.normalize("NFKD", str(label or "")).encode("ascii", "ignore").decode("ascii")
+    words = NON_WORD_RE.sub(" ", text.lower()).split()
+    while len(words) > 1 and VERSION_RE.fullmatch(words[-1]):
+        words.pop()
+    return " ".join(words)
+
+
+def build_alias_map(synonyms):
+    """Variante normalisée -> nom canonique normalisé."""
+    aliases = {}
+    for canonical, variants in synonyms.items():
+        canonical = normalize_skill(canonical)
+        aliases[canonical] = canonical
+        for variant in variants:
+            aliases[normalize_skill(variant)] = canonical
+    return aliases
+
+
+def _tokens(text):
+    return [t for t in text.split() if t not in STOPWORDS] or text.split()
+
+
+def _trigrams(text):
+    padded = f" {text} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+class SkillIndex:
+    """Index vectoriel des compétences du profil (voir l'en-tête du module)."""
+
+    def __init__(self, skills, synonyms=None):
+        self.synonyms = dict(SYNONYMS, **(synonyms or {}))
+        self.aliases = build_alias_map(self.synonyms)
+        self.skills = [s for s in skills if normalize_skill(s)]
+
+        # Une ligne par forme connue d'une compétence (elle-même et ses synonymes)
+        forms, owners = [], []
+        for position, skill in enumerate(self.skills):
+            canonical = self.canonical(skill)
+            variants = {normalize_skill(skill), canonical}
+            variants.update(a for a, c in self.aliases.items() if c == canonical)
+            for form in sorted(variants):
+                forms.append(form)
+                owners.append(position)
+        self.forms = forms
+        self.owner = np.zeros((len(forms), len(self.skills)), dtype=np.float32)
+        self.owner[np.arange(len(forms)), owners] = 1.0
+
+        self.trigram_vocab = {g: i for i, g in enumerate(sorted({g for f in forms for g in _trigrams(f)}))}
+        self.token_vocab = {t: i for i, t in enumerate(sorted({t for f in forms for t in _tokens(f)}))}
+        self.form_trigrams = self._trigram_matrix(forms)
+        self.form_tokens, self.form_token_counts = self._token_matrix(forms)
+        self.form_containable = np.array([len(f) >= MIN_CONTAINED_LENGTH for f in forms], dtype=bool)
+        self.canonical_forms = np.array([self.canonical(f) for f in forms], dtype=object)
+
+    def canonical(self, label):
+        """Nom canonique d'un libellé (lui-même normalisé s'il n'a pas de synonyme)."""
+        normalized = normalize_skill(label)
+        return self.aliases.get(normalized, normalized)
+
+    def _trigram_matrix(self, texts):
+        """Vecteurs de trigrammes normalisés (L2), sur le vocabulaire de l'index."""
+        matrix = np.zeros((len(texts), len(self.trigram_vocab)), dtype=np.float32)
+        norms = np.ones(len(texts), dtype=np.float32)
+        for row, text in enumerate(texts):
+            grams = _trigrams(text)
+            counts = {}
+            for g in grams:
+                counts[g] = counts.get(g, 0) + 1
+            norms[row] = np.sqrt(sum(c * c for c in counts.values())) or 1.0
+            for g, c in counts.items():
+                column = self.trigram_vocab.get(g)
+                if column is not None:
+                    matrix[row, column] = c
+        return matrix / norms[:, None]
+
+    def _token_matrix(self, texts):
+        """Présence des mots du vocabulaire, et nombre total de mots de chaque texte."""
+        matrix = np.zeros((len(texts), len(self.token_vocab)), dtype=np.float32)
+        counts = np.zeros(len(texts), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = set(_tokens(text))
+            counts[row] = len(tokens)
+            for token in tokens:
+                column = self.token_vocab.get(token)
+                if column is not None:
+                    matrix[row, column] = 1.0
+        return matrix, counts
+
+    def match_terms(self, terms):
+        """
+        Matrice booléenne (termes x compétences du profil) : True si le terme
+        de l'annonce correspond à la compétence.
+        """
+        if not terms or not self.skills:
+            return np.zeros((len(terms), len(self.skills)), dtype=bool)
+
+        canonical_terms = [self.canonical(t) for t in terms]
+        exact = np.array(canonical_terms, dtype=object)[:, None] == self.canonical_forms[None, :]
+
+        similarity = self._trigram_matrix(canonical_terms) @ self.form_trigrams.T
+
+        term_tokens, _ = self._token_matrix(canonical_terms)
+        # Tous les mots de la forme du profil figurent dans le terme (« python » dans « python scripting »)
+        shared = term_tokens @ self.form_tokens.T
+        contained = (shared >= np.maximum(self.form_token_counts[None, :], 1)) & self.form_containable[None, :]
+
+        form_match = exact | (similarity >= FUZZY_THRESHOLD) | contained
+        return (form_match.astype(np.float32) @ self.owner) > 0
+
+
+def get_index(user_profile):
+    """Index des compétences du profil, construit une fois par liste de compétences."""
+    skills = list(user_profile.get("competences_cles", []))
+    synonyms = user_profile.get("synonymes_competences") or {}
+    key = make_key(skills, synonyms)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = SkillIndex(skills, synonyms)
+        return index
+
+
+def _unique_terms(values):
+    """Libellés en minuscules, dédoublonnés par forme normalisée (ordre conservé)."""
+    seen = set()
+    terms = []
+    for value in values or []:
+        if normalize_skill(value) and normalize_skill(value) not in seen:
+            seen.add(normalize_skill(value))
+            terms.append(str(value).lower())
+    return terms
+
+
+def score_job_infos(user_profile, job_infos):
+    """
+    Score de compatibilité de chaque annonce (None pour une annonce absente),
+    calculé pour tout le lot en un seul passage sur l'index.
+    """
+    index = get_index(user_profile)
+
+    per_ad = []
+    all_terms = []
+    for job_info in job_infos:
+        if not job_info:
+            per_ad.append(None)
+            continue
+        skills = _unique_terms(job_info.get("competences_requises"))
+        tools = _unique_terms(job_info.get("outils_technologies"))
+        start = len(all_terms)
+        all_terms.extend(skills + tools)
+        per_ad.append((skills, tools, start))
+
+    matches = index.match_terms(all_terms)
+    term_matched = matches.any(axis=1)
+
+    results = []
+    for entry in per_ad:
+        if entry is None:
+            results.append(None)
+            continue
+        skills, tools, start = entry
+        skill_hits = term_matched[start:start + len(skills)]
+        tool_hits = term_matched[start + len(skills):start + len(skills) + len(tools)]
+        results.append(
+            build_result(
+                [s for s, hit in zip(skills, skill_hits) if hit],
+                [t for t, hit in zip(tools, tool_hits) if hit],
+                [s for s, hit in zip(skills, skill_hits) if not hit],
+            )
+        )
+    return results
+
+
+def build_result(matching_skills, matching_tools, missing_skills):
+    """Dictionnaire de résultat (score plafonné à 100 et détails lisibles)."""
+    score = 0
+    details = []
+
+    if matching_skills:
+        score += len(matching_skills) * SKILL_POINTS
+        details.append(
+            f" {len(matching_skills)} competences correspondent : {', '.join(matching_skills)}"
+        )
+
+    if matching_tools:
+        score += len(matching_tools) * TOOL_POINTS
+        details.append(f" {len(matching_tools)} outils  : {', '.join(matching_tools)}")
+
+    # Bonus si toutes les competences requises sont couvertes
+    if matching_skills and not missing_skills:
+        score += FULL_COVERAGE_BONUS
+        details.append(" Toutes les competences requises sont maitrisees ")
+
+    return {
+        "score": min(score, 100),
+        "details": details,
+        "matching_skills": matching_skills,
+        "matching_tools": matching_tools,
+        "missing_skills": missing_skills,
+    }
@@ -0,0 +1,111 @@
+import json
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+from pathlib import Path
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+
+# Modules de l'application à la racine du dépôt
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT_DIR)
+
+# Profil de test (config.json reste propre à chaque utilisateur et n'est pas suivi)
+TEST_PROFILE = {
+    "nom_complet": "Camille Test",
+    "adresse": "1 rue de l'Exemple",
+    "code_postal": "75000 Paris",
+    "telephone": "0600000000",
+    "email": "camille@example.com",
+    "resume_personnel": "Ingénieure logiciel",
+    "competences_cles": ["Python", "SQL", "Docker"],
+    "linkedin_prompt_template": "",
+}
+
+
+def offline_env(tmp_dir):
+    """Variables d'environnement d'une application hors ligne sur des fichiers temporaires."""
+    config_path = tmp_dir / "config.json"
+    config_path.write_text(json.dumps(TEST_PROFILE), encoding="utf-8")
+    return {
+        "LETTRE_CONFIG": str(config_path),
+        "LETTRE_DATABASE_URL": f"sqlite:///{tmp_dir / 'candidatures.db'}",
+        "LETTRE_CACHE_DB": str(tmp_dir / "cache.db"),
+        "GEMINI_BACKEND": "fake",
+    }
+
+
+# Posées avant tout import de l'application : les chemins des caches sont lus au chargement
+TESTS_TMP_DIR = Path(tempfile.mkdtemp(prefix="lettre-tests-"))
+atexit.register(shutil.rmtree, TESTS_TMP_DIR, ignore_errors=True)
+os.environ.update(offline_env(TESTS_TMP_DIR))
+os.environ.pop("GEMINI_API_KEY", None)
+
+
+@pytest.fixture(scope="session")
+def web_app():
+    """Module web_app sur une base et un cache temporaires, sans appel à Gemini."""
+    import web_app as module
+    return module
+
+
+@pytest.fixture
+def db(web_app):
+    """Session sur des tables vides, recréées à chaque test."""
+    with web_app.app.app_context():
+        web_app.db.drop_all()
+        web_app.db.create_all()
+        yield web_app.db
+        web_app.db.session.remove()
+
+
+@pytest.fixture
+def add_candidatures(web_app, db):
+    """Ajoute `count` candidatures, deux par date de création (ex æquo départagés par id)."""
+    def add(count, start=datetime(2024, 1, 1, 9, 0), **values):
+        candidatures = [
+            web_app.Candidature(
+                entreprise=f"Entreprise {i}",
+                poste="Développeur",
+                date_creation=start + timedelta(hours=i // 2),
+                **values,
+            )
+            for i in range(count)
+        ]
+        db.session.add_all(candidatures)
+        db.session.commit()
+        return candidatures
+    return add
+
+
+@pytest.fixture
+def daily_counts(web_app, db):
+    """Agrégat candidature_daily tel que stocké et tel que recompté depuis la table candidature."""
+    def counts():
+        stored = {(row.jour, row.statut): row.nombre for row in db.session.query(web_app.CandidatureDaily)}
+        recounted = dict(Counter(
+            web_app.rollup_key(candidature.date_creation, candidature.statut)
+            for candidature in db.session.query(web_app.Candidature)
+        ))
+        return stored, recounted
+    return counts
+
+
+@pytest.fixture
+def llm_calls(monkeypatch):
+    """Compte les appels au modèle (backend factice) faits par main."""
+    import main
+
+    calls = []
+    generate = main.gemini_client.generate
+
+    def counting_generate(prompt, model_name, *args, **kwargs):
+        calls.append(model_name)
+        return generate(prompt, model_name, *args, **kwargs)
+
+    monkeypatch.setattr(main.gemini_client, "generate", counting_generate)
+    return calls
@@ -0,0 +1,83 @@
+import pytest
+
+from ad_compaction import DUPLICATE_LINE_MIN_CHARS, compact_job_ad, is_boilerplate
+
+
+MISSION_LINES = [
+    "Vous piloterez la newsletter mensuelle envoyée à nos 40 000 clients.",
+    "Vous rédigerez les conditions générales de vente avec le service juridique.",
+    "Vous mettrez en conformité la politique de confidentialité / cookies du site.",
+]
+
+
+@pytest.mark.parametrize("line", [
+    "Accepter tous les cookies",
+    "Ce site utilise des cookies pour améliorer votre expérience.",
+    "Mentions légales | Politique de confidentialité | Cookies",
+    "© 2024 Acme. Tous droits réservés.",
+    "Postuler maintenant !",
+    "Partager cette offre",
+    "Offres similaires",
+    "Abonnez-vous à la newsletter",
+    "Publiée il y a 3 jours",
+])
+def test_is_boilerplate_matches_banner_lines(line):
+    assert is_boilerplate(line)
+
+
+@pytest.mark.parametrize("line", MISSION_LINES + [
+    "Profil : vous connaissez les conditions générales d'achat et la newsletter B2B.",
+    "• Python",
+])
+def test_is_boilerplate_keeps_sentences_mentioning_banner_words(line):
+    assert not is_boilerplate(line)
+
+
+def test_compact_job_ad_keeps_mission_lines_with_banner_words():
+    ad = "\n".join([
+        "Chargé de communication digitale (H/F)",
+        "Accepter tous les cookies",
+        *MISSION_LINES,
+        "Mentions légales | Cookies",
+    ])
+
+    compacted, report = compact_job_ad(ad)
+
+    for line in MISSION_LINES:
+        assert line in compacted
+    assert "Accepter tous les cookies" not in compacted
+    assert report["lignes_parasites"] == 2
+
+
+def test_compact_job_ad_removes_repeated_long_lines_only():
+    long_line = "Nous recherchons un développeur Python expérimenté en API REST."
+    assert len(long_line) >= DUPLICATE_LINE_MIN_CHARS
+    ad = f"{long_line}\n- Python\n\nÀ propos\n{long_line}\n- Python"
+
+    compacted, report = compact_job_ad(ad)
+
+    assert compacted.count(long_line) == 1
+    assert compacted.count("- Python") == 2
+    assert report["lignes_doublons"] == 1
+
+
+def test_compact_job_ad_removes_repeated_paragraphs():
+    paragraph = "À propos d'Acme\nActeur de la logistique"
+    compacted, report = compact_job_ad(f"{paragraph}\n\nMissions\n\n{paragraph}")
+    assert compacted == f"{paragraph}\n\nMissions"
+    assert report["paragraphes_doublons"] == 1
+
+
+def test_compact_job_ad_leaves_short_clean_ad_unchanged():
+    ad = "Développeur Python (H/F)\n\nMissions :\n- Concevoir des API\n- Écrire des tests"
+    compacted, report = compact_job_ad(ad, max_chars=8000)
+    assert compacted == ad
+    assert not report["tronquee"]
+    assert report["caracteres_avant"] == report["caracteres_apres"]
+
+
+def test_compact_job_ad_truncates_to_budget():
+    ad = "\n\n".join(f"Paragraphe {i} " + "mot " * 60 for i in range(10))
+    compacted, report = compact_job_ad(ad, max_chars=500)
+    assert len(compacted) <= 500
+    assert report["tronquee"]
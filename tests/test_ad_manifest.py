@@ -0,0 +1,103 @@
+import os
+
+import pytest
+
+import ad_manifest
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    return ad_manifest.AdManifest(str(tmp_path / "manifest.db"))
+
+
+@pytest.fixture
+def ads(tmp_path):
+    """Deux annonces dans input/ et le PDF déjà produit pour la première."""
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    done, new = input_dir / "acme.txt", input_dir / "globex.txt"
+    done.write_text("Développeur Python chez Acme", encoding="utf-8")
+    new.write_text("Comptable chez Globex", encoding="utf-8")
+    pdf = tmp_path / "acme.pdf"
+    pdf.write_bytes(b"%PDF")
+    return str(done), str(new), str(pdf)
+
+
+def record_done(manifest, path, pdf):
+    manifest.mark_running(path)
+    manifest.record(path, {"success": True, "pdf_path": pdf, "job_info": {"entreprise": "Acme"}})
+
+
+def test_only_new_ads_are_planned(manifest, ads):
+    done, new, pdf = ads
+    record_done(manifest, done, pdf)
+    assert manifest.plan([done, new]) == ({new: "nouvelle"}, {done: "déjà traitée"})
+
+
+def test_manifest_persists_across_instances(manifest, ads, tmp_path):
+    done, new, pdf = ads
+    record_done(manifest, done, pdf)
+
+    reopened = ad_manifest.AdManifest(str(tmp_path / "manifest.db"))
+    entry = reopened.entries()["acme.txt"]
+    assert (entry["status"], entry["stage"], entry["pdf_path"], entry["attempts"]) == (
+        ad_manifest.STATUS_DONE, "pdf", pdf, 1,
+    )
+    assert reopened.plan([done])[1] == {done: "déjà traitée"}
+
+
+def test_modified_ad_is_reprocessed(manifest, ads):
+    done, _, pdf = ads
+    record_done(manifest, done, pdf)
+    with open(done, "a", encoding="utf-8") as f:
+        f.write("\nTélétravail possible.")
+    assert manifest.plan([done])[0] == {done: "modifiée"}
+
+
+def test_force_and_only(manifest, ads):
+    done, new, pdf = ads
+    record_done(manifest, done, pdf)
+    assert manifest.plan([done, new], force=True)[0] == {done: "forcée", new: "forcée"}
+    assert manifest.plan([done, new], force=True, only=["acme*"]) == ({done: "forcée"}, {})
+
+
+def test_failed_or_missing_pdf_ads_are_resumed(manifest, ads):
+    done, new, pdf = ads
+    manifest.mark_running(new)
+    manifest.record(new, {"job_info": {"entreprise": "Globex"}, "letter_body": "Madame, Monsieur"}, error="pdflatex")
+    record_done(manifest, done, pdf)
+    os.remove(pdf)
+
+    to_process, skipped = manifest.plan([done, new])
+    assert to_process == {done: "PDF manquant", new: "reprise (étape atteinte : redaction)"}
+    assert skipped == {}
+    assert manifest.entries()["globex.txt"]["error"] == "pdflatex"
+
+
+def test_running_ad_is_skipped_until_stale(manifest, ads, monkeypatch):
+    done, _, _ = ads
+    manifest.mark_running(done)
+    assert manifest.plan([done])[1] == {done: "en cours de traitement"}
+
+    monkeypatch.setattr(ad_manifest, "RUNNING_STALE_SECONDS", -1)
+    assert manifest.plan([done])[0] == {done: "reprise (traitement interrompu)"}
+
+
+def test_ad_modified_while_running_is_reprocessed(manifest, ads):
+    done, _, pdf = ads
+    manifest.mark_running(done)
+    with open(done, "a", encoding="utf-8") as f:
+        f.write("\nPoste à pourvoir immédiatement.")
+    manifest.record(done, {"success": True, "pdf_path": pdf})
+    assert manifest.plan([done])[0] == {done: "modifiée"}
+
+
+@pytest.mark.parametrize("result, stage", [
+    (None, None),
+    ({"job_info": {"poste": "Dev"}}, "extraction"),
+    ({"job_info": {}, "letter_body": "Corps"}, "redaction"),
+    ({"tex_path": "lettre.tex"}, "tex"),
+    ({"success": True}, "pdf"),
+])
+def test_stage_reached(result, stage):
+    assert ad_manifest.stage_reached(result) == stage
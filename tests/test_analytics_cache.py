@@ -0,0 +1,59 @@
+import pytest
+
+
+@pytest.fixture
+def client(web_app, db, monkeypatch):
+    # Les tables sont recréées à chaque test : le cache en mémoire repart de zéro aussi
+    monkeypatch.setattr(web_app, "_analytics_cache", {})
+    return web_app.app.test_client()
+
+
+def test_chart_is_revalidated_with_etag(client, add_candidatures):
+    add_candidatures(4)
+    response = client.get("/analytics/charts/daily")
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "no-cache"
+    assert response.get_json()["data"]
+    etag = response.headers["ETag"]
+
+    not_modified = client.get("/analytics/charts/daily", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.get_data() == b""
+    assert not_modified.headers["ETag"] == etag
+
+
+def test_etag_changes_after_each_write(web_app, db, client, add_candidatures):
+    (candidature,) = add_candidatures(1)
+    etags = [client.get("/analytics/charts/daily").headers["ETag"]]
+
+    candidature.statut = "Envoyée"
+    db.session.commit()
+    etags.append(client.get("/analytics/charts/daily").headers["ETag"])
+
+    db.session.delete(candidature)
+    db.session.commit()
+    response = client.get("/analytics/charts/daily", headers={"If-None-Match": etags[0]})
+    assert response.status_code == 200
+    etags.append(response.headers["ETag"])
+    assert len(set(etags)) == 3
+
+
+def test_chart_is_built_once_per_data_version(web_app, client, add_candidatures, monkeypatch):
+    add_candidatures(2)
+    builds = []
+    build = web_app.ANALYTICS_CHARTS["daily"]
+    monkeypatch.setitem(web_app.ANALYTICS_CHARTS, "daily", lambda: builds.append(1) or build())
+
+    first = client.get("/analytics/charts/daily").get_data()
+    assert client.get("/analytics/charts/daily").get_data() == first
+    assert len(builds) == 1
+
+    add_candidatures(1)
+    client.get("/analytics/charts/daily")
+    assert len(builds) == 2
+
+
+def test_etag_is_per_chart_and_unknown_chart_is_404(client, add_candidatures):
+    add_candidatures(1)
+    assert client.get("/analytics/charts/daily").headers["ETag"] != client.get("/analytics/charts/funnel").headers["ETag"]
+    assert client.get("/analytics/charts/inconnu").status_code == 404
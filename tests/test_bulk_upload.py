@@ -0,0 +1,102 @@
+import io
+import time
+import zipfile
+
+import pytest
+
+import job_queue
+
+
+@pytest.fixture
+def generated(web_app, monkeypatch):
+    """File de tâches propre au test et génération simulée : annonces reçues par nom de fichier."""
+    monkeypatch.setattr(web_app, "JOB_QUEUE", job_queue.JobQueue(workers=2))
+    received = {}
+
+    def fake_generation(job, announcement_content, form_defaults):
+        received[form_defaults["job_filename"]] = (announcement_content, form_defaults)
+        return {"job_info": {"entreprise": form_defaults["job_filename"]}}
+
+    monkeypatch.setattr(web_app, "run_generation_job", fake_generation)
+    return received
+
+
+def zip_bytes(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+def post_bulk(web_app, files, **form):
+    data = dict(form, job_files=[(io.BytesIO(content), name) for name, content in files])
+    return web_app.app.test_client().post(
+        "/generate_bulk", data=data, content_type="multipart/form-data", headers={"Accept": "application/json"}
+    )
+
+
+def wait_for_jobs(web_app, job_ids):
+    deadline = time.monotonic() + 5
+    while True:
+        summaries = web_app.app.test_client().get(f"/jobs?ids={','.join(job_ids)}").get_json()["jobs"]
+        if all(s["status"] == job_queue.STATUS_DONE for s in summaries.values()) or time.monotonic() > deadline:
+            return summaries
+        time.sleep(0.01)
+
+
+def test_bulk_upload_creates_one_job_per_ad(web_app, generated):
+    archive = zip_bytes({
+        "annonces/globex.txt": "Comptable chez Globex",
+        "annonces/initech.txt": "\ufeffTesteur chez Initech",  # BOM retiré à la lecture
+        "__MACOSX/._globex.txt": "métadonnées",
+        "lisez-moi.md": "autre format",
+    })
+    response = post_bulk(
+        web_app, [("acme.txt", "Développeur chez Acme".encode("utf-8")), ("lot.zip", archive)], bypass_cache="on",
+    )
+    assert response.status_code == 202
+    payload = response.get_json()
+    assert payload["rejected"] == []
+    assert [job["filename"] for job in payload["jobs"]] == ["acme.txt", "globex.txt", "initech.txt"]
+
+    summaries = wait_for_jobs(web_app, [job["job_id"] for job in payload["jobs"]])
+    assert sorted(s["entreprise"] for s in summaries.values()) == ["acme.txt", "globex.txt", "initech.txt"]
+    assert generated["initech.txt"][0] == "Testeur chez Initech"
+    assert generated["acme.txt"][1]["bypass_cache"] is True
+
+
+def test_bulk_upload_rejects_bad_files_and_keeps_the_others(web_app, generated, monkeypatch):
+    monkeypatch.setattr(web_app, "MAX_AD_BYTES", 20)
+    response = post_bulk(web_app, [
+        ("acme.txt", b"Developpeur Acme"),
+        ("vide.txt", b"  \n"),
+        ("latin1.txt", "Ingénieur".encode("latin-1")),
+        ("long.txt", b"x" * 21),
+        ("image.png", b"\x89PNG"),
+        ("casse.zip", b"pas une archive"),
+    ])
+    payload = response.get_json()
+    assert response.status_code == 202
+    assert [job["filename"] for job in payload["jobs"]] == ["acme.txt"]
+    assert {r["filename"]: r["error"] for r in payload["rejected"]} == {
+        "vide.txt": "Le fichier fourni est vide.",
+        "latin1.txt": "Impossible de lire le fichier en UTF-8.",
+        "long.txt": "Annonce trop volumineuse.",
+        "image.png": "Format non pris en charge (.txt ou .zip attendu).",
+        "casse.zip": "Archive zip illisible.",
+    }
+
+
+def test_bulk_upload_caps_ads_per_request(web_app, generated, monkeypatch):
+    monkeypatch.setattr(web_app, "MAX_BULK_ADS", 2)
+    archive = zip_bytes({f"annonce_{i}.txt": f"Annonce {i}" for i in range(3)})
+    payload = post_bulk(web_app, [("lot.zip", archive)]).get_json()
+    assert len(payload["jobs"]) == 2
+    assert [r["filename"] for r in payload["rejected"]] == ["annonce_2.txt"]
+
+
+def test_bulk_upload_without_files_is_an_error(web_app, generated):
+    response = post_bulk(web_app, [])
+    assert response.status_code == 400
+    assert response.get_json()["error"]
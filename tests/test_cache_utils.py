@@ -0,0 +1,70 @@
+import time
+import uuid
+
+import pytest
+
+from cache_utils import SQLiteCache, make_key, normalize_text
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SQLiteCache("test", db_path=str(tmp_path / "cache.db"), max_entries=2)
+
+
+def test_sqlite_cache_round_trip(cache):
+    assert cache.get("absente") is None
+    cache.set("cle", {"entreprise": "Acme", "competences": ["Python"]})
+    assert cache.get("cle") == {"entreprise": "Acme", "competences": ["Python"]}
+    assert {key: cache.stats()[key] for key in ("hits", "misses", "entries")} == {
+        "hits": 1, "misses": 1, "entries": 1,
+    }
+
+
+def test_sqlite_cache_evicts_least_recently_read(cache):
+    cache.set("a", 1)
+    time.sleep(0.01)
+    cache.set("b", 2)
+    time.sleep(0.01)
+    assert cache.get("a") == 1  # « a » devient la plus récemment lue
+    time.sleep(0.01)
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+
+def test_sqlite_cache_expires_old_entries(tmp_path):
+    cache = SQLiteCache("test", db_path=str(tmp_path / "cache.db"), max_age_days=0.2 / 86400)
+    cache.set("cle", "valeur")
+    assert cache.get("cle") == "valeur"
+    time.sleep(0.3)
+    assert cache.get("cle") is None
+    cache.set("autre", "valeur")  # l'écriture purge les entrées expirées
+    assert cache.stats()["entries"] == 1
+
+
+def test_sqlite_cache_namespaces_are_separate(tmp_path):
+    first = SQLiteCache("premier", db_path=str(tmp_path / "cache.db"))
+    second = SQLiteCache("second", db_path=str(tmp_path / "cache.db"))
+    first.set("cle", "a")
+    assert second.get("cle") is None
+    second.clear()
+    assert first.get("cle") == "a"
+
+
+def test_make_key_is_stable_and_normalized():
+    assert make_key(normalize_text("Développeur  Python\n"), "v1") == make_key(normalize_text("Développeur Python"), "v1")
+    assert make_key("texte", "v1") != make_key("texte", "v2")
+
+
+def test_extract_job_info_reuses_cached_extraction(llm_calls):
+    import main
+
+    ad = f"Développeur Python (H/F) chez Acme {uuid.uuid4().hex}.\nMissions : API et tests."
+    job_info = main.extract_job_info(ad)
+    # Espaces différents : même annonce normalisée, servie par le cache
+    assert main.extract_job_info(ad.replace(" ", "  ") + "\n\n") == job_info
+    assert len(llm_calls) == 1
+
+    main.extract_job_info(ad, use_cache=False)
+    assert len(llm_calls) == 2
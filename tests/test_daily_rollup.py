@@ -0,0 +1,104 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+from datetime import datetime
+
+import pytest
+
+from conftest import ROOT_DIR, offline_env
+
+# Schéma d'origine (avant l'agrégat journalier et les index), avec ou sans url_offer
+BASELINE_SCHEMA = """
+CREATE TABLE candidature (
+    id INTEGER NOT NULL PRIMARY KEY,
+    entreprise VARCHAR(100) NOT NULL,
+    poste VARCHAR(100) NOT NULL,
+    statut VARCHAR(50),
+    date_creation DATETIME,
+    date_maj DATETIME,
+    fichier_pdf VARCHAR(200),
+    {url_offer}
+    notes TEXT
+)
+"""
+
+# Import de web_app (comme le ferait gunicorn) puis écriture d'une candidature
+WRITE_AFTER_IMPORT = """
+import json
+import web_app
+with web_app.app.app_context():
+    web_app.db.session.add(web_app.Candidature(entreprise="Acme", poste="Développeur"))
+    web_app.db.session.commit()
+    print(json.dumps({
+        "candidatures": web_app.Candidature.query.count(),
+        "rollup": int(web_app.db.session.query(web_app.func.sum(web_app.CandidatureDaily.nombre)).scalar()),
+    }))
+"""
+
+
+def test_rollup_follows_insert_update_and_delete(db, add_candidatures, daily_counts):
+    candidatures = add_candidatures(6)
+    stored, recounted = daily_counts()
+    assert stored == recounted and sum(stored.values()) == 6
+
+    candidatures[0].statut = 'Envoyée'
+    candidatures[1].date_creation = datetime(2023, 12, 31, 18, 0)
+    db.session.commit()
+    stored, recounted = daily_counts()
+    assert stored == recounted
+
+    db.session.delete(candidatures[2])
+    db.session.delete(candidatures[3])
+    db.session.commit()
+    stored, recounted = daily_counts()
+    assert stored == recounted and sum(stored.values()) == 4
+
+
+def test_rollup_drops_empty_days(db, add_candidatures, daily_counts):
+    candidature, = add_candidatures(1)
+    db.session.delete(candidature)
+    db.session.commit()
+    assert daily_counts() == ({}, {})
+
+
+def test_rollup_changes_data_version(web_app, db, add_candidatures):
+    candidature, = add_candidatures(1)
+    version = web_app.candidatures_version()
+    candidature.statut = 'Refus'
+    db.session.commit()
+    assert web_app.candidatures_version() != version
+
+
+def test_rebuild_daily_rollup_matches_table(web_app, db, add_candidatures, daily_counts):
+    add_candidatures(5, statut='Entretien')
+    db.session.execute(web_app.CandidatureDaily.__table__.delete())
+    db.session.commit()
+    web_app.rebuild_daily_rollup()
+    stored, recounted = daily_counts()
+    assert stored == recounted and sum(stored.values()) == 5
+
+
+@pytest.mark.parametrize("url_offer", ["url_offer VARCHAR(500),", ""])
+def test_import_migrates_baseline_database(tmp_path, url_offer):
+    database = tmp_path / "candidatures.db"
+    with sqlite3.connect(database) as conn:
+        conn.execute(BASELINE_SCHEMA.format(url_offer=url_offer))
+        conn.executemany(
+            "INSERT INTO candidature (entreprise, poste, statut, date_creation) VALUES (?, ?, ?, ?)",
+            [("Ancienne", "Dev", "Envoyée", "2024-01-01 09:00:00.000000")] * 2,
+        )
+    env = dict(os.environ, **offline_env(tmp_path))
+    env.pop("GEMINI_API_KEY", None)
+
+    completed = subprocess.run(
+        [sys.executable, "-c", WRITE_AFTER_IMPORT],
+        cwd=ROOT_DIR, env=env, capture_output=True, text=True, timeout=60,
+    )
+
+    assert completed.returncode == 0, completed.stderr
+    assert json.loads(completed.stdout.strip().splitlines()[-1]) == {"candidatures": 3, "rollup": 3}
+    with sqlite3.connect(database) as conn:
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert "ix_candidature_date_id" in indexes
@@ -0,0 +1,71 @@
+import pytest
+
+import duplicate_index
+
+AD = """Acme recrute un développeur Python (H/F) pour son équipe plateforme à Lyon.
+Missions : concevoir et maintenir les API de facturation, écrire des tests automatisés,
+participer aux revues de code et à l'amélioration continue de la chaîne de déploiement.
+Profil : trois ans d'expérience en Python et SQL, maîtrise de Docker et de Git,
+goût pour le travail en équipe et la qualité logicielle. Télétravail partiel possible.
+Rémunération selon profil, mutuelle et tickets restaurant."""
+
+# Même offre republiée ailleurs : bandeau du site, une formulation retouchée
+REPOSTED = "Postuler maintenant\n" + AD.replace("à Lyon", "à Lyon (69)") + "\nPartager cette offre"
+
+OTHER = """Globex cherche un comptable confirmé (H/F) pour son siège de Bordeaux.
+Missions : tenue de la comptabilité générale, déclarations fiscales, clôtures mensuelles
+et annuelles, relation avec les commissaires aux comptes. Profil : BTS ou DCG,
+cinq ans d'expérience en cabinet ou en entreprise, maîtrise de Sage."""
+
+
+@pytest.fixture
+def index(tmp_path):
+    return duplicate_index.DuplicateIndex(db_path=str(tmp_path / "cache.db"))
+
+
+def test_similarity_of_signatures():
+    sig = duplicate_index.signature(AD)
+    assert duplicate_index.similarity(sig, duplicate_index.signature(AD)) == 1.0
+    assert duplicate_index.similarity(sig, duplicate_index.signature(REPOSTED)) >= duplicate_index.DEFAULT_THRESHOLD
+    assert duplicate_index.similarity(sig, duplicate_index.signature(OTHER)) < 0.2
+
+
+def test_content_hash_ignores_case_accents_and_spacing():
+    assert duplicate_index.content_hash(AD) == duplicate_index.content_hash(AD.upper().replace(" ", "  "))
+    assert duplicate_index.content_hash(AD) != duplicate_index.content_hash(OTHER)
+
+
+def test_near_duplicate_is_found_with_previous_result(index):
+    ad_id = index.add(AD, source="acme.txt", pdf_path="output/acme.pdf", result={"template": "classique"})
+    assert index.find(AD)["similarity"] == 1.0
+
+    match = index.find(REPOSTED)
+    assert match["id"] == ad_id
+    assert match["similarity"] >= duplicate_index.DEFAULT_THRESHOLD
+    assert (match["source"], match["pdf_path"], match["template"]) == ("acme.txt", "output/acme.pdf", "classique")
+
+
+def test_distinct_ad_is_not_a_duplicate(index):
+    index.add(AD)
+    assert index.find(OTHER) is None
+
+
+def test_threshold_can_be_raised(tmp_path, monkeypatch):
+    monkeypatch.setenv("LETTRE_DUPLICATE_THRESHOLD", "0.999")
+    index = duplicate_index.DuplicateIndex(db_path=str(tmp_path / "cache.db"))
+    index.add(AD)
+    assert index.find(REPOSTED) is None
+    assert index.find(AD) is not None  # le texte identique reste reconnu
+
+
+def test_index_persists_and_links_candidature(index, tmp_path):
+    ad_id = index.add(AD)
+    index.add(AD, source="acme_bis.txt")  # même annonce : entrée mise à jour, pas doublée
+    index.link_candidature(ad_id, 42)
+
+    reopened = duplicate_index.DuplicateIndex(db_path=str(tmp_path / "cache.db"))
+    assert reopened.stats() == {"entries": 1}
+    assert (reopened.find(AD)["candidature_id"], reopened.find(AD)["source"]) == (42, "acme_bis.txt")
+
+    reopened.clear()
+    assert reopened.find(AD) is None
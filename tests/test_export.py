@@ -0,0 +1,69 @@
+import csv
+import gzip
+import io
+from datetime import datetime
+
+
+def read_csv(data):
+    assert data.startswith("\ufeff")
+    return list(csv.reader(io.StringIO(data[1:])))
+
+
+def test_export_streams_all_rows_in_id_order(web_app, db, add_candidatures, monkeypatch):
+    monkeypatch.setattr(web_app, "EXPORT_CHUNK_SIZE", 3)
+    add_candidatures(7, url_offer="https://example.com/offre")
+    response = web_app.app.test_client().get("/export_db")
+
+    assert response.is_streamed
+    assert response.mimetype == "text/csv"
+    assert response.headers["Content-Disposition"] == "attachment;filename=candidatures.csv"
+    rows = read_csv(response.get_data(as_text=True))
+    assert rows[0] == list(web_app.EXPORT_COLUMNS)
+    assert [row[0] for row in rows[1:]] == [str(i) for i in range(1, 8)]
+    assert rows[1][1:] == ["Entreprise 0", "Développeur", "En préparation", "2024-01-01 09:00:00", "https://example.com/offre", ""]
+
+
+def test_export_by_chunks_of_rows(web_app, db, add_candidatures, monkeypatch):
+    monkeypatch.setattr(web_app, "EXPORT_CHUNK_SIZE", 3)
+    add_candidatures(7)
+    with web_app.app.test_request_context():
+        chunks = list(web_app.iter_csv_export(web_app.Candidature.query.with_entities(web_app.Candidature.id), ["id"]))
+    assert chunks == ["\ufeffid\r\n1\r\n2\r\n3\r\n", "4\r\n5\r\n6\r\n", "7\r\n"]
+
+
+def test_export_selected_columns(web_app, db, add_candidatures):
+    add_candidatures(2)
+    response = web_app.app.test_client().get("/export_db?columns=entreprise,date_creation")
+    assert read_csv(response.get_data(as_text=True)) == [
+        ["entreprise", "date_creation"],
+        ["Entreprise 0", "2024-01-01 09:00:00"],
+        ["Entreprise 1", "2024-01-01 09:00:00"],
+    ]
+
+
+def test_export_rejects_unknown_columns(web_app, db):
+    response = web_app.app.test_client().get("/export_db?columns=entreprise,salaire")
+    assert response.status_code == 400
+    assert "salaire" in response.get_json()["error"]
+
+
+def test_export_gzip(web_app, db, add_candidatures):
+    add_candidatures(3)
+    response = web_app.app.test_client().get("/export_db?gzip=1")
+    assert response.mimetype == "application/gzip"
+    assert response.headers["Content-Disposition"] == "attachment;filename=candidatures.csv.gz"
+    rows = read_csv(gzip.decompress(response.get_data()).decode("utf-8"))
+    assert len(rows) == 4
+
+
+def test_export_applies_dashboard_filters(web_app, db, add_candidatures):
+    add_candidatures(4, start=datetime(2024, 1, 1, 9, 0))
+    add_candidatures(2, start=datetime(2024, 3, 1, 9, 0), statut="Envoyée")
+    client = web_app.app.test_client()
+
+    def exported_ids(query):
+        return [row[0] for row in read_csv(client.get(f"/export_db?columns=id&{query}").get_data(as_text=True))[1:]]
+
+    assert exported_ids("statut=Envoyée") == ["5", "6"]
+    assert exported_ids("date_debut=2024-02-01") == ["5", "6"]
+    assert exported_ids("date_fin=2024-01-01&entreprise=entreprise 1") == ["2"]
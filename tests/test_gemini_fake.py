@@ -0,0 +1,74 @@
+import json
+
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+import gemini_fake
+
+
+@pytest.fixture(autouse=True)
+def fast_fake(monkeypatch):
+    """Backend factice sans latence, compteurs d'appels remis à zéro."""
+    monkeypatch.setenv("GEMINI_FAKE_LATENCY", "fixed:0")
+    monkeypatch.setenv("GEMINI_FAKE_CHUNK_DELAY", "0")
+    monkeypatch.setattr(gemini_fake, "_call_counts", {})
+
+
+AD = "Entreprise : Acme\nPoste : Développeur Python\nStack : Python, SQL et Docker."
+EXTRACTION_PROMPT = f"Analyse l'annonce et réponds au format JSON strict.\n---\n{AD}\n---\n"
+
+
+def draws(count=3):
+    """Premiers tirages du générateur pour des appels successifs d'un même prompt."""
+    return [gemini_fake._rng("prompt").random() for _ in range(count)]
+
+
+def test_responses_depend_only_on_the_prompt():
+    first = gemini_fake.FakeGenerativeModel("modele-a").generate_content(EXTRACTION_PROMPT).text
+    second = gemini_fake.FakeGenerativeModel("modele-b").generate_content(EXTRACTION_PROMPT).text
+    assert first == second
+    job_info = json.loads(first)
+    assert (job_info["entreprise"], job_info["poste"]) == ("Acme", "Développeur Python")
+    assert job_info["outils_technologies"] == ["python", "sql", "docker"]
+
+
+def test_draws_are_reproducible_for_a_seed(monkeypatch):
+    monkeypatch.setenv("GEMINI_FAKE_SEED", "42")
+    first_run = draws()
+    monkeypatch.setattr(gemini_fake, "_call_counts", {})
+    assert draws() == first_run
+    # Chaque appel successif a son propre tirage
+    assert len(set(first_run)) == len(first_run)
+
+    monkeypatch.setattr(gemini_fake, "_call_counts", {})
+    monkeypatch.setenv("GEMINI_FAKE_SEED", "7")
+    assert draws() != first_run
+
+
+def test_error_rate_raises_transient_errors(monkeypatch):
+    monkeypatch.setenv("GEMINI_FAKE_ERROR_RATE", "1")
+    with pytest.raises((google_exceptions.ServiceUnavailable, google_exceptions.ResourceExhausted)):
+        gemini_fake.FakeGenerativeModel("modele").generate_content("prompt")
+
+
+def test_latency_beyond_timeout_raises_deadline_exceeded(monkeypatch):
+    monkeypatch.setenv("GEMINI_FAKE_LATENCY", "fixed:500")
+    with pytest.raises(google_exceptions.DeadlineExceeded):
+        gemini_fake.FakeGenerativeModel("modele").generate_content("prompt", request_options={"timeout": 0.01})
+
+
+def test_stream_chunks_rebuild_the_full_text():
+    model = gemini_fake.FakeGenerativeModel("modele")
+    prompt = "Rédige la lettre.\n- Entreprise : Acme\n- Poste : Développeur Python\n"
+    full = model.generate_content(prompt).text
+    assert "".join(chunk.text for chunk in model.generate_content(prompt, stream=True)) == full
+
+
+@pytest.mark.parametrize("spec, expected", [("fixed:200", 0.2), ("uniform:100:100", 0.1)])
+def test_parse_latency(spec, expected):
+    assert gemini_fake.parse_latency(spec)(gemini_fake._rng("prompt")) == pytest.approx(expected)
+
+
+def test_parse_latency_rejects_unknown_kind():
+    with pytest.raises(ValueError):
+        gemini_fake.parse_latency("gaussian:1")
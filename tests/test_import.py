@@ -0,0 +1,73 @@
+import io
+from datetime import datetime
+
+
+def import_values(entreprise, statut='Envoyée', **values):
+    return {"entreprise": entreprise, "poste": "Développeur", "statut": statut, "url_offer": "", "notes": "", **values}
+
+
+def test_import_batch_counts_created_updated_and_rejected(web_app, db, add_candidatures, daily_counts):
+    existing, = add_candidatures(1)
+    batch = [
+        (2, import_values("Nouvelle", date_creation=datetime(2024, 2, 1, 10, 0))),
+        (3, import_values("Modifiée", statut='Entretien', id=existing.id)),
+        (4, import_values("Fantôme", id=9999)),
+    ]
+
+    created, updated, rejected = web_app.import_batch(batch)
+
+    assert (created, updated) == (1, 1)
+    assert rejected == [{"line": 4, "error": "candidature 9999 introuvable"}]
+    db.session.expire_all()
+    assert db.session.get(web_app.Candidature, existing.id).statut == 'Entretien'
+    stored, recounted = daily_counts()
+    assert stored == recounted
+
+
+def test_import_batch_applies_last_line_of_repeated_id(web_app, db, add_candidatures, daily_counts):
+    existing, = add_candidatures(1)
+    batch = [
+        (2, import_values("Première", statut='Envoyée', id=existing.id)),
+        (3, import_values("Dernière", statut='Offre', id=existing.id)),
+    ]
+
+    created, updated, rejected = web_app.import_batch(batch)
+
+    assert (created, updated) == (0, 1)
+    assert rejected == [{"line": 2, "error": f"candidature {existing.id} répétée (ligne 3 appliquée)"}]
+    db.session.expire_all()
+    candidature = db.session.get(web_app.Candidature, existing.id)
+    assert (candidature.entreprise, candidature.statut) == ("Dernière", 'Offre')
+    stored, recounted = daily_counts()
+    assert stored == recounted
+
+
+def test_import_batch_changes_data_version(web_app, db):
+    version = web_app.candidatures_version()
+    web_app.import_batch([(2, import_values("Nouvelle", date_creation=datetime(2024, 2, 1, 10, 0)))])
+    assert web_app.candidatures_version() != version
+
+
+def post_import(web_app, content):
+    return web_app.app.test_client().post(
+        "/import_db",
+        data={"file": (io.BytesIO(content.encode("utf-8")), "candidatures.csv")},
+        content_type="multipart/form-data",
+        headers={"Accept": "application/json"},
+    )
+
+
+def test_import_report_keeps_first_rejects_and_counts_the_rest(web_app, db, monkeypatch, caplog):
+    monkeypatch.setattr(web_app, "MAX_REPORTED_REJECTS", 3)
+    lines = ["id,entreprise,poste,statut,date_creation,url_offer,notes"]
+    lines += ["incomplète"] * 5
+    lines += [",Acme,Développeur,Envoyée,2024-01-02 09:00:00,,"]
+    response = post_import(web_app, "\n".join(lines) + "\n")
+
+    report = response.get_json()
+    assert (report["created"], report["rejected_count"]) == (1, 5)
+    assert [rejected["line"] for rejected in report["rejected"]] == [2, 3, 4]
+    assert [record.message for record in caplog.records if "rejetée" in record.message] == [
+        "Import : ligne 5 rejetée (moins de 7 colonnes)",
+        "Import : ligne 6 rejetée (moins de 7 colonnes)",
+    ]
@@ -0,0 +1,159 @@
+import threading
+import time
+
+import pytest
+
+import job_queue
+
+
+@pytest.fixture
+def queue(web_app, monkeypatch):
+    """File de tâches propre à un test (un worker, une tâche en attente), à la place de celle de l'application."""
+    queue = job_queue.JobQueue(workers=1, max_pending=1)
+    monkeypatch.setattr(web_app, "JOB_QUEUE", queue)
+    return queue
+
+
+@pytest.fixture
+def client(web_app):
+    return web_app.app.test_client()
+
+
+def parse_sse(text):
+    """Liste des (événement, données brutes) d'un flux Server-Sent Events."""
+    events = []
+    for block in text.split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if "event" in lines:
+            events.append((lines["event"], lines.get("data")))
+    return events
+
+
+def emitting_job(job, steps, fail=False):
+    for step in steps:
+        job.emit("step", {"name": step})
+    if fail:
+        raise RuntimeError("compilation impossible")
+    job.emit("done", {"message": "ok"})
+    return {"message": "ok"}
+
+
+def test_job_stream_relays_events_until_done(queue, client):
+    job_id = queue.submit(emitting_job, ["extraction", "redaction"])
+    response = client.get(f"/jobs/{job_id}/stream")
+    assert response.mimetype == "text/event-stream"
+    assert [event for event, _ in parse_sse(response.get_data(as_text=True))] == ["step", "step", "done"]
+
+
+def test_job_stream_reports_failure(queue, client):
+    job_id = queue.submit(emitting_job, ["extraction"], fail=True)
+    events = parse_sse(client.get(f"/jobs/{job_id}/stream").get_data(as_text=True))
+    assert events[0][0] == "step"
+    assert events[-1] == ("error", '{"message": "compilation impossible"}')
+
+
+def test_job_stream_waits_for_running_job(queue, client):
+    release = threading.Event()
+
+    def slow_job(job):
+        job.emit("step", {"name": "extraction"})
+        release.wait(5)
+        job.emit("done", {})
+
+    job_id = queue.submit(slow_job)
+    threading.Timer(0.2, release.set).start()
+    events = parse_sse(client.get(f"/jobs/{job_id}/stream").get_data(as_text=True))
+    assert [event for event, _ in events] == ["step", "done"]
+
+
+def test_job_stream_unknown_job_returns_404(queue, client):
+    assert client.get("/jobs/inconnue/stream").status_code == 404
+
+
+def test_generate_stream_submits_job_and_relays_it(web_app, queue, client, monkeypatch):
+    submitted = []
+
+    def fake_generation(job, announcement_content, form_defaults):
+        submitted.append(announcement_content)
+        return emitting_job(job, ["extraction"])
+
+    monkeypatch.setattr(web_app, "run_generation_job", fake_generation)
+    response = client.post("/generate_stream", data={"job_text": "Développeur Python chez Acme"})
+    events = parse_sse(response.get_data(as_text=True))
+
+    assert submitted == ["Développeur Python chez Acme"]
+    assert [event for event, _ in events] == ["job", "step", "done"]
+
+
+def test_generate_stream_rejects_empty_form(queue, client):
+    events = parse_sse(client.post("/generate_stream", data={}).get_data(as_text=True))
+    assert [event for event, _ in events] == ["error"]
+
+
+def blocking_job(job, release):
+    release.wait(5)
+    return {"message": "débloquée"}
+
+
+def poll(client, job_id, until=(job_queue.STATUS_DONE, job_queue.STATUS_FAILED)):
+    """Interroge /jobs/<id> en JSON jusqu'à l'un des statuts `until`."""
+    deadline = time.monotonic() + 5
+    while True:
+        payload = client.get(f"/jobs/{job_id}", headers={"Accept": "application/json"}).get_json()
+        if payload["status"] in until or time.monotonic() > deadline:
+            return payload
+        time.sleep(0.01)
+
+
+def test_jobs_polling_goes_from_pending_to_done(queue, client):
+    release = threading.Event()
+    running_id = queue.submit(blocking_job, release)
+    poll(client, running_id, until=(job_queue.STATUS_RUNNING,))
+    job_id = queue.submit(emitting_job, ["extraction"])
+
+    pending = poll(client, job_id, until=(job_queue.STATUS_QUEUED,))
+    assert (pending["status"], pending["position"], pending["events"]) == (job_queue.STATUS_QUEUED, 1, [])
+
+    release.set()
+    done = poll(client, job_id)
+    assert done["status"] == job_queue.STATUS_DONE
+    assert [event["event"] for event in done["events"]] == ["step", "done"]
+    assert done["result"] == {"message": "ok"}
+    # Reprise après le dernier événement reçu
+    resumed = client.get(f"/jobs/{job_id}?since={done['next']}", headers={"Accept": "application/json"})
+    assert resumed.get_json()["events"] == []
+
+
+def test_jobs_polling_reports_failure(queue, client):
+    job_id = queue.submit(emitting_job, ["extraction"], fail=True)
+    failed = poll(client, job_id)
+    assert (failed["status"], failed["error"]) == (job_queue.STATUS_FAILED, "compilation impossible")
+
+
+def test_unknown_job_returns_404(queue, client):
+    response = client.get("/jobs/inconnue", headers={"Accept": "application/json"})
+    assert response.status_code == 404
+    assert response.get_json()["error"]
+
+
+def test_generate_answers_503_when_queue_is_full(web_app, queue, client, monkeypatch):
+    monkeypatch.setattr(web_app, "run_generation_job", lambda job, content, form_defaults: None)
+    release = threading.Event()
+    try:
+        running_id = queue.submit(blocking_job, release)
+        poll(client, running_id, until=(job_queue.STATUS_RUNNING,))
+        queued_id = queue.submit(blocking_job, release)  # occupe la seule place en attente
+        assert queued_id
+
+        response = client.post(
+            "/generate", data={"job_text": "Développeur Python"}, headers={"Accept": "application/json"}
+        )
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == str(web_app.QUEUE_FULL_RETRY_AFTER)
+        assert response.get_json()["error"] == web_app.QUEUE_FULL_MESSAGE
+    finally:
+        release.set()
+
+    assert poll(client, queued_id)["status"] == job_queue.STATUS_DONE
+    response = client.post("/generate", data={"job_text": "Développeur Python"}, headers={"Accept": "application/json"})
+    assert response.status_code == 202
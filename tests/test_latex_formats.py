@@ -0,0 +1,91 @@
+import os
+import shutil
+
+import pytest
+
+import latex_formats
+from conftest import ROOT_DIR, TEST_PROFILE
+
+TEMPLATE_PATH = os.path.join(ROOT_DIR, "templates", "lettre_template.tex")
+
+TEMPLATE = r"""\documentclass{article}
+\usepackage[T1]{fontenc}
+\newcommand{\Nom}{%%NOM_COMPLET%%}
+\begin{document}
+%%CORPS_LETTRE%%
+\end{document}
+"""
+
+
+@pytest.fixture
+def formats_dir(tmp_path, monkeypatch):
+    """Formats construits dans un dossier temporaire, sans ceux déjà connus du processus."""
+    monkeypatch.setattr(latex_formats, "FORMATS_DIR", str(tmp_path / "formats"))
+    monkeypatch.setattr(latex_formats, "_built_formats", set())
+    return tmp_path / "formats"
+
+
+def test_static_preamble_stops_at_first_placeholder():
+    assert latex_formats.static_preamble(TEMPLATE) == "\\documentclass{article}\n\\usepackage[T1]{fontenc}\n"
+    assert latex_formats.static_preamble("%%NOM%%\n\\documentclass{article}\n\\begin{document}") is None
+    assert latex_formats.static_preamble("\\documentclass{article}") is None
+
+
+def test_format_name_follows_static_preamble():
+    name = latex_formats.format_name(TEMPLATE)
+    assert name.startswith("lettre-")
+    assert latex_formats.format_name(TEMPLATE.replace("Corps", "Autre")) == name
+    assert latex_formats.format_name(TEMPLATE.replace("T1", "OT1")) != name
+
+
+def test_attach_and_detach_format(formats_dir, tmp_path):
+    rendered = TEMPLATE.replace("%%NOM_COMPLET%%", "Camille").replace("%%CORPS_LETTRE%%", "Madame, Monsieur")
+    assert latex_formats.attach_format(rendered, TEMPLATE) == rendered  # format pas encore construit
+
+    name = latex_formats.format_name(TEMPLATE)
+    latex_formats._built_formats.add(name)
+    attached = latex_formats.attach_format(rendered, TEMPLATE)
+    assert attached.startswith(f"{latex_formats.FORMAT_MARKER}{name}\n\\documentclass")
+    assert "\\usepackage[T1]{fontenc}\n\\endofdump\n\\newcommand" in attached
+
+    tex_path = tmp_path / "lettre.tex"
+    tex_path.write_text(attached, encoding="utf-8")
+    assert latex_formats.read_format_marker(str(tex_path)) is None  # pas de .fmt sur le disque
+    formats_dir.mkdir()
+    (formats_dir / f"{name}.fmt").write_bytes(b"")
+    assert latex_formats.read_format_marker(str(tex_path)) == name
+
+    latex_formats.detach_format(str(tex_path))
+    assert tex_path.read_text(encoding="utf-8") == rendered
+
+
+def test_discard_format_forgets_and_removes_it(formats_dir):
+    name = latex_formats.format_name(TEMPLATE)
+    latex_formats._built_formats.add(name)
+    formats_dir.mkdir()
+    (formats_dir / f"{name}.fmt").write_bytes(b"")
+
+    latex_formats.discard_format(name)
+    latex_formats.discard_format(name)  # déjà supprimé : sans erreur
+    assert name not in latex_formats._built_formats
+    assert not (formats_dir / f"{name}.fmt").exists()
+
+
+@pytest.mark.skipif(shutil.which("pdflatex") is None, reason="pdflatex introuvable")
+def test_letter_compiles_with_precompiled_format(formats_dir, tmp_path, monkeypatch):
+    import main
+
+    monkeypatch.setenv("LETTRE_COMPILE_DIR", str(tmp_path / "compile"))
+    with open(TEMPLATE_PATH, encoding="utf-8") as f:
+        template = f.read()
+    name = latex_formats.build_format(template)
+    assert name and (formats_dir / f"{name}.fmt").exists()
+
+    tex_path, _ = main.write_tex_from_content(
+        TEST_PROFILE, template, "Acme", "Développeur Python", "Madame, Monsieur,\n\nJe candidate.", "lettre_acme"
+    )
+    assert latex_formats.read_format_marker(tex_path) == name
+    assert main.run_pdflatex(tex_path)
+    assert os.path.exists(os.path.splitext(tex_path)[0] + ".pdf")
+    # Pas de repli sur la compilation classique : le format est toujours là
+    assert (formats_dir / f"{name}.fmt").exists()
@@ -0,0 +1,99 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import latex_sandbox
+
+
+@pytest.fixture
+def compile_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("LETTRE_COMPILE_DIR", str(tmp_path / "compile"))
+    return tmp_path / "compile"
+
+
+def test_sandbox_is_discarded_with_its_files(compile_dir):
+    sandbox = latex_sandbox.create()
+    assert os.path.dirname(sandbox) == str(compile_dir)
+    tex_path = os.path.join(sandbox, "lettre.tex")
+    open(tex_path, "w").close()
+
+    latex_sandbox.discard(tex_path)
+    assert not os.path.exists(sandbox)
+
+
+def test_discard_ignores_files_outside_a_sandbox(tmp_path):
+    tex_path = tmp_path / "lettre.tex"
+    tex_path.write_text("source", encoding="utf-8")
+    latex_sandbox.discard(str(tex_path))
+    assert tex_path.exists()
+
+
+def test_purge_stale_removes_only_old_sandboxes(compile_dir):
+    old, recent = latex_sandbox.create(), latex_sandbox.create()
+    os.utime(old, (1, 1))
+    latex_sandbox.purge_stale()
+    assert not os.path.exists(old)
+    assert os.path.exists(recent)
+
+
+def test_publish_replaces_destination(tmp_path):
+    src = tmp_path / "lettre.pdf"
+    src.write_bytes(b"nouveau")
+    dest = tmp_path / "output" / "lettre.pdf"
+    latex_sandbox.publish(str(src), str(dest))
+    assert dest.read_bytes() == b"nouveau"
+    assert os.listdir(dest.parent) == ["lettre.pdf"]
+
+
+def test_failed_publish_leaves_previous_file_untouched(tmp_path, monkeypatch):
+    src = tmp_path / "lettre.pdf"
+    src.write_bytes(b"nouveau")
+    dest = tmp_path / "output" / "lettre.pdf"
+    dest.parent.mkdir()
+    dest.write_bytes(b"ancien")
+
+    def interrupted_copy(src_path, dst_path):
+        with open(dst_path, "wb") as f:
+            f.write(b"nouv")  # copie interrompue à mi-chemin
+        raise OSError("disque plein")
+
+    monkeypatch.setattr(latex_sandbox.shutil, "copyfile", interrupted_copy)
+    with pytest.raises(OSError):
+        latex_sandbox.publish(str(src), str(dest))
+    assert dest.read_bytes() == b"ancien"
+    assert os.listdir(dest.parent) == ["lettre.pdf"]
+
+
+COMMAND = [sys.executable, "-c", "import resource; print(resource.getrlimit(resource.RLIMIT_AS)[0])"]
+
+
+def test_limited_command_unchanged_without_limit(monkeypatch):
+    monkeypatch.setenv("LETTRE_PDFLATEX_MEMORY_MB", "0")
+    assert latex_sandbox.limited_command(COMMAND) == COMMAND
+
+
+def test_limited_command_unchanged_when_program_is_missing():
+    command = ["programme-introuvable", "lettre.tex"]
+    assert latex_sandbox.limited_command(command) == command
+
+
+@pytest.mark.skipif(os.name != "posix", reason="limite de mémoire POSIX uniquement")
+def test_limited_command_prefers_prlimit(monkeypatch):
+    monkeypatch.setenv("LETTRE_PDFLATEX_MEMORY_MB", "512")
+    which = latex_sandbox.shutil.which
+    monkeypatch.setattr(latex_sandbox.shutil, "which", lambda name: "/usr/bin/prlimit" if name == "prlimit" else which(name))
+    assert latex_sandbox.limited_command(COMMAND) == ["prlimit", f"--as={512 * 1024 * 1024}", "--", *COMMAND]
+
+
+@pytest.mark.skipif(os.name != "posix", reason="limite de mémoire POSIX uniquement")
+def test_limited_command_python_wrapper_applies_limit(monkeypatch):
+    monkeypatch.setenv("LETTRE_PDFLATEX_MEMORY_MB", "512")
+    which = latex_sandbox.shutil.which
+    monkeypatch.setattr(latex_sandbox.shutil, "which", lambda name: None if name == "prlimit" else which(name))
+
+    command = latex_sandbox.limited_command(COMMAND)
+    assert command[:2] == [sys.executable, "-c"]
+    completed = subprocess.run(command, check=True, capture_output=True, text=True)
+    assert int(completed.stdout) == 512 * 1024 * 1024
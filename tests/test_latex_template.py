@@ -0,0 +1,39 @@
+import logging
+
+from latex_template import compile_template, escape_latex
+
+
+def test_escape_latex_escapes_every_special():
+    assert escape_latex("\\ { } & % $ # _ ~ ^") == (
+        r"\textbackslash{} \{ \} \& \% \$ \# \_ \textasciitilde{} \textasciicircum{}"
+    )
+
+
+def test_escape_latex_blocks_command_injection():
+    assert escape_latex(r"\input{/etc/passwd}") == r"\textbackslash{}input\{/etc/passwd\}"
+
+
+def test_escape_latex_converts_non_strings():
+    assert escape_latex(42) == "42"
+
+
+def test_render_fills_and_escapes_placeholders():
+    template = compile_template(r"\textbf{%%NOM%%} -- %%CORPS_LETTRE%%")
+    rendered = template.render({"NOM": "R&D_Lab", "CORPS_LETTRE": "100 % motivé"})
+    assert rendered == r"\textbf{R\&D\_Lab} -- 100 \% motivé"
+
+
+def test_render_keeps_missing_placeholder_visible(caplog):
+    template = compile_template("Bonjour %%NOM%%, %%CORPS_LETTRE%%", name="lettre")
+    with caplog.at_level(logging.WARNING):
+        rendered = template.render({"CORPS_LETTRE": "texte"})
+        template.render({"CORPS_LETTRE": "texte"})
+    assert rendered == r"Bonjour \%\%NOM\%\%, texte"
+    warnings = [record.getMessage() for record in caplog.records if "NOM" in record.getMessage()]
+    # Signalé une seule fois par template
+    assert len(warnings) == 1 and "lettre" in warnings[0]
+
+
+def test_check_reports_unknown_and_missing_placeholders():
+    template = compile_template("%%NOM%% %%INCONNU%%")
+    assert template.check({"NOM", "CORPS_LETTRE"}) == (["INCONNU"], ["CORPS_LETTRE"])
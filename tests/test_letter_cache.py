@@ -0,0 +1,52 @@
+import uuid
+
+import pytest
+
+
+@pytest.fixture
+def letter_inputs():
+    import main
+
+    ad = f"Développeur Python (H/F) chez Acme {uuid.uuid4().hex}."
+    profile = {"nom_complet": "Camille Test", "competences_cles": ["Python"], "resume_personnel": "Ingénieure"}
+    job_info = {"entreprise": "Acme", "poste": "Développeur Python"}
+    return main, profile, ad, job_info
+
+
+def test_letter_body_is_served_from_cache(letter_inputs, llm_calls):
+    main, profile, ad, job_info = letter_inputs
+    first = main.generate_letter_body(profile, ad, job_info)
+    assert main.generate_letter_body(profile, ad, job_info) == first
+    assert len(llm_calls) == 1
+
+
+def test_letter_variants_use_separate_slots(letter_inputs, llm_calls):
+    main, profile, ad, job_info = letter_inputs
+    first = main.generate_letter_body(profile, ad, job_info, variant=0)
+    second = main.generate_letter_body(profile, ad, job_info, variant=1)
+    assert len(llm_calls) == 2
+
+    # Chaque variante reste disponible sans nouvel appel
+    assert main.generate_letter_body(profile, ad, job_info, variant=0) == first
+    assert main.generate_letter_body(profile, ad, job_info, variant=1) == second
+    assert len(llm_calls) == 2
+
+
+def test_letter_cache_key_covers_instructions(letter_inputs, llm_calls):
+    main, profile, ad, job_info = letter_inputs
+    main.generate_letter_body(profile, ad, job_info)
+    main.generate_letter_body(profile, ad, job_info, custom_instructions="Ton plus formel.")
+    assert len(llm_calls) == 2
+
+
+def test_bypassing_letter_cache_replaces_the_slot(letter_inputs, llm_calls, monkeypatch):
+    main, profile, ad, job_info = letter_inputs
+    main.generate_letter_body(profile, ad, job_info)
+
+    class Response:
+        text = "Nouvelle rédaction."
+        candidates = []
+
+    monkeypatch.setattr(main.gemini_client, "generate", lambda *args, **kwargs: Response())
+    assert main.generate_letter_body(profile, ad, job_info, use_cache=False) == "Nouvelle rédaction."
+    assert main.generate_letter_body(profile, ad, job_info) == "Nouvelle rédaction."
@@ -0,0 +1,127 @@
+import re
+import uuid
+
+import pytest
+
+import metrics
+
+
+def test_counter_exposes_escaped_labels():
+    counter = metrics.Counter("test_total", "Compteur de test.", ["nom"])
+    counter.inc(nom='a"b\\c')
+    counter.inc(2, nom='a"b\\c')
+    counter.inc(nom="autre")
+    assert counter.expose() == [
+        'test_total{nom="a\\"b\\\\c"} 3',
+        'test_total{nom="autre"} 1',
+    ]
+
+
+def test_histogram_exposes_cumulative_buckets():
+    histogram = metrics.Histogram("test_seconds", "Histogramme de test.", ["stage"], buckets=(0.1, 1))
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value, stage="x")
+    assert histogram.expose() == [
+        'test_seconds_bucket{stage="x",le="0.1"} 1',
+        'test_seconds_bucket{stage="x",le="1.0"} 2',
+        'test_seconds_bucket{stage="x",le="+Inf"} 3',
+        'test_seconds_sum{stage="x"} 5.55',
+        'test_seconds_count{stage="x"} 3',
+    ]
+
+
+def test_histogram_quantile_is_bucket_upper_bound():
+    histogram = metrics.Histogram("test_quantile_seconds", "Quantiles.", buckets=(0.1, 1, 10))
+    for value in [0.05] * 90 + [2] * 10:
+        histogram.observe(value)
+    (_, series), = histogram.samples()
+    assert histogram.quantile(series, 0.5) == 0.1
+    assert histogram.quantile(series, 0.95) == 2
+
+
+def samples_of(metric):
+    return dict(metric.samples())
+
+
+def test_span_times_stage_and_counts_failures():
+    stage = f"test_{uuid.uuid4().hex[:8]}"
+    with metrics.span(stage):
+        pass
+    with pytest.raises(ValueError):
+        with metrics.span(stage):
+            raise ValueError("échec")
+
+    assert samples_of(metrics.STAGE_DURATION)[(stage,)]["count"] == 2
+    assert samples_of(metrics.FAILURES)[(stage,)] == 1
+
+
+def test_timed_decorator_wraps_function_in_span():
+    stage = f"test_{uuid.uuid4().hex[:8]}"
+
+    @metrics.timed(stage)
+    def double(value):
+        return value * 2
+
+    assert double(21) == 42
+    assert double.__name__ == "double"
+    assert samples_of(metrics.STAGE_DURATION)[(stage,)]["count"] == 1
+
+
+def test_render_prometheus_declares_every_metric():
+    text = metrics.render_prometheus()
+    for name in ("lettre_llm_requests_total", "lettre_cache_requests_total", "lettre_stage_duration_seconds"):
+        assert f"# HELP {name} " in text
+    assert "# TYPE lettre_llm_requests_total counter" in text
+    assert "# TYPE lettre_stage_duration_seconds histogram" in text
+    assert text.endswith("\n")
+
+
+def metric_value(text, name, **labels):
+    """Valeur d'une série de l'exposition Prometheus, ou None si elle est absente."""
+    for line in text.splitlines():
+        match = re.match(rf"{name}\{{(.*)\}} (\S+)$", line)
+        if match and all(f'{key}="{value}"' in match.group(1) for key, value in labels.items()):
+            return float(match.group(2))
+    return None
+
+
+def test_metrics_endpoint_after_fake_generation(web_app):
+    import main
+
+    ad = f"Développeur Python H/F chez Acme {uuid.uuid4().hex}. Missions : API, tests, Docker."
+    before = web_app.app.test_client().get("/metrics").get_data(as_text=True)
+    model = main.EXTRACTION_MODEL
+    ok_before = metric_value(before, "lettre_llm_requests_total", model=model, outcome="ok") or 0
+
+    job_info = main.extract_job_info(ad)
+    assert main.extract_job_info(ad) == job_info
+    assert main.generate_letter_body(web_app.USER_CONFIG, ad, job_info)
+
+    response = web_app.app.test_client().get("/metrics")
+    text = response.get_data(as_text=True)
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain; version=0.0.4")
+    # Extraction puis rédaction : deux appels au modèle, l'extraction répétée vient du cache
+    assert metric_value(text, "lettre_llm_requests_total", model=model, outcome="ok") == ok_before + 2
+    assert metric_value(text, "lettre_cache_requests_total", cache="extraction", result="miss") >= 1
+    assert metric_value(text, "lettre_cache_requests_total", cache="extraction", result="hit") >= 1
+    assert metric_value(text, "lettre_stage_duration_seconds_count", stage="extraction") >= 2
+    assert metric_value(text, "lettre_llm_request_duration_seconds_count", model=model) >= 2
+
+
+def test_stream_records_first_chunk_and_full_duration(monkeypatch):
+    import gemini_client
+
+    monkeypatch.setenv("GEMINI_FAKE_LATENCY", "fixed:0")
+    monkeypatch.setenv("GEMINI_FAKE_CHUNK_DELAY", "20")
+    model = f"modele-{uuid.uuid4().hex[:8]}"
+    prompt = "Rédige la lettre.\n- Entreprise : Acme\n- Poste : Développeur Python\n"
+    chunks = list(gemini_client.stream(prompt, model))
+    assert len(chunks) > 2
+
+    first_chunk = samples_of(metrics.LLM_FIRST_CHUNK)[(model,)]
+    full = samples_of(metrics.LLM_DURATION)[(model,)]
+    assert first_chunk["count"] == full["count"] == 1
+    # Le flux complet attend chaque morceau suivant ; le premier arrive sans délai
+    assert full["sum"] >= 0.02 * (len(chunks) - 1) > first_chunk["sum"]
+    assert samples_of(metrics.LLM_REQUESTS)[(model, "ok")] == 1
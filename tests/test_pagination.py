@@ -0,0 +1,46 @@
+import pytest
+
+
+def newest_first(web_app):
+    return [
+        candidature.id for candidature in web_app.Candidature.query.order_by(
+            web_app.Candidature.date_creation.desc(), web_app.Candidature.id.desc()
+        )
+    ]
+
+
+@pytest.mark.parametrize("limit", [1, 3, 7, 25])
+def test_paginate_candidatures_walks_every_row_once(web_app, add_candidatures, limit):
+    add_candidatures(25)
+    expected = newest_first(web_app)
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = web_app.paginate_candidatures(web_app.Candidature.query, cursor, limit)
+        assert len(page) <= limit
+        seen.extend(candidature.id for candidature in page)
+        if cursor is None:
+            break
+    assert seen == expected
+
+
+def test_paginate_candidatures_last_page_has_no_cursor(web_app, add_candidatures):
+    add_candidatures(4)
+    page, cursor = web_app.paginate_candidatures(web_app.Candidature.query, limit=4)
+    assert len(page) == 4 and cursor is None
+
+
+def test_paginate_candidatures_ignores_invalid_cursor(web_app, add_candidatures):
+    add_candidatures(3)
+    page, _ = web_app.paginate_candidatures(web_app.Candidature.query, "pas-un-curseur", 10)
+    assert len(page) == 3
+
+
+def test_api_candidatures_filters_by_status(web_app, add_candidatures):
+    add_candidatures(3)
+    add_candidatures(2, statut='Envoyée')
+    response = web_app.app.test_client().get("/api/candidatures?statut=Envoyée&limit=1")
+    payload = response.get_json()
+    assert response.status_code == 200
+    assert [item["statut"] for item in payload["items"]] == ['Envoyée']
+    assert payload["next_cursor"]
@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+from cache_utils import FileCache
+
+
+def write(path, content):
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_file_cache_round_trip(tmp_path):
+    cache = FileCache("test", str(tmp_path / "cache"))
+    dest = tmp_path / "copie.pdf"
+    assert not cache.fetch("cle", str(dest))
+
+    cache.store("cle", write(tmp_path / "lettre.pdf", b"%PDF-1.5 lettre"))
+    assert cache.fetch("cle", str(dest))
+    assert dest.read_bytes() == b"%PDF-1.5 lettre"
+    assert {key: cache.stats()[key] for key in ("hits", "misses", "entries")} == {
+        "hits": 1, "misses": 1, "entries": 1,
+    }
+
+
+def test_file_cache_evicts_least_recently_used_beyond_budget(tmp_path):
+    cache = FileCache("test", str(tmp_path / "cache"), max_bytes=250)
+    for key in ("a", "b"):
+        cache.store(key, write(tmp_path / f"{key}.pdf", key.encode() * 100))
+    # « b » est plus ancien en date d'accès que « a », relu après lui
+    os.utime(cache._path("b"), (1, 1))
+    os.utime(cache._path("a"), (2, 2))
+    assert cache.fetch("a", str(tmp_path / "relu.pdf"))
+
+    cache.store("c", write(tmp_path / "c.pdf", b"c" * 100))
+    assert not os.path.exists(cache._path("b"))
+    assert os.path.exists(cache._path("a")) and os.path.exists(cache._path("c"))
+    assert cache.stats()["bytes"] <= 250
+
+
+@pytest.fixture
+def pdf_cache(tmp_path, monkeypatch):
+    """Cache de PDF temporaire et compilation simulée (pas de pdflatex ici)."""
+    import main
+
+    monkeypatch.setattr(main, "PDF_CACHE", FileCache("pdf", str(tmp_path / "pdf_cache")))
+    monkeypatch.setattr(main, "latex_compiler_identity", lambda: "pdfTeX test")
+    compiled = []
+
+    def fake_compile(tex_filepath):
+        compiled.append(tex_filepath)
+        with open(tex_filepath, "rb") as src, open(main.pdf_path_for(tex_filepath), "wb") as f:
+            f.write(b"%PDF compile " + src.read())
+        os.remove(tex_filepath)
+        return True
+
+    monkeypatch.setattr(main, "compile_latex_to_pdf", fake_compile)
+    return compiled
+
+
+def test_build_pdf_reuses_pdf_of_identical_source(tmp_path, pdf_cache):
+    import main
+
+    first = write(tmp_path / "acme.tex", b"\\documentclass{letter} Acme")
+    assert main.build_pdf(first)
+    # Même source TeX sous un autre nom : PDF servi par le cache, sans compilation
+    second = write(tmp_path / "acme_bis.tex", b"\\documentclass{letter} Acme")
+    assert main.build_pdf(second)
+
+    assert pdf_cache == [first]
+    assert (tmp_path / "acme_bis.pdf").read_bytes() == (tmp_path / "acme.pdf").read_bytes()
+    assert not os.path.exists(second)
+
+
+def test_build_pdf_compiles_modified_source(tmp_path, pdf_cache):
+    import main
+
+    first = write(tmp_path / "acme.tex", b"\\documentclass{letter} Acme")
+    second = write(tmp_path / "globex.tex", b"\\documentclass{letter} Globex")
+    assert main.build_pdf(first) and main.build_pdf(second)
+    assert pdf_cache == [first, second]
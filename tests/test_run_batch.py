@@ -0,0 +1,61 @@
+import os
+import threading
+
+import pytest
+
+import ad_manifest
+import duplicate_index
+from cache_utils import FileCache
+
+
+@pytest.fixture
+def batch(tmp_path, monkeypatch):
+    """Lot de trois annonces : génération et compilation simulées, caches et index temporaires."""
+    import main
+
+    monkeypatch.setattr(main, "PDF_CACHE", FileCache("pdf", str(tmp_path / "pdf_cache")))
+    monkeypatch.setattr(main, "MANIFEST", ad_manifest.AdManifest(str(tmp_path / "cache.db")))
+    monkeypatch.setattr(main, "DUPLICATE_INDEX", duplicate_index.DuplicateIndex(str(tmp_path / "cache.db")))
+    monkeypatch.setattr(main, "latex_compiler_identity", lambda: "pdfTeX test")
+
+    def fake_prepare(user_config, job_ad_path, templates_dict, **options):
+        tex_path = os.path.splitext(job_ad_path)[0] + ".tex"
+        with open(tex_path, "w", encoding="utf-8") as f:
+            f.write(f"\\documentclass{{letter}} {os.path.basename(job_ad_path)}")
+        job_info = {"entreprise": "Acme", "competences_requises": ["Python"], "outils_technologies": []}
+        return {
+            "success": False, "job_ad_path": job_ad_path, "pdf_path": None, "tex_path": tex_path,
+            "job_info": job_info, "match_info": None, "letter_body": "Corps", "template_name": "lettre_template.tex",
+        }
+
+    compiles = []
+
+    def fake_compile(tex_filepath):
+        compiles.append((os.getpid(), threading.current_thread() is threading.main_thread()))
+        with open(main.pdf_path_for(tex_filepath), "wb") as f:
+            f.write(b"%PDF")
+        os.remove(tex_filepath)
+        return True, 0.01
+
+    monkeypatch.setattr(main, "prepare_cover_letter", fake_prepare)
+    monkeypatch.setattr(main, "timed_compile", fake_compile)
+
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"annonce_{i}.txt"
+        path.write_text(f"Annonce {i}", encoding="utf-8")
+        paths.append(str(path))
+    return paths, compiles
+
+
+def test_run_batch_compiles_in_worker_threads_of_the_same_process(batch):
+    import main
+
+    paths, compiles = batch
+    results = main.run_batch({"competences_cles": ["Python"]}, paths, {}, compile_workers=2, check_duplicates=False)
+
+    assert all(results[path]["success"] for path in paths)
+    assert [results[path]["pdf_path"] for path in paths] == [os.path.splitext(path)[0] + ".pdf" for path in paths]
+    assert results[paths[0]]["match_info"]["matching_skills"] == ["python"]
+    # Pas de fork : les compilations tournent dans des threads du processus courant
+    assert compiles == [(os.getpid(), False)] * 3
@@ -0,0 +1,63 @@
+import pytest
+
+import skill_matching
+
+
+@pytest.mark.parametrize("label, expected", [
+    ("Développement Logiciel", "developpement logiciel"),
+    ("Python 3", "python"),
+    ("SolidWorks 2022", "solidworks"),
+    ("CATIA V5", "catia"),
+    ("ISO 9001", "iso 9001"),
+    ("C++", "c++"),
+])
+def test_normalize_skill(label, expected):
+    assert skill_matching.normalize_skill(label) == expected
+
+
+def matched(skills, terms, synonyms=None):
+    """Termes de l'annonce reconnus parmi les compétences `skills` du profil."""
+    hits = skill_matching.SkillIndex(skills, synonyms).match_terms(terms).any(axis=1)
+    return [term for term, hit in zip(terms, hits) if hit]
+
+
+def test_accents_case_and_versions_are_ignored():
+    assert matched(["Conception assistée par ordinateur", "Python"], ["CONCEPTION ASSISTEE PAR ORDINATEUR", "python 3.11"]) == [
+        "CONCEPTION ASSISTEE PAR ORDINATEUR", "python 3.11",
+    ]
+
+
+def test_small_typos_match():
+    assert matched(["SolidWorks", "Gestion de projet"], ["solidwork", "gestion de projets"]) == ["solidwork", "gestion de projets"]
+
+
+def test_synonyms_match_including_profile_ones():
+    assert matched(["CAO", "Machine learning"], ["computer aided design", "apprentissage automatique"]) == [
+        "computer aided design", "apprentissage automatique",
+    ]
+    assert matched(["Usinage"], ["machining"], synonyms={"usinage": ["machining"]}) == ["machining"]
+
+
+def test_distinct_standards_do_not_match():
+    assert matched(["ISO 9001"], ["ISO 14001", "ISO 9001:2015"]) == ["ISO 9001:2015"]
+
+
+def test_short_skill_is_not_found_inside_longer_terms():
+    assert matched(["R"], ["R&D", "recherche", "R"]) == ["R"]
+    # Une compétence plus longue est reconnue dans un terme qui la contient
+    assert matched(["Python"], ["python scripting"]) == ["python scripting"]
+
+
+def test_score_job_infos_scores_each_ad_of_the_batch():
+    profile = {"competences_cles": ["Python", "SQL", "Docker"]}
+    job_infos = [
+        {"competences_requises": ["Python", "sql"], "outils_technologies": ["Docker"]},
+        None,
+        {"competences_requises": ["Comptabilité"], "outils_technologies": []},
+    ]
+    full, absent, unrelated = skill_matching.score_job_infos(profile, job_infos)
+
+    assert absent is None
+    assert (full["matching_skills"], full["matching_tools"], full["missing_skills"]) == (["python", "sql"], ["docker"], [])
+    assert full["score"] == 2 * skill_matching.SKILL_POINTS + skill_matching.TOOL_POINTS + skill_matching.FULL_COVERAGE_BONUS
+    assert (unrelated["score"], unrelated["missing_skills"]) == (0, ["comptabilité"])
@@ -0,0 +1,119 @@
+import functools
+import threading
+import time
+from types import SimpleNamespace
+
+import ad_manifest
+import watch_folder
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+def test_folder_watcher_debounces_a_file_being_written(tmp_path):
+    ready = []
+    watcher = watch_folder.FolderWatcher(str(tmp_path), ready.append, debounce=0.3, poll_interval=0.05)
+    watcher.start()
+    try:
+        path = tmp_path / "annonce.txt"
+        with open(path, "w", encoding="utf-8") as f:
+            for chunk in ("Développeur ", "Python ", "chez Acme"):
+                f.write(chunk)
+                f.flush()
+                watcher.touch(str(path))  # un événement par écriture, comme inotify
+                time.sleep(0.1)
+        assert ready == []  # encore en cours d'écriture
+
+        assert wait_until(lambda: ready)
+        time.sleep(0.3)
+    finally:
+        watcher.stop()
+    assert ready == [str(path)]
+
+
+def test_folder_watcher_ignores_hidden_and_other_files(tmp_path):
+    ready = []
+    (tmp_path / ".brouillon.txt").write_text("caché", encoding="utf-8")
+    (tmp_path / "notes.md").write_text("autre format", encoding="utf-8")
+    (tmp_path / "annonce.txt").write_text("Développeur Python", encoding="utf-8")
+    watcher = watch_folder.FolderWatcher(str(tmp_path), ready.append, debounce=0.05, poll_interval=0.05)
+    watcher.start()
+    try:
+        assert wait_until(lambda: ready)
+        time.sleep(0.2)
+    finally:
+        watcher.stop()
+    assert ready == [str(tmp_path / "annonce.txt")]
+
+
+def run_watch_in_thread(monkeypatch, target, *args):
+    """Lance `target` (qui appelle watch_folder.watch) dans un thread ; retourne (thread, événement d'arrêt)."""
+    stop = threading.Event()
+    monkeypatch.setattr(watch_folder, "watch", functools.partial(watch_folder.watch, stop=stop))
+    thread = threading.Thread(target=target, args=args, daemon=True)
+    thread.start()
+    return thread, stop
+
+
+def test_watch_input_skips_ads_already_in_manifest(tmp_path, monkeypatch):
+    import main
+
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    done, new = input_dir / "deja_traitee.txt", input_dir / "nouvelle.txt"
+    done.write_text("Annonce déjà traitée", encoding="utf-8")
+    new.write_text("Nouvelle annonce", encoding="utf-8")
+    pdf = tmp_path / "deja_traitee.pdf"
+    pdf.write_bytes(b"%PDF")
+    manifest = ad_manifest.AdManifest(str(tmp_path / "manifest.db"))
+    manifest.record(str(done), {"success": True, "pdf_path": str(pdf)})
+    monkeypatch.setattr(main, "MANIFEST", manifest)
+
+    processed = []
+    monkeypatch.setattr(main, "process_ad", lambda config, path, templates, **options: processed.append(path))
+    args = SimpleNamespace(
+        only=None, no_dedup=False, variant=0, no_letter_cache=False, single_pass=False,
+        llm_concurrency=1, queue_size=10, debounce=0.05,
+    )
+
+    thread, stop = run_watch_in_thread(monkeypatch, main.watch_input, {}, str(input_dir), {}, args)
+    try:
+        assert wait_until(lambda: processed)
+        time.sleep(0.3)
+    finally:
+        stop.set()
+        thread.join(10)
+    assert processed == [str(new)]
+
+
+def test_watch_stops_with_a_full_queue(tmp_path, monkeypatch):
+    for i in range(4):
+        (tmp_path / f"annonce_{i}.txt").write_text(f"Annonce {i}", encoding="utf-8")
+    started = threading.Event()
+    processed = []
+
+    def process(path):
+        processed.append(path)
+        started.set()
+        time.sleep(0.5)
+
+    stop = threading.Event()
+    thread = threading.Thread(
+        target=watch_folder.watch,
+        args=(str(tmp_path), process),
+        kwargs={"workers": 1, "queue_size": 1, "debounce": 0.05, "stop": stop},
+        daemon=True,
+    )
+    thread.start()
+    assert started.wait(5)
+    stop.set()
+    thread.join(10)
+
+    # Arrêt malgré la file pleine et la détection bloquée ; les annonces en attente
+    # ne sont pas traitées (elles seront reprises au prochain lancement)
+    assert not thread.is_alive()
+    assert len(processed) == 1
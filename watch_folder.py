@@ -0,0 +1,236 @@
+import os
+import time
+import queue
+import logging
+import threading
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # dépendance optionnelle : sans elle, le dossier est scruté périodiquement
+    FileSystemEventHandler = object
+    Observer = None
+
+# Surveillance d'un dossier d'annonces (mode --watch de main.py).
+#
+# Les nouveaux fichiers sont détectés par inotify via watchdog s'il est installé,
+# sinon par un parcours périodique du dossier. Un fichier n'est transmis qu'une
+# fois sa taille et sa date de modification stables pendant `debounce` secondes
+# (fichier encore en cours d'écriture ou de copie). Les fichiers prêts passent
+# par une file bornée vers un petit pool de workers ; quand la file est pleine,
+# la détection attend au lieu d'accumuler du travail en mémoire.
+
+DEBOUNCE_SECONDS = 2.0
+POLL_INTERVAL = 1.0
+QUEUE_SIZE = 100
+
+
+class _EventHandler(FileSystemEventHandler):
+    """Transmet au watcher les fichiers créés, modifiés ou renommés."""
+
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.watcher.touch(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.watcher.touch(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.watcher.touch(event.dest_path)
+
+
+class FolderWatcher:
+    """
+    Détecte les fichiers `suffix` prêts dans `directory` et appelle `on_ready(path)`
+    pour chacun (depuis le thread du watcher). Si `on_ready` retourne False, le
+    fichier est redemandé plus tard.
+    """
+
+    def __init__(self, directory, on_ready, suffix=".txt", debounce=DEBOUNCE_SECONDS, poll_interval=POLL_INTERVAL):
+        self.directory = directory
+        self.on_ready = on_ready
+        self.suffix = suffix
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self._pending = {}
+        self._snapshot = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._observer = None
+        self._thread = None
+
+    def _signature(self, path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def touch(self, path):
+        """Signale un fichier nouveau ou modifié ; il sera transmis une fois stable."""
+        if not path.endswith(self.suffix) or os.path.basename(path).startswith("."):
+            return
+        with self._lock:
+            self._pending[path] = (self._signature(path), time.monotonic())
+
+    def _scan(self):
+        """Parcours du dossier (mode sans inotify) : repère les fichiers nouveaux ou modifiés."""
+        try:
+            names = [name for name in os.listdir(self.directory) if name.endswith(self.suffix)]
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            signature = self._signature(path)
+            if signature is not None and self._snapshot.get(path) != signature:
+                self._snapshot[path] = signature
+                self.touch(path)
+
+    def _ready_files(self):
+        """Fichiers dont la taille et la date n'ont pas bougé depuis `debounce` secondes."""
+        now = time.monotonic()
+        ready = []
+        with self._lock:
+            for path, (signature, since) in list(self._pending.items()):
+                current = self._signature(path)
+                if current is None:
+                    del self._pending[path]
+                elif current != signature:
+                    self._pending[path] = (current, now)
+                elif now - since >= self.debounce and current[0] > 0:
+                    del self._pending[path]
+                    ready.append(path)
+        return ready
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self._observer is None:
+                self._scan()
+            for path in self._ready_files():
+                if self._stop.is_set():
+                    break
+                if self.on_ready(path) is False:
+                    self.touch(path)
+            # Avec inotify, seule la stabilité des fichiers signalés est à vérifier
+            interval = self.poll_interval if self._observer is None else min(self.poll_interval, self.debounce / 4)
+            self._stop.wait(interval)
+
+    def start(self):
+        """Démarre la surveillance ; les fichiers déjà présents sont signalés une fois."""
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            self._snapshot[path] = self._signature(path)
+            self.touch(path)
+
+        if Observer is not None:
+            try:
+                self._observer = Observer()
+                self._observer.schedule(_EventHandler(self), self.directory, recursive=False)
+                self._observer.start()
+                logging.info(f"Surveillance de '{self.directory}' (inotify).")
+            except OSError as e:
+                logging.warning(f"inotify indisponible ({e}), surveillance par scrutation.")
+                self._observer = None
+        if self._observer is None:
+            logging.info(f"Surveillance de '{self.directory}' (scrutation toutes les {self.poll_interval:g} s).")
+
+        self._thread = threading.Thread(target=self._run, name="watch-folder", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Arrête la surveillance."""
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def watch(
+    directory, process, workers=2, queue_size=QUEUE_SIZE, debounce=DEBOUNCE_SECONDS, should_process=None, stop=None
+):
+    """
+    Surveille `directory` jusqu'à Ctrl+C (ou jusqu'à ce que l'événement `stop`
+    soit positionné) et appelle `process(path)` pour chaque fichier prêt, sur
+    `workers` threads alimentés par une file de `queue_size` places.
+    `should_process(path)` permet d'écarter un fichier (déjà traité...).
+    """
+    jobs = queue.Queue(maxsize=queue_size)
+    in_flight = set()
+    in_flight_lock = threading.Lock()
+    stopping = threading.Event()
+
+    def enqueue(path):
+        with in_flight_lock:
+            if path in in_flight:
+                # Modifié pendant son traitement : redemandé une fois le traitement fini
+                return False
+        if should_process is not None and not should_process(path):
+            return
+        with in_flight_lock:
+            in_flight.add(path)
+        if jobs.full():
+            logging.info(f"File de traitement pleine ({queue_size}), en attente d'une place...")
+        while True:
+            if stopping.is_set():
+                with in_flight_lock:
+                    in_flight.discard(path)
+                return
+            try:
+                jobs.put(path, timeout=0.2)
+                break
+            except queue.Full:
+                continue
+        logging.info(f"[{os.path.basename(path)}] En file d'attente ({jobs.qsize()}/{queue_size}).")
+
+    def worker():
+        while True:
+            path = jobs.get()
+            if path is None:
+                return
+            try:
+                # Arrêt demandé : seules les annonces déjà commencées vont au bout
+                if not stopping.is_set():
+                    process(path)
+            except Exception as e:
+                logging.error(f"[{os.path.basename(path)}] Erreur pendant le traitement : {e}")
+            finally:
+                with in_flight_lock:
+                    in_flight.discard(path)
+                jobs.task_done()
+
+    threads = [threading.Thread(target=worker, name=f"watch-worker-{i}", daemon=True) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    watcher = FolderWatcher(directory, enqueue, debounce=debounce)
+    watcher.start()
+    logging.info("En attente de nouvelles annonces (Ctrl+C pour arrêter).")
+    stop = stop or threading.Event()
+    try:
+        while not stop.wait(1):
+            pass
+    except KeyboardInterrupt:
+        logging.info("Arrêt demandé : fin des traitements en cours...")
+    finally:
+        stopping.set()
+        watcher.stop()
+        # Les annonces encore en file seront reprises au prochain lancement
+        while True:
+            try:
+                path = jobs.get_nowait()
+            except queue.Empty:
+                break
+            with in_flight_lock:
+                in_flight.discard(path)
+            jobs.task_done()
+        for _ in threads:
+            jobs.put(None)
+        for thread in threads:
+            thread.join()
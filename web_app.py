@@ -1,20 +1,38 @@
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 
 import google.generativeai as genai
-from flask import Flask, render_template, request, send_from_directory, redirect, url_for
+from flask import Flask, render_template, request, send_from_directory, redirect, url_for, stream_with_context, jsonify
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import inspect, text
+from sqlalchemy import event, func, insert, inspect, text, tuple_, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from werkzeug.utils import secure_filename
 
-from main import load_config, create_cover_letter, generate_pdf_from_content
+from main import (
+    DUPLICATE_INDEX,
+    load_config,
+    find_duplicate_ad,
+    generate_pdf_from_content,
+    iter_cover_letter_events,
+    load_letter_template,
+)
+import gemini_client
 import gmail_utils
+import job_queue
+import latex_formats
+import latex_sandbox
+import metrics
 import json
 import plotly
 import plotly.graph_objs as go
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
+import codecs
 import csv
 import io
+import logging
+import threading
+import zipfile
+import zlib
 from flask import Response, flash
 
 
@@ -25,6 +43,19 @@ os.chdir(BASE_DIR)
 INPUT_DIR = os.path.join(BASE_DIR, "input")
 OUTPUT_DIR = os.path.join(BASE_DIR, "output")
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
+# Import en lot : nombre d'annonces par envoi et taille maximale d'une annonce
+MAX_BULK_ADS = 100
+# File de tâches pleine : message et délai conseillé avant un nouvel essai (en-tête Retry-After)
+QUEUE_FULL_MESSAGE = "Trop de générations en attente, réessayez dans quelques instants."
+QUEUE_FULL_RETRY_AFTER = 30
+MAX_AD_BYTES = 1024 * 1024
+# Pagination des listes de candidatures (tableau de bord, messages, API)
+DASHBOARD_PAGE_SIZE = 100
+MESSAGES_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# Nombre de candidatures récentes dont les postes alimentent le nuage de mots
+WORDCLOUD_MAX_CANDIDATURES = 500
+STATUSES = ['En préparation', 'Envoyée', 'Entretien', 'Offre', 'Refus']
 TEMPLATE_FILES = [
     "lettre_template.tex",
     "lettre_template_elegant.tex",
@@ -40,13 +71,15 @@ def ensure_directories():
 
 
 def load_templates():
-    """Charge tous les templates LaTeX disponibles en mémoire."""
+    """Charge et précompile tous les templates LaTeX disponibles."""
     templates_dict = {}
     for template_file in TEMPLATE_FILES:
         template_path = os.path.join(TEMPLATES_DIR, template_file)
         if os.path.exists(template_path):
             with open(template_path, "r", encoding="utf-8") as f:
-                templates_dict[template_file] = f.read()
+                templates_dict[template_file] = load_letter_template(
+                    f.read(), template_file, USER_CONFIG
+                )
         else:
             # On ne log pas ici pour éviter la verbosité au démarrage, la CLI le fera déjà
             continue
@@ -56,6 +89,9 @@ def load_templates():
     if "lettre_template.tex" not in templates_dict:
         raise RuntimeError("Le template par défaut 'lettre_template.tex' est requis.")
 
+    latex_formats.ensure_formats(
+        {name: template.source for name, template in templates_dict.items()}
+    )
     return templates_dict
 
 
@@ -67,10 +103,13 @@ genai.configure(api_key=API_KEY)
 
 ensure_directories()
 TEMPLATES_DICT = load_templates()
+latex_sandbox.purge_stale()
+JOB_QUEUE = job_queue.JobQueue()
 
 app = Flask(__name__, template_folder="web_templates", static_folder="web_static")
 app.config["SECRET_KEY"] = os.getenv("FLASK_SECRET_KEY", "dev-secret")
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///candidatures.db'
+# Base SQLite (instance/candidatures.db par défaut, LETTRE_DATABASE_URL pour une autre base, ex. tests)
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv("LETTRE_DATABASE_URL", 'sqlite:///candidatures.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db = SQLAlchemy(app)
 
@@ -86,6 +125,180 @@ class Candidature(db.Model):
     url_offer = db.Column(db.String(500), nullable=True) # Lien de l'offre
     notes = db.Column(db.Text, nullable=True) # Pour tes remarques perso
 
+    __table_args__ = (
+        # Pagination par curseur (date, id), avec ou sans filtre de statut
+        db.Index("ix_candidature_date_id", "date_creation", "id"),
+        db.Index("ix_candidature_statut_date_id", "statut", "date_creation", "id"),
+        # Recherche d'entreprise par préfixe, insensible à la casse
+        db.Index("ix_candidature_entreprise_lower", func.lower(entreprise)),
+    )
+
+
+class CandidatureDaily(db.Model):
+    """Nombre de candidatures par jour de création et statut (agrégat tenu à jour à chaque flush)."""
+
+    __tablename__ = "candidature_daily"
+    jour = db.Column(db.Date, primary_key=True)
+    statut = db.Column(db.String(50), primary_key=True)
+    nombre = db.Column(db.Integer, nullable=False, default=0)
+
+
+class DataVersion(db.Model):
+    """Jeton changé à chaque écriture sur une table (clé des caches de la page Analytics)."""
+
+    __tablename__ = "data_version"
+    nom = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.String(32), nullable=False)
+
+
+def candidatures_version():
+    """Version actuelle des candidatures (changée à chaque ajout, modification ou suppression)."""
+    version = db.session.execute(
+        db.select(DataVersion.version).where(DataVersion.nom == Candidature.__tablename__)
+    ).scalar()
+    return version or "initiale"
+
+
+def bump_data_version(connection, table_name):
+    """Remplace la version de `table_name` par un jeton aléatoire (dans la transaction en cours)."""
+    table = DataVersion.__table__
+    token = func.lower(func.hex(func.randomblob(16)))
+    statement = sqlite_insert(table).values(nom=table_name, version=token)
+    connection.execute(statement.on_conflict_do_update(index_elements=[table.c.nom], set_={"version": token}))
+
+
+def rollup_key(date_creation, statut):
+    """Clé de l'agrégat journalier d'une candidature."""
+    return date_creation.date(), statut or 'En préparation'
+
+
+def committed_rollup_key(candidature):
+    """Clé de l'agrégat d'après les valeurs en base (avant les modifications en cours)."""
+    state = inspect(candidature)
+    date_history, statut_history = state.attrs.date_creation.history, state.attrs.statut.history
+    date_creation = (date_history.deleted or date_history.unchanged or [candidature.date_creation])[0]
+    statut = (statut_history.deleted or statut_history.unchanged or [candidature.statut])[0]
+    return rollup_key(date_creation, statut)
+
+
+@event.listens_for(db.session, "before_flush")
+def update_daily_rollup(session, flush_context, instances):
+    """
+    Répercute dans candidature_daily les candidatures ajoutées, supprimées ou
+    dont la date ou le statut change, et change la version des candidatures,
+    dans la même transaction.
+    """
+    deltas = {}
+    changed = False
+
+    def add(key, delta):
+        deltas[key] = deltas.get(key, 0) + delta
+
+    for obj in session.new:
+        if isinstance(obj, Candidature):
+            # Valeurs par défaut fixées ici : elles ne seraient appliquées qu'à l'INSERT
+            if obj.date_creation is None:
+                obj.date_creation = datetime.now()
+            if obj.statut is None:
+                obj.statut = 'En préparation'
+            add(rollup_key(obj.date_creation, obj.statut), 1)
+            changed = True
+
+    for obj in session.deleted:
+        if isinstance(obj, Candidature):
+            add(committed_rollup_key(obj), -1)
+            changed = True
+
+    for obj in session.dirty:
+        if not isinstance(obj, Candidature) or not session.is_modified(obj):
+            continue
+        changed = True
+        old_key, new_key = committed_rollup_key(obj), rollup_key(obj.date_creation, obj.statut)
+        if old_key != new_key:
+            add(old_key, -1)
+            add(new_key, 1)
+
+    if changed:
+        connection = session.connection()
+        apply_rollup_deltas(connection, deltas)
+        bump_data_version(connection, Candidature.__tablename__)
+
+
+def apply_rollup_deltas(connection, deltas):
+    """Ajoute les écarts {(jour, statut): delta} à candidature_daily."""
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    table = CandidatureDaily.__table__
+    statement = sqlite_insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.jour, table.c.statut],
+        set_={"nombre": table.c.nombre + statement.excluded.nombre},
+    )
+    connection.execute(
+        statement,
+        [{"jour": jour, "statut": statut, "nombre": delta} for (jour, statut), delta in deltas.items()],
+    )
+    connection.execute(table.delete().where(table.c.nombre <= 0))
+
+
+def rebuild_daily_rollup():
+    """Recalcule entièrement candidature_daily depuis la table candidature."""
+    table = CandidatureDaily.__table__
+    db.session.execute(table.delete())
+    db.session.execute(
+        table.insert().from_select(
+            ["jour", "statut", "nombre"],
+            db.select(
+                func.date(Candidature.date_creation),
+                func.coalesce(Candidature.statut, 'En préparation'),
+                func.count(Candidature.id),
+            ).group_by(func.date(Candidature.date_creation), func.coalesce(Candidature.statut, 'En préparation')),
+        )
+    )
+    db.session.commit()
+
+
+def init_database():
+    """
+    Crée les tables et index manquants et migre une base existante (colonne
+    url_offer, agrégat journalier). Appelée au chargement du module, pour que
+    le serveur de développement comme un serveur WSGI (gunicorn) démarrent
+    sur un schéma à jour.
+    """
+    # Migration simple : vérifie si la colonne url_offer existe
+    inspector = inspect(db.engine)
+    if inspector.has_table('candidature'):
+        columns = [col['name'] for col in inspector.get_columns('candidature')]
+        if 'url_offer' not in columns:
+            print("Migration : Ajout de la colonne url_offer...")
+            with db.engine.connect() as conn:
+                conn.execute(text("ALTER TABLE candidature ADD COLUMN url_offer VARCHAR(500)"))
+                conn.commit()
+
+    db.create_all()
+    # create_all ne crée pas les index d'une table existante (l'inspecteur ignore
+    # les index sur expression : on lit directement sqlite_master)
+    with db.engine.connect() as conn:
+        existing = {
+            row[0] for row in conn.execute(
+                text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'candidature'")
+            )
+        }
+    for table_index in Candidature.__table__.indexes:
+        if table_index.name not in existing:
+            print(f"Migration : création de l'index {table_index.name}...")
+            table_index.create(db.engine)
+    # Agrégat journalier : (re)construit s'il ne correspond plus à la table
+    rollup_total = db.session.query(func.coalesce(func.sum(CandidatureDaily.nombre), 0)).scalar()
+    if rollup_total != Candidature.query.count():
+        print("Migration : reconstruction de l'agrégat candidature_daily...")
+        rebuild_daily_rollup()
+
+
+with app.app_context():
+    init_database()
+
 
 def render_home(
     status=None,
@@ -119,103 +332,445 @@ def index():
     return render_home()
 
 
-@app.route("/generate", methods=["POST"])
-def generate():
-    """Traite le formulaire, lance la génération et renvoie le résultat."""
+def read_generation_form():
+    """
+    Lit le formulaire de génération.
+
+    Retourne (contenu de l'annonce, valeurs du formulaire, message d'erreur) ;
+    le contenu vaut None si le formulaire est invalide.
+    """
     job_file = request.files.get("job_file")
     job_text = request.form.get("job_text", "").strip()
     custom_prompt = request.form.get("custom_prompt", "").strip()
+    bypass_cache = request.form.get("bypass_cache") == "on"
+    force_generation = request.form.get("force_generation") == "on"
+    try:
+        variant = max(int(request.form.get("variant") or 0), 0)
+    except ValueError:
+        variant = 0
 
     form_defaults = {
         "job_text": job_text,
         "custom_prompt": custom_prompt,
+        "variant": variant,
+        "bypass_cache": bypass_cache,
+        "force_generation": force_generation,
+        "job_filename": job_file.filename if job_file and job_file.filename else None,
     }
 
-    announcement_content = None
-
     if job_file and job_file.filename:
         raw_bytes = job_file.read()
         if not raw_bytes:
-            return render_home(
-                status="error",
-                message="Le fichier fourni est vide.",
-                form_data=form_defaults,
-            )
+            return None, form_defaults, "Le fichier fourni est vide."
         try:
-            announcement_content = raw_bytes.decode("utf-8")
+            return raw_bytes.decode("utf-8"), form_defaults, None
         except UnicodeDecodeError:
-            return render_home(
-                status="error",
-                message="Impossible de lire le fichier en UTF-8. Merci de fournir un fichier texte.",
-                form_data=form_defaults,
-            )
-    elif job_text:
-        announcement_content = job_text
-    else:
-        return render_home(
-            status="error",
-            message="Veuillez fournir un fichier .txt ou coller le texte de l'annonce.",
-            form_data=form_defaults,
-        )
+            return None, form_defaults, "Impossible de lire le fichier en UTF-8. Merci de fournir un fichier texte."
+    if job_text:
+        return job_text, form_defaults, None
+    return None, form_defaults, "Veuillez fournir un fichier .txt ou coller le texte de l'annonce."
+
 
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    original_name = secure_filename(job_file.filename) if job_file and job_file.filename else "texte"
+def save_announcement(announcement_content, job_filename=None):
+    """Enregistre l'annonce soumise dans input/ et retourne son chemin."""
+    # Microsecondes : des soumissions simultanées ne doivent pas s'écraser
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    original_name = secure_filename(job_filename) if job_filename else "texte"
     input_filename = f"web_annonce_{timestamp}_{original_name or 'annonce'}.txt"
     input_path = os.path.join(INPUT_DIR, input_filename)
 
     with open(input_path, "w", encoding="utf-8") as f:
         f.write(announcement_content)
+    return input_path
 
-    custom_prompt_value = custom_prompt if custom_prompt else None
 
-    try:
-        result = create_cover_letter(
-            USER_CONFIG,
-            input_path,
-            TEMPLATES_DICT,
-            custom_instructions=custom_prompt_value,
-        )
-    except Exception as exc:
-        return render_home(
-            status="error",
-            message=f"Erreur lors de la génération : {exc}",
-            form_data=form_defaults,
-        )
+def save_generated_candidature(result):
+    """Crée la candidature correspondant à une lettre générée avec succès."""
+    job_info = result.get("job_info") or {}
+    nouvelle_candidature = Candidature(
+        entreprise=job_info.get('entreprise', 'Inconnue'),
+        poste=job_info.get('poste', 'Stage'),
+        fichier_pdf=os.path.basename(result["pdf_path"]),
+        statut="En préparation"
+    )
+    db.session.add(nouvelle_candidature)
+    db.session.commit()
+    if result.get("ad_id"):
+        DUPLICATE_INDEX.link_candidature(result["ad_id"], nouvelle_candidature.id)
+    return nouvelle_candidature
 
-    if result and result.get("success") and result.get("pdf_path"):
-        pdf_filename = os.path.basename(result["pdf_path"])
 
-        # Sauvegarde en base de données
-        nouvelle_candidature = Candidature(
-            entreprise=result['job_info'].get('entreprise', 'Inconnue'),
-            poste=result['job_info'].get('poste', 'Stage'),
-            fichier_pdf=pdf_filename,
-            statut="En préparation"
+def find_linked_duplicate(announcement_content, form_defaults):
+    """
+    Si l'annonce est un quasi-doublon d'une annonce déjà traitée (et que la
+    génération n'est pas forcée), retourne (entrée de l'index, candidature liée).
+    La candidature est créée à partir de la lettre existante si besoin (annonce
+    traitée par la CLI, candidature supprimée).
+    """
+    if form_defaults["force_generation"]:
+        return None, None
+    duplicate = find_duplicate_ad(announcement_content)
+    if not duplicate:
+        return None, None
+
+    candidature = None
+    if duplicate.get("candidature_id"):
+        candidature = db.session.get(Candidature, duplicate["candidature_id"])
+    if candidature is None:
+        candidature = save_generated_candidature(
+            {"job_info": duplicate.get("job_info"), "pdf_path": duplicate["pdf_path"], "ad_id": duplicate["id"]}
         )
-        db.session.add(nouvelle_candidature)
-        db.session.commit()
+    return duplicate, candidature
 
-        return render_home(
-            status="success",
-            message="Lettre générée avec succès.",
-            pdf_filename=pdf_filename,
-            match_info=result.get("match_info"),
-            job_info=result.get("job_info"),
-            form_data={"job_text": "", "custom_prompt": custom_prompt},
-            letter_body=result.get("letter_body"),
-            template_name=result.get("template_name"),
-            candidature_id=nouvelle_candidature.id
-        )
 
+def duplicate_message(duplicate, candidature):
+    """Message affiché quand une annonce est reliée à une candidature existante."""
+    return (
+        f"Annonce déjà traitée (similarité {duplicate['similarity']:.0%}) : la candidature "
+        f"« {candidature.entreprise} – {candidature.poste} » et sa lettre sont réutilisées. "
+        "Cochez « Générer même si l'annonce a déjà été traitée » pour une nouvelle lettre."
+    )
+
+
+def result_payload(candidature, result, message, duplicate=False):
+    """Résultat d'une génération (ou d'un doublon relié), tel que renvoyé au navigateur."""
+    return {
+        "duplicate": duplicate,
+        "message": message,
+        "pdf_filename": candidature.fichier_pdf,
+        "candidature_id": candidature.id,
+        "template_name": result.get("template_name"),
+        "letter_body": result.get("letter_body"),
+        "job_info": result.get("job_info") or {},
+        "match_info": result.get("match_info"),
+    }
+
+
+def run_generation_job(job, announcement_content, form_defaults):
+    """
+    Tâche de fond de /generate : relie un doublon ou génère la lettre, en
+    publiant les étapes du pipeline comme événements de la tâche.
+    """
+    with app.app_context():
+        duplicate, candidature = find_linked_duplicate(announcement_content, form_defaults)
+        if duplicate:
+            job.emit("duplicate", {"message": duplicate_message(duplicate, candidature)})
+            job.emit("extracted", duplicate.get("job_info"))
+            job.emit("scored", duplicate.get("match_info"))
+            payload = result_payload(
+                candidature, duplicate, duplicate_message(duplicate, candidature), duplicate=True
+            )
+            job.emit("done", payload)
+            return payload
+
+        input_path = save_announcement(announcement_content, form_defaults["job_filename"])
+        result = None
+        try:
+            for event_name, data in iter_cover_letter_events(
+                USER_CONFIG,
+                input_path,
+                TEMPLATES_DICT,
+                custom_instructions=form_defaults["custom_prompt"] or None,
+                variant=form_defaults["variant"],
+                use_letter_cache=not form_defaults["bypass_cache"],
+            ):
+                if event_name == "result":
+                    result = data
+                else:
+                    job.emit(event_name, data)
+        except Exception as exc:
+            raise RuntimeError(f"Erreur lors de la génération : {exc}") from exc
+
+        if not (result and result.get("success") and result.get("pdf_path")):
+            raise RuntimeError("La génération a échoué. Consultez les logs pour plus de détails.")
+
+        candidature = save_generated_candidature(result)
+        payload = result_payload(candidature, result, "Lettre générée avec succès.")
+        job.emit("done", payload)
+        return payload
+
+
+def wants_json():
+    """Vrai si le client (script de la page) attend du JSON plutôt qu'une page HTML."""
+    return request.accept_mimetypes.best_match(["application/json", "text/html"]) == "application/json"
+
+
+def with_download_url(event_name, data):
+    """Ajoute le lien de téléchargement à l'événement final d'une tâche."""
+    if event_name == "done" and data and data.get("pdf_filename"):
+        return dict(data, download_url=url_for("download", filename=data["pdf_filename"]))
+    return data
+
+
+@app.route("/generate", methods=["POST"])
+def generate():
+    """
+    Enregistre la génération comme tâche de fond et répond aussitôt : identifiant
+    de la tâche en JSON (202), ou redirection vers sa page de suivi sans JavaScript.
+    """
+    announcement_content, form_defaults, error = read_generation_form()
+    if announcement_content is None:
+        if wants_json():
+            return jsonify({"error": error}), 400
+        return render_home(status="error", message=error, form_data=form_defaults)
+
+    job_id = JOB_QUEUE.submit(run_generation_job, announcement_content, form_defaults)
+    if job_id is None:
+        headers = {"Retry-After": str(QUEUE_FULL_RETRY_AFTER)}
+        if wants_json():
+            return jsonify({"error": QUEUE_FULL_MESSAGE}), 503, headers
+        return render_home(status="error", message=QUEUE_FULL_MESSAGE, form_data=form_defaults), 503, headers
+    status_url = url_for("job_status", job_id=job_id)
+    if wants_json():
+        return jsonify({"job_id": job_id, "status_url": status_url}), 202, {"Location": status_url}
+    return redirect(status_url)
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    """
+    État d'une tâche de génération. En JSON : statut, position dans la file,
+    événements à partir de `since` et résultat final. En HTML : page d'accueil
+    avec le résultat, rechargée tant que la tâche n'est pas terminée.
+    """
+    job = JOB_QUEUE.get(job_id)
+    if job is None:
+        if wants_json():
+            return jsonify({"error": "Tâche inconnue ou expirée."}), 404
+        return render_home(status="error", message="Tâche inconnue ou expirée."), 404
+
+    if wants_json():
+        since = request.args.get("since", 0, type=int)
+        events = job.events[since:]
+        return jsonify({
+            "job_id": job.id,
+            "status": job.status,
+            "position": JOB_QUEUE.position(job),
+            "events": [
+                {"event": event_name, "data": with_download_url(event_name, data)} for event_name, data in events
+            ],
+            "next": since + len(events),
+            "result": with_download_url("done", job.result),
+            "error": job.error,
+        })
+
+    if job.status == job_queue.STATUS_FAILED:
+        return render_home(status="error", message=job.error)
+    if job.status != job_queue.STATUS_DONE:
+        position = JOB_QUEUE.position(job)
+        message = f"En file d'attente (position {position})…" if position else "Génération en cours…"
+        return render_home(status="pending", message=message)
+
+    result = job.result
     return render_home(
-        status="error",
-        message="La génération a échoué. Consultez les logs pour plus de détails.",
-        match_info=result.get("match_info") if result else None,
-        job_info=result.get("job_info") if result else None,
-        form_data=form_defaults,
+        status="success",
+        message=result["message"],
+        pdf_filename=result["pdf_filename"],
+        match_info=result.get("match_info"),
+        job_info=result.get("job_info"),
+        letter_body=result.get("letter_body"),
+        template_name=result.get("template_name"),
+        candidature_id=result["candidature_id"]
     )
 
 
+def read_zip_ads(upload):
+    """
+    Annonces .txt d'une archive zip envoyée, lues membre par membre : seul le
+    répertoire central et l'annonce en cours sont en mémoire.
+
+    Produit (nom du fichier, contenu ou None, message d'erreur).
+    """
+    try:
+        archive = zipfile.ZipFile(upload.stream)
+    except zipfile.BadZipFile:
+        yield upload.filename, None, "Archive zip illisible."
+        return
+    with archive:
+        for member in archive.infolist():
+            name = os.path.basename(member.filename)
+            if member.is_dir() or not name.lower().endswith(".txt") or name.startswith((".", "__MACOSX")):
+                continue
+            if member.file_size > MAX_AD_BYTES:
+                yield name, None, "Annonce trop volumineuse."
+                continue
+            with archive.open(member) as f:
+                # La taille déclarée dans l'archive n'est pas une garantie
+                raw_bytes = f.read(MAX_AD_BYTES + 1)
+            if len(raw_bytes) > MAX_AD_BYTES:
+                yield name, None, "Annonce trop volumineuse."
+            else:
+                yield name, raw_bytes, None
+
+
+def iter_uploaded_ads(uploads):
+    """
+    Annonces des fichiers envoyés (.txt et archives .zip).
+
+    Produit (nom du fichier, contenu texte ou None, message d'erreur).
+    """
+    for upload in uploads:
+        if not upload or not upload.filename:
+            continue
+        if upload.filename.lower().endswith(".zip"):
+            ads = read_zip_ads(upload)
+        elif upload.filename.lower().endswith(".txt"):
+            raw_bytes = upload.stream.read(MAX_AD_BYTES + 1)
+            if len(raw_bytes) > MAX_AD_BYTES:
+                ads = [(upload.filename, None, "Annonce trop volumineuse.")]
+            else:
+                ads = [(upload.filename, raw_bytes, None)]
+        else:
+            ads = [(upload.filename, None, "Format non pris en charge (.txt ou .zip attendu).")]
+
+        for name, raw_bytes, error in ads:
+            if error:
+                yield name, None, error
+            elif not raw_bytes.strip():
+                yield name, None, "Le fichier fourni est vide."
+            else:
+                try:
+                    yield name, raw_bytes.decode("utf-8-sig"), None
+                except UnicodeDecodeError:
+                    yield name, None, "Impossible de lire le fichier en UTF-8."
+
+
+@app.route("/generate_bulk", methods=["POST"])
+def generate_bulk():
+    """
+    Import en lot : une tâche de génération par annonce (fichiers .txt ou
+    archives .zip), avec les options communes du formulaire.
+    """
+    shared_defaults = {
+        "custom_prompt": request.form.get("custom_prompt", "").strip(),
+        "bypass_cache": request.form.get("bypass_cache") == "on",
+        "force_generation": request.form.get("force_generation") == "on",
+        "variant": 0,
+    }
+
+    jobs, rejected = [], []
+    for name, content, error in iter_uploaded_ads(request.files.getlist("job_files")):
+        if error:
+            rejected.append({"filename": name, "error": error})
+            continue
+        if len(jobs) >= MAX_BULK_ADS:
+            rejected.append({"filename": name, "error": f"Limite de {MAX_BULK_ADS} annonces par envoi atteinte."})
+            continue
+        form_defaults = dict(shared_defaults, job_filename=name)
+        job_id = JOB_QUEUE.submit(run_generation_job, content, form_defaults)
+        if job_id is None:
+            rejected.append({"filename": name, "error": QUEUE_FULL_MESSAGE})
+            continue
+        jobs.append({"job_id": job_id, "filename": name, "status_url": url_for("job_status", job_id=job_id)})
+
+    if not jobs and not rejected:
+        error = "Veuillez fournir des fichiers .txt ou une archive .zip."
+        if wants_json():
+            return jsonify({"error": error}), 400
+        return render_home(status="error", message=error)
+
+    if wants_json():
+        return jsonify({"jobs": jobs, "rejected": rejected}), 202
+    message = f"{len(jobs)} annonce(s) en cours de génération : les candidatures apparaissent dans le tableau de bord au fil de l'eau."
+    if rejected:
+        message += " Ignorées : " + ", ".join(f"{r['filename']} ({r['error']})" for r in rejected)
+    return render_home(status="success" if jobs else "error", message=message)
+
+
+@app.route("/jobs", methods=["GET"])
+def jobs_summary():
+    """
+    État résumé de plusieurs tâches (`?ids=a,b,c`), sans leurs événements :
+    suivi d'un import en lot en une requête.
+    """
+    summaries = {}
+    for job_id in request.args.get("ids", "").split(","):
+        job = JOB_QUEUE.get(job_id.strip()) if job_id.strip() else None
+        if job is None:
+            continue
+        result = job.result or {}
+        summaries[job.id] = {
+            "status": job.status,
+            "position": JOB_QUEUE.position(job),
+            "error": job.error,
+            "duplicate": result.get("duplicate", False),
+            "entreprise": result.get("job_info", {}).get("entreprise"),
+            "poste": result.get("job_info", {}).get("poste"),
+            "score": (result.get("match_info") or {}).get("score"),
+            "candidature_id": result.get("candidature_id"),
+            "download_url": with_download_url("done", result).get("download_url") if result else None,
+        }
+    return jsonify({"jobs": summaries})
+
+
+def sse_event(event, data):
+    """Formate un événement Server-Sent Events."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+# Commentaire SSE envoyé quand une tâche n'a rien émis depuis ce délai (garde la connexion ouverte)
+SSE_KEEPALIVE_SECONDS = 15
+
+
+def iter_job_sse(job):
+    """Événements SSE d'une tâche, au fil de leur émission, jusqu'à sa fin."""
+    since = 0
+    while True:
+        job.wait(since, SSE_KEEPALIVE_SECONDS)
+        # Lu avant les événements : ceux émis juste avant la fin sont envoyés
+        finished = job.finished_at is not None
+        events = job.events[since:]
+        since += len(events)
+        for event_name, data in events:
+            yield sse_event(event_name, with_download_url(event_name, data))
+        if finished:
+            if job.status == job_queue.STATUS_FAILED:
+                yield sse_event("error", {"message": job.error})
+            return
+        if not events:
+            yield ": keepalive\n\n"
+
+
+def job_sse_response(job, first_events=()):
+    """Réponse Server-Sent Events suivant la tâche `job`."""
+    def events():
+        yield from first_events
+        yield from iter_job_sse(job)
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/jobs/<job_id>/stream", methods=["GET"])
+def job_stream(job_id):
+    """Étapes et corps de la lettre d'une tâche au fil de la génération, en Server-Sent Events."""
+    job = JOB_QUEUE.get(job_id)
+    if job is None:
+        return jsonify({"error": "Tâche inconnue ou expirée."}), 404
+    return job_sse_response(job)
+
+
+@app.route("/generate_stream", methods=["POST"])
+def generate_stream():
+    """
+    Variante streamée de /generate : la génération est confiée à la file de
+    tâches comme pour /generate, puis ses événements sont relayés au format
+    Server-Sent Events (premier événement `job` : identifiant de la tâche).
+    """
+    announcement_content, form_defaults, error = read_generation_form()
+    if announcement_content is None:
+        return Response(sse_event("error", {"message": error}), mimetype="text/event-stream")
+
+    job_id = JOB_QUEUE.submit(run_generation_job, announcement_content, form_defaults)
+    if job_id is None:
+        return Response(sse_event("error", {"message": QUEUE_FULL_MESSAGE}), mimetype="text/event-stream")
+    first_event = sse_event("job", {"job_id": job_id, "status_url": url_for("job_status", job_id=job_id)})
+    return job_sse_response(JOB_QUEUE.get(job_id), [first_event])
+
+
 @app.route("/regenerate", methods=["POST"])
 def regenerate():
     """Régénère le PDF avec les modifications manuelles."""
@@ -228,7 +783,7 @@ def regenerate():
     if not all([entreprise, poste, corps_lettre, template_name]):
         return render_home(status="error", message="Données manquantes pour la régénération.")
 
-    template_content = TEMPLATES_DICT.get(template_name, TEMPLATES_DICT["lettre_template.tex"])
+    template = TEMPLATES_DICT.get(template_name, TEMPLATES_DICT["lettre_template.tex"])
     
     # Nettoyage pour le nom de fichier
     poste_clean = (
@@ -242,7 +797,7 @@ def regenerate():
 
     try:
         success, pdf_filepath, tex_filepath = generate_pdf_from_content(
-            USER_CONFIG, template_content, entreprise, poste, corps_lettre, output_filename_base
+            USER_CONFIG, template, entreprise, poste, corps_lettre, output_filename_base
         )
     except Exception as exc:
          return render_home(status="error", message=f"Erreur lors de la régénération : {exc}")
@@ -314,11 +869,134 @@ def download(filename):
     return send_from_directory(OUTPUT_DIR, safe_name, as_attachment=True)
 
 
+def read_candidature_filters(args):
+    """Filtres de liste lus dans la requête : statut, entreprise (préfixe), date_debut et date_fin."""
+    return {key: (args.get(key) or "").strip() for key in ("statut", "entreprise", "date_debut", "date_fin")}
+
+
+def parse_day(value):
+    """Date AAAA-MM-JJ d'un filtre, ou None si absente ou invalide."""
+    try:
+        return datetime.strptime(value, "%Y-%m-%d") if value else None
+    except ValueError:
+        return None
+
+
+def sqlite_lower(value):
+    """Minuscules comme la fonction lower() de SQLite (lettres ASCII seulement)."""
+    return "".join(char.lower() if char.isascii() else char for char in value)
+
+
+def filtered_candidatures(filters):
+    """Requête des candidatures correspondant aux filtres (chacun couvert par un index)."""
+    query = Candidature.query
+    if filters["statut"]:
+        query = query.filter(Candidature.statut == filters["statut"])
+    if filters["entreprise"]:
+        prefix = sqlite_lower(filters["entreprise"])
+        # Intervalle plutôt que LIKE : SQLite peut alors parcourir l'index sur lower(entreprise)
+        query = query.filter(
+            func.lower(Candidature.entreprise) >= prefix,
+            func.lower(Candidature.entreprise) < prefix + "\U0010ffff",
+        )
+    start, end = parse_day(filters["date_debut"]), parse_day(filters["date_fin"])
+    if start:
+        query = query.filter(Candidature.date_creation >= start)
+    if end:
+        query = query.filter(Candidature.date_creation < end + timedelta(days=1))
+    return query
+
+
+def encode_cursor(candidature):
+    """Curseur de pagination : position (date, id) de la dernière candidature affichée."""
+    return f"{candidature.date_creation.isoformat()}_{candidature.id}"
+
+
+def decode_cursor(cursor):
+    """Position (date, id) d'un curseur, ou None s'il est invalide."""
+    try:
+        date_part, id_part = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(date_part), int(id_part)
+    except (AttributeError, ValueError):
+        return None
+
+
+def paginate_candidatures(query, cursor=None, limit=DASHBOARD_PAGE_SIZE):
+    """
+    Page de candidatures (plus récentes d'abord) située après `cursor`.
+    Pagination par curseur : le coût ne dépend pas de la profondeur de la page.
+
+    Retourne (candidatures, curseur de la page suivante ou None).
+    """
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        query = query.filter(tuple_(Candidature.date_creation, Candidature.id) < position)
+    rows = (
+        query.order_by(Candidature.date_creation.desc(), Candidature.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def read_page_size(default):
+    """Taille de page demandée (`limit`), bornée à MAX_PAGE_SIZE."""
+    limit = request.args.get("limit", default, type=int)
+    return min(max(limit, 1), MAX_PAGE_SIZE)
+
+
 @app.route("/dashboard")
 def dashboard():
-    # Récupère tout, trié par date décroissante
-    candidatures = Candidature.query.order_by(Candidature.date_creation.desc()).all()
-    return render_template("dashboard.html", candidatures=candidatures)
+    """Tableau de bord : une page de candidatures filtrées, et le total par statut."""
+    filters = read_candidature_filters(request.args)
+    query = filtered_candidatures(filters)
+    candidatures, next_cursor = paginate_candidatures(
+        query, request.args.get("cursor"), read_page_size(DASHBOARD_PAGE_SIZE)
+    )
+    counts = dict(
+        query.with_entities(Candidature.statut, func.count(Candidature.id))
+        .group_by(Candidature.statut)
+        .all()
+    )
+    active_filters = {key: value for key, value in filters.items() if value}
+    return render_template(
+        "dashboard.html",
+        candidatures=candidatures,
+        counts=counts,
+        filters=filters,
+        statuses=STATUSES,
+        next_url=url_for("dashboard", cursor=next_cursor, **active_filters) if next_cursor else None,
+        first_url=url_for("dashboard", **active_filters) if request.args.get("cursor") else None,
+        export_url=url_for("export_db", **active_filters),
+        import_report={
+            key: request.args.get(key, type=int)
+            for key in ("import_crees", "import_maj", "import_rejets", "import_lots_annules")
+        } if "import_crees" in request.args else None,
+    )
+
+
+@app.route("/api/candidatures")
+def api_candidatures():
+    """Candidatures filtrées et paginées (mêmes paramètres que /dashboard), en JSON."""
+    candidatures, next_cursor = paginate_candidatures(
+        filtered_candidatures(read_candidature_filters(request.args)),
+        request.args.get("cursor"),
+        read_page_size(MESSAGES_PAGE_SIZE),
+    )
+    return jsonify({
+        "items": [
+            {
+                "id": c.id,
+                "entreprise": c.entreprise,
+                "poste": c.poste,
+                "statut": c.statut,
+                "date_creation": c.date_creation.isoformat(),
+            }
+            for c in candidatures
+        ],
+        "next_cursor": next_cursor,
+    })
 
 
 @app.route("/update_status/<int:id>", methods=["POST"])
@@ -375,8 +1053,7 @@ def generate_email_content(candidature, user_config):
     """
     
     try:
-        model = genai.GenerativeModel("gemini-2.5-flash")
-        response = model.generate_content(prompt)
+        response = gemini_client.generate(prompt, "gemini-2.5-flash")
         return response.text.strip()
     except Exception as e:
         return f"Madame, Monsieur,\n\nJe vous adresse ma candidature spontanée pour un stage au sein de {candidature.entreprise}.\nVous trouverez ci-joint mon CV et ma Lettre de motivation, détaillant mon profil et mon intérêt.\n\nJe me tiens à votre disposition pour tout échange.\n\nCordialement,\n{user_config.get('nom_complet', '')}"
@@ -408,8 +1085,7 @@ def generate_linkedin_message_content(candidature, user_config, extra_context=No
     """
     
     try:
-        model = genai.GenerativeModel("gemini-flash-latest")
-        response = model.generate_content(prompt)
+        response = gemini_client.generate(prompt, "gemini-flash-latest")
         text = response.text.strip()
         # Nettoyage Markdown json
         if text.startswith("```json"):
@@ -447,9 +1123,9 @@ def messages():
         result = generate_linkedin_message_content(candidature, USER_CONFIG, extra_context)
         return result
         
-    # GET
-    candidatures = Candidature.query.order_by(Candidature.date_creation.desc()).all()
-    return render_template("messages.html", candidatures=candidatures)
+    # GET : les plus récentes ; les autres sont trouvées par la recherche (/api/candidatures)
+    candidatures, next_cursor = paginate_candidatures(Candidature.query, limit=MESSAGES_PAGE_SIZE)
+    return render_template("messages.html", candidatures=candidatures, has_more=bool(next_cursor))
 
 
 @app.route("/create_draft/<int:id>", methods=["POST"])
@@ -481,11 +1157,15 @@ def create_draft_route(id):
         attachments.append(cv_path)
         
     # Génération du corps du mail
-    email_body = generate_email_content(candidature, USER_CONFIG)
+    with metrics.span("email_redaction"):
+        email_body = generate_email_content(candidature, USER_CONFIG)
     subject = f"Candidature - {candidature.poste} - {USER_CONFIG.get('nom_complet', '')}"
     
     # Création du brouillon
-    result = gmail_utils.create_draft(email_destinataire, subject, email_body, attachments)
+    with metrics.span("gmail_brouillon"):
+        result = gmail_utils.create_draft(email_destinataire, subject, email_body, attachments)
+    if not result.get("success"):
+        metrics.FAILURES.inc(stage="gmail_brouillon")
     
     # Nettoyage du CV temporaire
     if cv_path and os.path.exists(cv_path):
@@ -538,147 +1218,332 @@ def add_manual():
     return redirect(url_for('dashboard'))
 
 
-@app.route("/export_db")
-def export_db():
-    """Exporte la base de données en CSV."""
-    candidatures = Candidature.query.all()
-    
-    # Création d'un buffer en mémoire
+# Colonnes de l'export CSV, dans l'ordre attendu par /import_db
+EXPORT_COLUMNS = {
+    "id": Candidature.id,
+    "entreprise": Candidature.entreprise,
+    "poste": Candidature.poste,
+    "statut": Candidature.statut,
+    "date_creation": Candidature.date_creation,
+    "url_offer": Candidature.url_offer,
+    "notes": Candidature.notes,
+}
+# Lignes lues par requête et écrites par morceau de réponse
+EXPORT_CHUNK_SIZE = 500
+
+
+def read_export_columns(args):
+    """Colonnes demandées (?columns=id,entreprise,...) ; toutes par défaut. ValueError si l'une est inconnue."""
+    requested = [name.strip() for name in (args.get("columns") or "").split(",") if name.strip()]
+    unknown = [name for name in requested if name not in EXPORT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Colonnes inconnues : {', '.join(unknown)}")
+    return requested or list(EXPORT_COLUMNS)
+
+
+def iter_csv_export(query, columns):
+    """Lignes CSV de `query`, lues par lots de EXPORT_CHUNK_SIZE et rendues par morceaux."""
     output = io.StringIO()
     # Ajout du BOM pour qu'Excel reconnaisse l'UTF-8 automatiquement
     output.write('\ufeff')
     writer = csv.writer(output)
-    
-    # En-têtes
-    headers = ["id", "entreprise", "poste", "statut", "date_creation", "url_offer", "notes"]
-    writer.writerow(headers)
-    
-    # Données
-    for c in candidatures:
-        writer.writerow([
-            c.id,
-            c.entreprise,
-            c.poste,
-            c.statut,
-            c.date_creation.strftime('%Y-%m-%d %H:%M:%S') if c.date_creation else "",
-            c.url_offer,
-            c.notes
-        ])
-        
-    output.seek(0)
-    
+    writer.writerow(columns)
+    date_index = columns.index("date_creation") if "date_creation" in columns else None
+
+    for count, row in enumerate(query.yield_per(EXPORT_CHUNK_SIZE), start=1):
+        row = list(row)
+        if date_index is not None:
+            row[date_index] = row[date_index].strftime('%Y-%m-%d %H:%M:%S') if row[date_index] else ""
+        writer.writerow(row)
+        if count % EXPORT_CHUNK_SIZE == 0:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+    yield output.getvalue()
+
+
+def gzip_chunks(chunks):
+    """Compresse au fil de l'eau des morceaux de texte en un flux gzip."""
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+@app.route("/export_db")
+def export_db():
+    """
+    Exporte la base de données en CSV, en flux (mémoire constante). Accepte les
+    filtres du tableau de bord, ?columns=... pour choisir les colonnes et
+    ?gzip=1 pour compresser.
+    """
+    try:
+        columns = read_export_columns(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    query = (
+        filtered_candidatures(read_candidature_filters(request.args))
+        .with_entities(*(EXPORT_COLUMNS[name] for name in columns))
+        .order_by(Candidature.id)
+    )
+    chunks = iter_csv_export(query, columns)
+    filename, mimetype = "candidatures.csv", "text/csv"
+    if request.args.get("gzip") in ("1", "true", "oui"):
+        chunks = gzip_chunks(chunks)
+        filename, mimetype = "candidatures.csv.gz", "application/gzip"
+
     return Response(
-        output,
-        mimetype="text/csv",
-        headers={"Content-Disposition": "attachment;filename=candidatures.csv"}
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment;filename={filename}"}
     )
 
 
-@app.route("/import_db", methods=["POST"])
-def import_db():
-    """Importe un fichier CSV pour mettre à jour la base de données."""
-    if 'file' not in request.files:
-        return redirect(url_for('dashboard'))
-        
-    file = request.files['file']
-    if file.filename == '':
-        return redirect(url_for('dashboard'))
+# Lignes traitées par transaction lors d'un import CSV (LETTRE_IMPORT_BATCH_SIZE)
+DEFAULT_IMPORT_BATCH_SIZE = 500
+# Nombre maximal de lignes rejetées gardées dans le rapport d'import (les suivantes sont journalisées)
+MAX_REPORTED_REJECTS = 100
 
-    if file:
-        stream = None
-        # Tentative avec UTF-8 (standard)
+
+def import_batch_size():
+    """Taille des lots d'import (LETTRE_IMPORT_BATCH_SIZE, lue à l'appel)."""
+    return max(int(os.getenv("LETTRE_IMPORT_BATCH_SIZE", DEFAULT_IMPORT_BATCH_SIZE)), 1)
+
+
+def iter_csv_lines(stream):
+    """
+    Lignes d'un CSV envoyé, décodées au fil de la lecture : UTF-8, sinon cp1252
+    (Excel Windows par défaut), sinon latin-1, ligne par ligne.
+    """
+    for number, raw in enumerate(stream):
+        if number == 0 and raw.startswith(codecs.BOM_UTF8):
+            raw = raw[len(codecs.BOM_UTF8):]
         try:
-            stream = io.StringIO(file.stream.read().decode("utf-8"), newline=None)
+            yield raw.decode("utf-8")
         except UnicodeDecodeError:
-            # Si échec, tentative avec cp1252 (Excel Windows par défaut)
-            file.stream.seek(0)
             try:
-                stream = io.StringIO(file.stream.read().decode("cp1252"), newline=None)
+                yield raw.decode("cp1252")
             except UnicodeDecodeError:
-                 # Dernier recours : latin-1
-                file.stream.seek(0)
-                stream = io.StringIO(file.stream.read().decode("latin-1"), newline=None)
+                yield raw.decode("latin-1")
+
+
+def parse_import_row(row):
+    """
+    Ligne CSV (id, entreprise, poste, statut, date_creation, url_offer, notes)
+    en dictionnaire de colonnes ; ValueError si elle est inutilisable.
+    """
+    if len(row) < 7:
+        raise ValueError("moins de 7 colonnes")
+    c_id = row[0].strip()
+    values = {
+        "entreprise": row[1],
+        "poste": row[2],
+        "statut": row[3].strip() or 'En préparation',
+        "url_offer": row[5],
+        "notes": row[6],
+    }
+    if c_id:
+        try:
+            values["id"] = int(c_id)
+        except ValueError:
+            raise ValueError(f"id invalide : {c_id}")
+    else:
+        # Création : date du fichier, sinon maintenant (une mise à jour ne touche pas à la date)
+        try:
+            values["date_creation"] = datetime.strptime(row[4], '%Y-%m-%d %H:%M:%S') if row[4] else datetime.now()
+        except ValueError:
+            values["date_creation"] = datetime.now()
+    return values
+
 
-        if stream:
+def import_batch(batch):
+    """
+    Applique un lot de lignes (numéro de ligne, valeurs) : ids existants lus en
+    une requête IN, créations et mises à jour en masse, agrégat journalier et
+    version des candidatures ajustés, puis commit.
+
+    Retourne (lignes créées, lignes mises à jour, lignes rejetées).
+    """
+    rejected = []
+    # Un même id plusieurs fois dans le lot : seule la dernière ligne est appliquée
+    last_lines = {values["id"]: line for line, values in batch if "id" in values}
+    rows = []
+    for line, values in batch:
+        if "id" in values and last_lines[values["id"]] != line:
+            rejected.append({
+                "line": line,
+                "error": f"candidature {values['id']} répétée (ligne {last_lines[values['id']]} appliquée)",
+            })
+        else:
+            rows.append((line, values))
+
+    # Date et statut actuels des candidatures mises à jour, pour l'agrégat journalier
+    current = {
+        c_id: (date_creation, statut)
+        for c_id, date_creation, statut in db.session.query(
+            Candidature.id, Candidature.date_creation, Candidature.statut
+        ).filter(Candidature.id.in_(last_lines))
+    } if last_lines else {}
+
+    inserts, updates, deltas = [], [], {}
+
+    def add(key, delta):
+        deltas[key] = deltas.get(key, 0) + delta
+
+    for line, values in rows:
+        if "id" not in values:
+            inserts.append(values)
+            add(rollup_key(values["date_creation"], values["statut"]), 1)
+        elif values["id"] in current:
+            date_creation, statut = current[values["id"]]
+            add(rollup_key(date_creation, statut), -1)
+            add(rollup_key(date_creation, values["statut"]), 1)
+            updates.append(values)
+        else:
+            rejected.append({"line": line, "error": f"candidature {values['id']} introuvable"})
+
+    # Requêtes en masse : le hook before_flush ne voit pas ces lignes, d'où les ajustements explicites
+    if inserts:
+        db.session.execute(insert(Candidature), inserts)
+    if updates:
+        db.session.execute(update(Candidature), updates)
+    if inserts or updates:
+        connection = db.session.connection()
+        apply_rollup_deltas(connection, deltas)
+        bump_data_version(connection, Candidature.__tablename__)
+    db.session.commit()
+    return len(inserts), len(updates), rejected
+
+
+@app.route("/import_db", methods=["POST"])
+def import_db():
+    """
+    Importe un fichier CSV (format de l'export) : les lignes sans id sont créées,
+    les autres mettent à jour la candidature correspondante. Le fichier est lu
+    en flux et appliqué par lots ; le rapport indique les lignes créées, mises
+    à jour et rejetées.
+    """
+    file = request.files.get('file')
+    if not file or file.filename == '':
+        if wants_json():
+            return jsonify({"error": "Aucun fichier envoyé."}), 400
+        return redirect(url_for('dashboard'))
+
+    report = {"created": 0, "updated": 0, "rejected": [], "rejected_count": 0, "failed_batches": []}
+    batch_size = import_batch_size()
+    csv_input = csv.reader(iter_csv_lines(file.stream))
+    next(csv_input, None)  # En-têtes (format de l'export)
+
+    batch = []
+
+    def reject(line, error):
+        # Rapport borné : un fichier entièrement invalide ne doit pas tout garder en mémoire
+        report["rejected_count"] += 1
+        if len(report["rejected"]) < MAX_REPORTED_REJECTS:
+            report["rejected"].append({"line": line, "error": error})
+        else:
+            logging.warning(f"Import : ligne {line} rejetée ({error})")
+
+    def flush_batch():
+        first_line, last_line = batch[0][0], batch[-1][0]
+        try:
+            created, updated, rejected = import_batch(batch)
+        except Exception as e:
+            # Lot annulé : ses lignes sont rejetées, les lots précédents restent importés
+            db.session.rollback()
+            logging.exception(f"Erreur lors de l'import (lignes {first_line} à {last_line})")
+            report["failed_batches"].append({"first_line": first_line, "last_line": last_line, "error": str(e)})
+            for line, _ in batch:
+                reject(line, f"lot annulé : {e}")
+        else:
+            report["created"] += created
+            report["updated"] += updated
+            for rejected_row in rejected:
+                reject(rejected_row["line"], rejected_row["error"])
+        batch.clear()
+
+    try:
+        for row in csv_input:
+            line = csv_input.line_num
+            if not any(cell.strip() for cell in row):
+                continue
             try:
-                csv_input = csv.reader(stream)
-                
-                headers = next(csv_input) # Skip headers
-                # Vérification basique des headers si besoin, mais on va supposer que l'utilisateur utilise le format d'export
-                
-                updated_count = 0
-                
-                for row in csv_input:
-                    # On s'attend à : id, entreprise, poste, statut, date_creation, url_offer, notes
-                    if len(row) < 7:
-                        continue
-                        
-                    c_id = row[0].strip()
-                    
-                    if not c_id:
-                        # Création d'une nouvelle candidature
-                        try:
-                            date_creation = datetime.strptime(row[4], '%Y-%m-%d %H:%M:%S') if row[4] else datetime.now()
-                        except ValueError:
-                            date_creation = datetime.now()
-
-                        new_candidature = Candidature(
-                            entreprise=row[1],
-                            poste=row[2],
-                            statut=row[3],
-                            date_creation=date_creation,
-                            url_offer=row[5],
-                            notes=row[6]
-                        )
-                        db.session.add(new_candidature)
-                        updated_count += 1
-                    else:
-                        # Mise à jour existante
-                        candidature = Candidature.query.get(c_id)
-                        
-                        if candidature:
-                            candidature.entreprise = row[1]
-                            candidature.poste = row[2]
-                            candidature.statut = row[3]
-                            # On ne touche pas à date_creation pour une mise à jour sauf si besoin
-                            candidature.url_offer = row[5]
-                            candidature.notes = row[6]
-                            updated_count += 1
-                
-                db.session.commit()
-            
-            except Exception as e:
-                print(f"Erreur lors de l'import : {e}")
-            
-    return redirect(url_for('dashboard'))
+                batch.append((line, parse_import_row(row)))
+            except ValueError as e:
+                reject(line, str(e))
+            if len(batch) >= batch_size:
+                flush_batch()
+    except csv.Error as e:
+        reject(csv_input.line_num, f"CSV illisible : {e}")
+    if batch:
+        flush_batch()
+
+    report["rejected"].sort(key=lambda rejected: rejected["line"])
+    if wants_json():
+        return jsonify(report)
+    return redirect(url_for(
+        'dashboard',
+        import_crees=report["created"],
+        import_maj=report["updated"],
+        import_rejets=report["rejected_count"],
+        import_lots_annules=len(report["failed_batches"]),
+    ))
 
 
-@app.route("/analytics")
-def analytics():
+@app.route("/metrics")
+def metrics_endpoint():
+    """Métriques internes au format texte Prometheus."""
+    return Response(metrics.render_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def analytics_status_counts():
+    """Nombre de candidatures par statut (GROUP BY sur candidature_daily)."""
+    with metrics.span("analytics_kpis"):
+        return dict(
+            db.session.query(CandidatureDaily.statut, func.sum(CandidatureDaily.nombre))
+            .group_by(CandidatureDaily.statut)
+            .all()
+        )
+
+
+def analytics_daily_counts():
+    """(jours au format AAAA-MM-JJ, nombre de candidatures de chaque jour)."""
+    with metrics.span("analytics_candidatures"):
+        daily_rows = (
+            db.session.query(CandidatureDaily.jour, func.sum(CandidatureDaily.nombre))
+            .group_by(CandidatureDaily.jour)
+            .order_by(CandidatureDaily.jour)
+            .all()
+        )
+    return [jour.strftime('%Y-%m-%d') for jour, _ in daily_rows], [count for _, count in daily_rows]
+
+
+def build_kpis():
     # 1. KPIs
-    total_candidatures = Candidature.query.count()
-    candidatures_en_cours = Candidature.query.filter(Candidature.statut.in_(['Envoyée', 'Entretien'])).count()
-    entretiens_decroches = Candidature.query.filter_by(statut='Entretien').count()
-    offres_decroches = Candidature.query.filter_by(statut='Offre').count()
-    
+    status_counts = analytics_status_counts()
+    total_candidatures = sum(status_counts.values())
+    entretiens_decroches = status_counts.get('Entretien', 0)
+    offres_decroches = status_counts.get('Offre', 0)
+
     # Taux de conversion (Envoyée -> Entretien)
     # On considère comme "Envoyées" tout ce qui n'est pas "En préparation"
-    candidatures_envoyees_total = Candidature.query.filter(Candidature.statut != 'En préparation').count()
+    candidatures_envoyees_total = total_candidatures - status_counts.get('En préparation', 0)
     conversion_rate = 0
     if candidatures_envoyees_total > 0:
         conversion_rate = round(((entretiens_decroches + offres_decroches )/ candidatures_envoyees_total) * 100, 1)
+    return {
+        "total_candidatures": total_candidatures,
+        "candidatures_en_cours": status_counts.get('Envoyée', 0) + entretiens_decroches,
+        "conversion_rate": conversion_rate,
+    }
 
-    # 2. Graphique : Candidatures par jour (Bar Chart)
-    # On récupère les dates de création
-    candidatures = Candidature.query.order_by(Candidature.date_creation).all()
-    dates = [c.date_creation.strftime('%Y-%m-%d') for c in candidatures]
-    
-    # Compte par jour
-    from collections import Counter
-    date_counts = Counter(dates)
-    sorted_dates = sorted(date_counts.keys())
-    counts = [date_counts[d] for d in sorted_dates]
 
+def build_daily_chart():
+    # 2. Graphique : Candidatures par jour (Bar Chart)
+    sorted_dates, counts = analytics_daily_counts()
     fig_daily = go.Figure(data=[
         go.Bar(x=sorted_dates, y=counts, name='Candidatures', marker_color='#2563eb')
     ])
@@ -690,9 +1555,12 @@ def analytics():
         margin=dict(l=20, r=20, t=40, b=20),
         height=400
     )
-    graph_daily_json = json.dumps(fig_daily, cls=plotly.utils.PlotlyJSONEncoder)
+    return fig_daily
+
 
+def build_cumulative_chart():
     # 3. Graphique : Cumulatif (Line Chart)
+    sorted_dates, counts = analytics_daily_counts()
     cumulative_counts = []
     running_total = 0
     for count in counts:
@@ -710,16 +1578,19 @@ def analytics():
         margin=dict(l=20, r=20, t=40, b=20),
         height=400
     )
-    graph_cumulative_json = json.dumps(fig_cumulative, cls=plotly.utils.PlotlyJSONEncoder)
+    return fig_cumulative
 
+
+def build_funnel_chart():
     # 4. Entonnoir de Conversion (Funnel Chart)
     # Logique : Envoyée -> Entretien -> Offre
     # Envoyée = Tout sauf "En préparation"
     # Entretien = Entretien + Offre
     # Offre = Offre
-    count_envoyees = candidatures_envoyees_total
-    count_entretiens = entretiens_decroches + offres_decroches
-    count_offres = offres_decroches
+    status_counts = analytics_status_counts()
+    count_offres = status_counts.get('Offre', 0)
+    count_entretiens = status_counts.get('Entretien', 0) + count_offres
+    count_envoyees = sum(status_counts.values()) - status_counts.get('En préparation', 0)
 
     fig_funnel = go.Figure(go.Funnel(
         y=["Candidatures Envoyées", "Entretiens", "Offres"],
@@ -733,20 +1604,23 @@ def analytics():
         margin=dict(l=20, r=20, t=40, b=20),
         height=400
     )
-    graph_funnel_json = json.dumps(fig_funnel, cls=plotly.utils.PlotlyJSONEncoder)
+    return fig_funnel
+
 
+def build_heatmap_chart():
     # 5. Heatmap d'Activité (Par jour de la semaine)
     # On veut savoir quel jour de la semaine on postule le plus
     days_order = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
     day_counts = {day: 0 for day in days_order}
-    
-    # Mapping weekday int (0=Monday) to name
-    weekday_map = {0: 'Lundi', 1: 'Mardi', 2: 'Mercredi', 3: 'Jeudi', 4: 'Vendredi', 5: 'Samedi', 6: 'Dimanche'}
-    
-    for c in candidatures:
-        day_name = weekday_map[c.date_creation.weekday()]
-        day_counts[day_name] += 1
-        
+
+    # strftime('%w') de SQLite : 0 = dimanche
+    weekday_map = {'0': 'Dimanche', '1': 'Lundi', '2': 'Mardi', '3': 'Mercredi', '4': 'Jeudi', '5': 'Vendredi', '6': 'Samedi'}
+    weekday = func.strftime('%w', CandidatureDaily.jour)
+    for day_number, count in (
+        db.session.query(weekday, func.sum(CandidatureDaily.nombre)).group_by(weekday).all()
+    ):
+        day_counts[weekday_map[day_number]] += count
+
     fig_heatmap = go.Figure(data=[
         go.Bar(x=days_order, y=[day_counts[d] for d in days_order], marker_color='#8b5cf6')
     ])
@@ -758,14 +1632,22 @@ def analytics():
         margin=dict(l=20, r=20, t=40, b=20),
         height=400
     )
-    graph_heatmap_json = json.dumps(fig_heatmap, cls=plotly.utils.PlotlyJSONEncoder)
+    return fig_heatmap
 
+
+def build_wordcloud_chart():
     # 6. Nuage de Mots (Bubble Chart)
     # Extraction des mots clés des postes
     import re
     from collections import Counter
     
-    all_text = " ".join([c.poste for c in candidatures]).lower()
+    # Limité aux postes des candidatures les plus récentes (index sur la date)
+    postes = (
+        db.session.query(Candidature.poste)
+        .order_by(Candidature.date_creation.desc(), Candidature.id.desc())
+        .limit(WORDCLOUD_MAX_CANDIDATURES)
+    )
+    all_text = " ".join(poste or "" for (poste,) in postes).lower()
     # Nettoyage basique
     words = re.findall(r'\w+', all_text)
     stopwords = {'de', 'et', 'le', 'la', 'les', 'un', 'une', 'pour', 'en', 'à', 'au', 'du', 'des','sur','stage', 'alternance', 'cdi', 'cdd','candidature','spontanée', 'bureau', 'ingénieur', 'ingénieure', 'ingenieur','études','étude','assistant','stagiaire'} 
@@ -817,32 +1699,69 @@ def analytics():
         fig_wordcloud = go.Figure()
         fig_wordcloud.update_layout(title="Pas assez de données pour le nuage de mots")
 
-    graph_wordcloud_json = json.dumps(fig_wordcloud, cls=plotly.utils.PlotlyJSONEncoder)
+    return fig_wordcloud
 
-    return render_template(
-        "analytics.html",
-        total_candidatures=total_candidatures,
-        candidatures_en_cours=candidatures_en_cours,
-        conversion_rate=conversion_rate,
-        graph_daily_json=graph_daily_json,
-        graph_cumulative_json=graph_cumulative_json,
-        graph_funnel_json=graph_funnel_json,
-        graph_heatmap_json=graph_heatmap_json,
-        graph_wordcloud_json=graph_wordcloud_json
-    )
+
+# Graphiques de la page Analytics, servis chacun par /analytics/charts/<nom>
+ANALYTICS_CHARTS = {
+    "daily": build_daily_chart,
+    "cumulative": build_cumulative_chart,
+    "funnel": build_funnel_chart,
+    "heatmap": build_heatmap_chart,
+    "wordcloud": build_wordcloud_chart,
+}
+
+# Résultats déjà calculés : nom -> (version des données, JSON)
+_analytics_cache = {}
+_analytics_cache_lock = threading.Lock()
 
 
+def cached_analytics(name, version, build):
+    """
+    JSON de `build()` pour la version `version` des candidatures : recalculé
+    seulement quand la version a changé depuis le dernier calcul.
+    """
+    with _analytics_cache_lock:
+        cached = _analytics_cache.get(name)
+    if cached is not None and cached[0] == version:
+        metrics.CACHE_REQUESTS.inc(cache="analytics", result="hit")
+        return cached[1]
+    metrics.CACHE_REQUESTS.inc(cache="analytics", result="miss")
+    payload = json.dumps(build(), cls=plotly.utils.PlotlyJSONEncoder)
+    with _analytics_cache_lock:
+        _analytics_cache[name] = (version, payload)
+    return payload
+
+
+def analytics_etag(name, version):
+    return f"{name}-{version}"
+
+
+@app.route("/analytics")
+def analytics():
+    # Les graphiques sont chargés en parallèle par la page (analytics_chart) ;
+    # les chiffres viennent de candidature_daily, sans charger les candidatures.
+    kpis = json.loads(cached_analytics("kpis", candidatures_version(), build_kpis))
+    return render_template("analytics.html", charts=list(ANALYTICS_CHARTS), **kpis)
+
+
+@app.route("/analytics/charts/<name>")
+def analytics_chart(name):
+    """Figure Plotly `name` en JSON, avec ETag : 304 tant que les candidatures n'ont pas changé."""
+    build = ANALYTICS_CHARTS.get(name)
+    if build is None:
+        return jsonify({"error": "Graphique inconnu"}), 404
+    version = candidatures_version()
+    etag = analytics_etag(name, version)
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(cached_analytics(name, version, build), mimetype="application/json")
+    response.set_etag(etag)
+    # Le navigateur garde la figure mais revalide à chaque visite
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
 
 if __name__ == "__main__":
-    with app.app_context():
-        # Migration simple : vérifie si la colonne url_offer existe
-        inspector = inspect(db.engine)
-        columns = [col['name'] for col in inspector.get_columns('candidature')]
-        if 'url_offer' not in columns:
-            print("Migration : Ajout de la colonne url_offer...")
-            with db.engine.connect() as conn:
-                conn.execute(text("ALTER TABLE candidature ADD COLUMN url_offer VARCHAR(500)"))
-                conn.commit()
-        
-        db.create_all()
     app.run(debug=True)